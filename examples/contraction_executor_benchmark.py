@@ -0,0 +1,99 @@
+"""
+python overhead of the contraction executor in ``tc.cons._base`` for large networks,
+the contracted tensors are tiny so that the time is dominated by the bookkeeping:
+the executor with ssa indexed store scales linearly with the node number
+while the legacy list rebuilding loop scales quadratically,
+the linear to ssa path conversion is timed separately against the ``del`` on a python list
+"""
+
+import time
+from collections import defaultdict
+
+import opt_einsum as oem
+import tensornetwork as tn
+import tensorcircuit as tc
+from tensorcircuit.simplify import _multi_remove
+
+tc.set_backend("numpy")
+
+
+def deep_circuit(nnodes, n=4):
+    c = tc.Circuit(n)
+    for i in range(nnodes - n):
+        if i % 3 == 2:
+            c.cnot(i % n, (i + 1) % n)
+        else:
+            c.rx(i % n, theta=0.1 * i)
+    return c
+
+
+def chain_path(input_sets, output_set, size_dict, **kws):
+    # absorb the tensors one by one following the connectivity
+    owners = defaultdict(list)
+    for i, s in enumerate(input_sets):
+        for l in s:
+            owners[l].append(i)
+    order, visited = [0], {0}
+    k = 0
+    while k < len(order):
+        for l in input_sets[order[k]]:
+            for j in owners[l]:
+                if j not in visited:
+                    visited.add(j)
+                    order.append(j)
+        k += 1
+    n = len(input_sets)
+    ssa = [(order[0], order[1])] + [(n + i, j) for i, j in enumerate(order[2:])]
+    return oem.paths.ssa_to_linear(ssa)
+
+
+def legacy_base(nodes, path, output_edge_order):
+    _, nodes = tc.cons._get_path_cache_friendly(nodes, path)
+    for a, b in path:
+        new_node = tn.contract_between(nodes[a], nodes[b], allow_outer_product=True)
+        nodes.append(new_node)
+        nodes = _multi_remove(nodes, [a, b])
+    return nodes[0].reorder_edges(output_edge_order)
+
+
+for nnodes in [1000, 5000, 20000]:
+    c = deep_circuit(nnodes)
+    nodes, front = c._copy()
+    path, _ = tc.cons._get_path_cache_friendly(nodes, chain_path)
+
+    nodes, front = c._copy()
+    time0 = time.time()
+    s0 = tc.cons._base(nodes, path, output_edge_order=front).tensor
+    time1 = time.time()
+    nodes, front = c._copy()
+    s1 = legacy_base(nodes, path, front).tensor
+    time2 = time.time()
+    assert abs(s0 - s1).max() < 1e-5
+    print("nodes: ", len(nodes))
+    print("ssa executor time: ", time1 - time0)
+    print("legacy executor time: ", time2 - time1)
+
+
+def legacy_linear_to_ssa(path, n):
+    linear = list(range(n))
+    ssa_path = []
+    for a, b in path:
+        ssa_path.append((linear[a], linear[b]))
+        for j in sorted([a, b], reverse=True):
+            del linear[j]
+        linear.append(n + len(ssa_path) - 1)
+    return ssa_path, linear
+
+
+for n in [10**4, 10**5, 4 * 10**5]:
+    # always contracting the first two tensors, the worst case for the list removal
+    path = [(0, 1)] * (n - 1)
+    time0 = time.time()
+    r0 = tc.cons._linear_to_ssa(path, n)
+    time1 = time.time()
+    r1 = legacy_linear_to_ssa(path, n)
+    time2 = time.time()
+    assert r0 == r1
+    print("path length: ", n - 1)
+    print("fenwick linear to ssa time: ", time1 - time0)
+    print("list linear to ssa time: ", time2 - time1)
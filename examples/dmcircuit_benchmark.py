@@ -0,0 +1,74 @@
+"""
+staging (jit compiling) time and running time of the noisy expectation for
+``tc.DMCircuit_reference`` (one contraction per Kraus operator for each channel),
+``tc.DMCircuit2`` (channels as superoperator nodes in the tensor network)
+and ``tc.DenseDMCircuit`` (gates and channels applied eagerly on the dense density matrix),
+together with the eager numpy time which includes the contraction path finding for the network engines
+"""
+
+import time
+import tensorcircuit as tc
+
+
+def noisy_layered(cls, n, nlayers, params):
+    c = cls(n)
+    for i in range(n):
+        c.h(i)
+    for j in range(nlayers):
+        for i in range(n - 1):
+            c.cnot(i, i + 1)
+            c.depolarizing(i + 1, px=0.01, py=0.01, pz=0.01)
+        for i in range(n):
+            c.rx(i, theta=params[j, i])
+            c.amplitudedamping(i, gamma=0.05, p=1.0)
+    return c
+
+
+def benchmark(cls, n, nlayers, tries=3):
+    K = tc.set_backend("jax")
+
+    def f(params):
+        c = noisy_layered(cls, n, nlayers, params)
+        return K.real(c.expectation_ps(z=[n // 2]))
+
+    vg = K.jit(K.value_and_grad(f))
+    params = K.ones([nlayers, n])
+    time0 = time.time()
+    v0, _ = vg(params)
+    time1 = time.time()
+    for _ in range(tries):
+        v, g = vg(params)
+    g.block_until_ready()
+    time2 = time.time()
+    return v0, time1 - time0, (time2 - time1) / tries
+
+
+def benchmark_eager(cls, n, nlayers, tries=3):
+    K = tc.set_backend("numpy")
+    params = K.ones([nlayers, n])
+    time0 = time.time()
+    for _ in range(tries):
+        v = K.real(noisy_layered(cls, n, nlayers, params).expectation_ps(z=[n // 2]))
+    time1 = time.time()
+    return v, (time1 - time0) / tries
+
+
+if __name__ == "__main__":
+    for n, nlayers, classes in [
+        (4, 2, [tc.DMCircuit_reference, tc.DMCircuit2, tc.DenseDMCircuit]),
+        (6, 4, [tc.DMCircuit_reference, tc.DMCircuit2, tc.DenseDMCircuit]),
+        (8, 8, [tc.DMCircuit2, tc.DenseDMCircuit]),
+    ]:
+        print("qubits: ", n, "layers: ", nlayers)
+        for cls in classes:
+            v, staging, running = benchmark(cls, n, nlayers)
+            print(cls.__name__, "jax value: ", v)
+            print("staging: ", staging, "running: ", running)
+    for n, nlayers, classes in [
+        (6, 4, [tc.DMCircuit_reference, tc.DMCircuit2, tc.DenseDMCircuit]),
+        (8, 20, [tc.DMCircuit2, tc.DenseDMCircuit]),
+    ]:
+        print("qubits: ", n, "layers: ", nlayers)
+        for cls in classes:
+            v, running = benchmark_eager(cls, n, nlayers)
+            print(cls.__name__, "numpy value: ", v, "eager time: ", running)
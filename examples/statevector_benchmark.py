@@ -0,0 +1,63 @@
+"""
+staging (jit compiling) time and running time of the expectation for
+``tc.Circuit`` (tensor network contraction) and ``tc.StateVectorCircuit`` (dense state vector),
+together with the eager numpy time which includes the contraction path finding for ``tc.Circuit``
+"""
+
+import time
+import tensorcircuit as tc
+
+
+def layered(cls, n, nlayers, params):
+    c = cls(n)
+    for i in range(n):
+        c.h(i)
+    for j in range(nlayers):
+        for i in range(n - 1):
+            c.rzz(i, i + 1, theta=params[j, i, 0])
+        for i in range(n):
+            c.rx(i, theta=params[j, i, 1])
+    return c
+
+
+def benchmark_jit(cls, n, nlayers, tries=5):
+    K = tc.set_backend("jax")
+
+    def f(params):
+        c = layered(cls, n, nlayers, params)
+        return K.real(c.expectation_ps(z=[n // 2]))
+
+    vg = K.jit(K.value_and_grad(f))
+    params = K.ones([nlayers, n, 2])
+    time0 = time.time()
+    v0, _ = vg(params)
+    time1 = time.time()
+    for _ in range(tries):
+        v, g = vg(params)
+    g.block_until_ready()
+    time2 = time.time()
+    return v0, time1 - time0, (time2 - time1) / tries
+
+
+def benchmark_eager(cls, n, nlayers, tries=3):
+    K = tc.set_backend("numpy")
+    params = K.ones([nlayers, n, 2])
+    time0 = time.time()
+    for _ in range(tries):
+        v = K.real(layered(cls, n, nlayers, params).expectation_ps(z=[n // 2]))
+    time1 = time.time()
+    return v, (time1 - time0) / tries
+
+
+if __name__ == "__main__":
+    for n, nlayers in [(8, 4), (12, 6), (16, 8)]:
+        print("qubits: ", n, "layers: ", nlayers)
+        for cls in [tc.Circuit, tc.StateVectorCircuit]:
+            v, staging, running = benchmark_jit(cls, n, nlayers)
+            print(cls.__name__, "jax value: ", v)
+            print("staging: ", staging, "running: ", running)
+    for n, nlayers in [(10, 20), (10, 80), (16, 20)]:
+        print("qubits: ", n, "layers: ", nlayers)
+        for cls in [tc.Circuit, tc.StateVectorCircuit]:
+            v, running = benchmark_eager(cls, n, nlayers)
+            print(cls.__name__, "numpy value: ", v, "eager time: ", running)
@@ -0,0 +1,48 @@
+"""
+``Circuit.state`` contracted from the network template (``tc.einsumprogram``) compared with
+the plain ``contractor(nodes)`` on copied nodes, the pairwise steps of the template program
+go through ``tensordot`` so that there is no regression against the node based contraction
+"""
+
+import time
+
+import numpy as np
+import tensorcircuit as tc
+
+tc.set_backend("numpy")
+
+
+def build(n, nlayers=6):
+    c = tc.Circuit(n)
+    for j in range(nlayers):
+        for i in range(n):
+            c.rx(i, theta=0.1 * i + j)
+        for i in range(n - 1):
+            c.cnot(i, i + 1)
+    return c
+
+
+def timing(f, repeat=5):
+    ts = []
+    for _ in range(repeat):
+        time0 = time.time()
+        r = f()
+        ts.append(time.time() - time0)
+    return r, np.median(ts)
+
+
+def baseline(c):
+    nodes, front = c._copy()
+    # flattened as the output of ``Circuit.state``
+    return tc.backend.reshape(
+        tc.contractor(nodes, output_edge_order=front).tensor, [-1]
+    )
+
+
+for n in [12, 16, 20]:
+    s0, t0 = timing(lambda: baseline(build(n)))
+    s1, t1 = timing(lambda: build(n).state())
+    np.testing.assert_allclose(s0, s1, atol=1e-5)
+    print("qubits: ", n)
+    print("contractor(nodes) time: ", t0)
+    print("template state time: ", t1)
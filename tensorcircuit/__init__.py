@@ -21,8 +21,9 @@ from . import basecircuit
 from .gates import Gate
 from .circuit import Circuit, expectation
 from .mpscircuit import MPSCircuit
+from .statevector import StateVectorCircuit
 from .densitymatrix import DMCircuit as DMCircuit_reference
-from .densitymatrix import DMCircuit2
+from .densitymatrix import DMCircuit2, DenseDMCircuit
 
 DMCircuit = DMCircuit2  # compatibility issue to still expose DMCircuit2
 from .gates import num_to_tensor, array_to_tensor
@@ -30,6 +31,11 @@ from .vis import qir2tex, render_pdf
 from . import interfaces
 from . import templates
 from . import quantum
+from . import einsumprogram
+from . import noisemodel
+from .noisemodel import NoiseModel
+from . import trajectory
+from .trajectory import TrajectoryEngine
 from .quantum import QuOperator, QuVector, QuAdjointVector, QuScalar
 
 try:
@@ -724,6 +724,36 @@ def _more_methods_for_backend(tnbackend: Any) -> None:
             "Backend '{}' has not implemented `left_shift`.".format(self.name)
         )
 
+    def bitwise_xor(self: Any, x: Tensor, y: Tensor) -> Tensor:
+        """
+        Bitwise xor of the integers x and y (with broadcast).
+
+        :param x: input values
+        :type x: Tensor
+        :param y: input values
+        :type y: Tensor
+        :return: result with the broadcast shape of ``x`` and ``y``
+        :rtype: Tensor
+        """
+        raise NotImplementedError(
+            "Backend '{}' has not implemented `bitwise_xor`.".format(self.name)
+        )
+
+    def bitwise_and(self: Any, x: Tensor, y: Tensor) -> Tensor:
+        """
+        Bitwise and of the integers x and y (with broadcast).
+
+        :param x: input values
+        :type x: Tensor
+        :param y: input values
+        :type y: Tensor
+        :return: result with the broadcast shape of ``x`` and ``y``
+        :rtype: Tensor
+        """
+        raise NotImplementedError(
+            "Backend '{}' has not implemented `bitwise_and`.".format(self.name)
+        )
+
     def arange(
         self: Any, start: int, stop: Optional[int] = None, step: int = 1
     ) -> Tensor:
@@ -4,18 +4,26 @@ Quantum circuit: common methods for all circuit classes as MixIn
 # pylint: disable=invalid-name
 
 from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
-from functools import reduce
+from functools import partial, reduce
 from operator import add
 
 import graphviz
 import numpy as np
 import tensornetwork as tn
+from opt_einsum import get_symbol
 
 from . import gates
 from .cons import npdtype, backend, dtypestr, contractor, rdtypestr
-from .simplify import _split_two_qubit_gate
+from .cons import (
+    _estimate_from_structure,
+    _merge_cost,
+    _get_plan_algorithm,
+    _structure_hash,
+)
+from .einsumprogram import EinsumProgram, NetworkTemplate, _operator_tensor, run_circuit
+from .simplify import _split_two_qubit_gate, fuse_qir
 from .vis import qir2tex
-from .quantum import QuVector
+from .quantum import QuVector, sample_counts
 
 
 Gate = gates.Gate
@@ -68,23 +76,32 @@ class BaseCircuit:
     vgates = vgates
     mpogates = mpogates
     gate_aliases = gate_aliases
+    # options of the deferred network construction, None for the eager construction
+    _deferred: Optional[Dict[str, Any]] = None
+    # local dimension of each site, None for qubits only circuits
+    _dims: Optional[List[int]] = None
 
     @staticmethod
-    def all_zero_nodes(n: int, d: int = 2, prefix: str = "qb-") -> List[tn.Node]:
-        l = [0.0 for _ in range(d)]
-        l[0] = 1.0
-        nodes = [
-            tn.Node(
-                np.array(
-                    l,
-                    dtype=npdtype,
-                ),
-                name=prefix + str(x),
-            )
-            for x in range(n)
-        ]
+    def all_zero_nodes(
+        n: int, d: Union[int, Sequence[int]] = 2, prefix: str = "qb-"
+    ) -> List[tn.Node]:
+        if isinstance(d, int):
+            d = [d for _ in range(n)]
+        nodes = []
+        for x in range(n):
+            l = [0.0 for _ in range(d[x])]
+            l[0] = 1.0
+            nodes.append(tn.Node(np.array(l, dtype=npdtype), name=prefix + str(x)))
         return nodes
 
+    def _local_dims(self) -> List[int]:
+        """
+        The local dimension of each site, 2 for qubits.
+        """
+        if self._dims is None:
+            return [2 for _ in range(self._nqubits)]
+        return list(self._dims)
+
     @staticmethod
     def front_from_nodes(nodes: List[tn.Node]) -> List[tn.Edge]:
         return [n.get_edge(0) for n in nodes]
@@ -143,6 +160,72 @@ class BaseCircuit:
     ) -> Tuple[List[tn.Node], List[tn.Edge]]:
         return self.copy(self._nodes, self._front, conj)
 
+    def __getattr__(self, name: str) -> Any:
+        # only called when the attribute is missing, i.e. the network of a deferred circuit
+        # has pending gates
+        if name in ["_nodes", "_front"] and "_built" in self.__dict__:
+            self._materialize()
+            return self.__dict__[name]
+        raise AttributeError(
+            "'%s' object has no attribute '%s'" % (type(self).__name__, name)
+        )
+
+    def _materialize(self) -> None:
+        """
+        Build the network for the gates recorded in the deferred mode in one pass,
+        the gates are fused first if ``fuse`` is in the deferred options.
+        """
+        nodes, front, nbuilt = self.__dict__.pop("_built")
+        self._nodes = nodes
+        self._front = front
+        qir = self._qir[nbuilt:]
+        fuse = self._deferred.get("fuse", False)  # type: ignore
+        if fuse is not False and self._fusable():
+            qir = fuse_qir(qir, k=2 if fuse is True else fuse, dims=self._local_dims())
+        for d in qir:
+            self._wire_gate(
+                d["gate"], d["index"], d["name"], d["split"], d["mpo"], ir_dict=d
+            )
+
+    def _fusable(self) -> bool:
+        """
+        Whether the gates can be fused before being wired into the network,
+        the gates are kept as they are when a noise model attaches channels to each matched gate.
+        """
+        return getattr(self, "_noise_model", None) is None
+
+    def _built_nodes(self) -> List[tn.Node]:
+        """
+        The nodes built so far, the pending gates in the deferred mode are not materialized.
+        """
+        if "_built" in self.__dict__:
+            return self.__dict__["_built"][0]  # type: ignore
+        return self._nodes
+
+    def _deferred_program_ready(self) -> bool:
+        """
+        Whether the network with pending deferred gates can be contracted by the program
+        compiled from the qir (see ``tc.einsumprogram.compile_circuit``) without materializing the nodes.
+        """
+        if "_built" not in self.__dict__ or self.is_dm:
+            return False
+        if not getattr(self, "_qir_complete", False):
+            return False
+        if getattr(self, "mps_inputs", None) is not None or self.split is not None:
+            return False
+        if any([d["split"] is not None for d in self._qir]):
+            return False
+        nnodes = self._start_index + len(self._qir)
+        return _get_plan_algorithm(nnodes=nnodes) is not None
+
+    def _contract_state(self) -> Tensor:
+        """
+        The output state (or density matrix) tensor with one leg for each dangling edge.
+        """
+        if self._deferred_program_ready():
+            return run_circuit(self, kind="state")
+        return self.network_template().state()
+
     def apply_general_gate(
         self,
         gate: Gate,
@@ -165,8 +248,42 @@ class BaseCircuit:
             ir_dict.update(gate_dict)
         else:
             ir_dict = gate_dict
-        self._qir.append(ir_dict)
         assert len(index) == len(set(index))
+        if self._dims is not None and not mpo:
+            # matrices are reshaped to the local dimensions of the sites
+            dims = [self._dims[i] for i in index] * 2
+            if list(gate.tensor.shape) != dims:
+                gate = Gate(backend.reshape(gate.tensor, dims), name=gate.name)
+                ir_dict["gate"] = gate
+        if self._deferred is not None:
+            # only record the gate, the network is materialized when it is needed
+            if "_nodes" in self.__dict__:
+                self._built = (
+                    self.__dict__.pop("_nodes"),
+                    self.__dict__.pop("_front"),
+                    len(self._qir),
+                )
+            self._qir.append(ir_dict)
+        else:
+            self._qir.append(ir_dict)
+            self._wire_gate(gate, index, name, split, mpo, ir_dict=ir_dict)
+        self.state_tensor = None  # refresh the state cache
+
+    apply = apply_general_gate
+
+    def _wire_gate(
+        self,
+        gate: Gate,
+        index: Sequence[int],
+        name: str,
+        split: Optional[Dict[str, Any]] = None,
+        mpo: bool = False,
+        ir_dict: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Attach the gate node (and its conjugated copy for density matrices) to the front of the network,
+        ``ir_dict`` is the qir entry of the gate for subclasses.
+        """
         noe = len(index)
         nq = self._nqubits
         applied = False
@@ -265,10 +382,6 @@ class BaseCircuit:
                     gateconj.out_edges[i] ^ self._front[ind + nq]
                     self._front[ind + nq] = gateconj.in_edges[i]
 
-        self.state_tensor = None  # refresh the state cache
-
-    apply = apply_general_gate
-
     @staticmethod
     def apply_general_variable_gate_delayed(
         gatef: Callable[..., Gate],
@@ -464,8 +577,7 @@ class BaseCircuit:
         if reuse:
             t = getattr(self, "state_tensor", None)
             if t is None:
-                nodes, d_edges = self._copy()
-                t = contractor(nodes, output_edge_order=d_edges)
+                t = tn.Node(self._contract_state())
                 setattr(self, "state_tensor", t)
             ndict, edict = tn.copy([t], conjugate=conj)
             newnodes = []
@@ -476,6 +588,86 @@ class BaseCircuit:
             return newnodes, newfront
         return self._copy(conj)  # type: ignore
 
+    def local_rdms(
+        self, sites_list: Sequence[Sequence[int]], reuse: bool = True
+    ) -> List[Tensor]:
+        """
+        Reduced density matrices on many (small) site sets from the output state,
+        which is contracted only once (and cached with ``reuse=True``) and shared by all site sets.
+        Each reduced density matrix is then obtained by one einsum over the state tensor,
+        where the traced out legs between the sites are grouped so that no transpose is involved.
+        Local observables can be evaluated by cheap traces on the returned matrices.
+
+        :Example:
+
+        >>> c = tc.Circuit(3)
+        >>> c.H(0)
+        >>> c.cnot(0, 1)
+        >>> g = tc.templates.graphs.Line1D(3, pbc=False)
+        >>> rhos = c.local_rdms(list(g.edges))
+        >>> zz = np.kron(tc.gates._z_matrix, tc.gates._z_matrix)
+        >>> [tc.backend.trace(rho @ zz) for rho in rhos]
+        [array(1.+0.j, dtype=complex64), array(0.+0.j, dtype=complex64)]
+
+        :param sites_list: The list of site sets, the legs of each reduced density matrix
+            follow the order of sites in the set.
+        :type sites_list: Sequence[Sequence[int]]
+        :param reuse: Whether to cache and reuse the output state, defaults to True
+        :type reuse: bool, optional
+        :return: The list of reduced density matrices with shape :math:`[2^k, 2^k]`
+            for site sets of size :math:`k` (the product of the local dimensions for qudits).
+        :rtype: List[Tensor]
+        """
+        nq = self._nqubits
+        dims = self._local_dims()
+        if reuse:
+            nodes, _ = self._copy_state_tensor(reuse=True)
+            t = nodes[0].tensor
+        else:
+            nodes, front = self._copy()
+            t = contractor(nodes, output_edge_order=front).tensor
+        rhos = []
+        for sites in sites_list:
+            if isinstance(sites, int):
+                sites = [sites]
+            sites = list(sites)
+            position = {q: k for k, q in enumerate(sites)}
+            kets = [get_symbol(k) for k in range(len(sites))]
+            bras = [get_symbol(len(sites) + k) for k in range(len(sites))]
+            # shape and symbols of the ket legs with the traced out legs grouped
+            shape: List[int] = []
+            ket: List[str] = []
+            bra: List[str] = []
+            rest = 1
+            for i in range(nq + 1):
+                if i in position or i == nq:
+                    if rest > 1:
+                        symbol = get_symbol(2 * len(sites) + len(shape))
+                        shape.append(rest)
+                        ket.append(symbol)
+                        bra.append(symbol)
+                    rest = 1
+                    if i < nq:
+                        shape.append(dims[i])
+                        ket.append(kets[position[i]])
+                        bra.append(bras[position[i]])
+                else:
+                    rest *= dims[i]
+            output = "".join(kets + bras)
+            if self.is_dm:
+                rho = backend.reshape(t, shape + shape)
+                rho = backend.einsum("".join(ket + bra) + "->" + output, rho)
+            else:
+                psi = backend.reshape(t, shape)
+                rho = backend.einsum(
+                    "".join(ket) + "," + "".join(bra) + "->" + output,
+                    psi,
+                    backend.conj(psi),
+                )
+            size = int(np.prod([dims[q] for q in sites]))
+            rhos.append(backend.reshape(rho, [size, size]))
+        return rhos
+
     def expectation_before(
         self,
         *ops: Tuple[tn.Node, List[int]],
@@ -502,15 +694,15 @@ class BaseCircuit:
             newdang = edge1 + edge2
         occupied = set()
         for op, index in ops:
+            if isinstance(index, int):
+                index = [index]
             if not isinstance(op, tn.Node):
                 # op is only a matrix
-                op = backend.reshape2(op)
+                op = _operator_tensor(op, [self._local_dims()[i] for i in index])
                 op = backend.cast(op, dtype=dtypestr)
                 op = gates.Gate(op)
             else:
                 op.tensor = backend.cast(op.tensor, dtype=dtypestr)
-            if isinstance(index, int):
-                index = [index]
             noe = len(index)
             for j, e in enumerate(index):
                 if e in occupied:
@@ -538,7 +730,9 @@ class BaseCircuit:
     ) -> Tensor:
         """
         Shortcut for Pauli string expectation.
-        x, y, z list are for X, Y, Z positions
+        x, y, z list are for X, Y, Z positions.
+        On qudit sites of dimension :math:`d>2`, x and z stand for the generalized
+        shift and clock operators, while y is not defined.
 
         :Example:
 
@@ -559,16 +753,25 @@ class BaseCircuit:
         :return: Expectation value
         :rtype: Tensor
         """
+        dims = self._local_dims()
         obs = []
         if x is not None:
             for i in x:
-                obs.append([gates.x(), [i]])  # type: ignore
+                if dims[i] == 2:
+                    obs.append([gates.x(), [i]])  # type: ignore
+                else:
+                    obs.append([gates.Gate(gates.shift_matrix(dims[i])), [i]])  # type: ignore
         if y is not None:
             for i in y:
+                if dims[i] != 2:
+                    raise ValueError("Pauli y is not defined on qudit site %s" % i)
                 obs.append([gates.y(), [i]])  # type: ignore
         if z is not None:
             for i in z:
-                obs.append([gates.z(), [i]])  # type: ignore
+                if dims[i] == 2:
+                    obs.append([gates.z(), [i]])  # type: ignore
+                else:
+                    obs.append([gates.Gate(gates.clock_matrix(dims[i])), [i]])  # type: ignore
         return self.expectation(*obs, reuse=reuse, **kws)  # type: ignore
 
     def to_qir(self) -> List[Dict[str, Any]]:
@@ -611,7 +814,10 @@ class BaseCircuit:
 
     @classmethod
     def from_qir(
-        cls, qir: List[Dict[str, Any]], circuit_params: Optional[Dict[str, Any]] = None
+        cls,
+        qir: List[Dict[str, Any]],
+        circuit_params: Optional[Dict[str, Any]] = None,
+        fuse: Union[bool, int] = False,
     ) -> "BaseCircuit":
         """
         Restore the circuit from the quantum intermediate representation.
@@ -638,6 +844,11 @@ class BaseCircuit:
         :type qir: List[Dict[str, Any]]
         :param circuit_params: Extra circuit parameters.
         :type circuit_params: Optional[Dict[str, Any]]
+        :param fuse: Whether to fuse adjacent gates into dense blocks before applying them,
+            see :py:func:`tensorcircuit.simplify.fuse_qir`, an int value is taken as the max
+            number of qubits of the fused blocks (``True`` for 2), the gates are not fused
+            for circuits with a noise model, defaults to False
+        :type fuse: Union[bool, int], optional
         :return: The circuit have same gates in the qir.
         :rtype: Circuit
         """
@@ -652,11 +863,16 @@ class BaseCircuit:
             circuit_params["nqubits"] = nqubits
 
         c = cls(**circuit_params)  # type: ignore
-        c = cls._apply_qir(c, qir)
+        c = cls._apply_qir(c, qir, fuse=fuse)
         return c
 
     @staticmethod
-    def _apply_qir(c: "BaseCircuit", qir: List[Dict[str, Any]]) -> "BaseCircuit":
+    def _apply_qir(
+        c: "BaseCircuit", qir: List[Dict[str, Any]], fuse: Union[bool, int] = False
+    ) -> "BaseCircuit":
+        if fuse is not False and c._fusable():
+            k = 2 if fuse is True else fuse
+            qir = fuse_qir(qir, k=k, dims=c._local_dims())  # type: ignore
         for d in qir:
             if "parameters" not in d:
                 c.apply_general_gate_delayed(d["gatef"], d["name"], mpo=d["mpo"])(  # type: ignore
@@ -702,7 +918,9 @@ class BaseCircuit:
 
         return c
 
-    def append_from_qir(self, qir: List[Dict[str, Any]]) -> None:
+    def append_from_qir(
+        self, qir: List[Dict[str, Any]], fuse: Union[bool, int] = False
+    ) -> None:
         """
         Apply the ciurict in form of quantum intermediate representation after the current cirucit.
 
@@ -723,44 +941,218 @@ class BaseCircuit:
 
         :param qir: The quantum intermediate representation.
         :type qir: List[Dict[str, Any]]
+        :param fuse: Whether to fuse adjacent gates into dense blocks before applying them,
+            see ``from_qir``, defaults to False
+        :type fuse: Union[bool, int], optional
         """
-        self._apply_qir(self, qir)
+        self._apply_qir(self, qir, fuse=fuse)
 
-    def perfect_sampling(self, status: Optional[Tensor] = None) -> Tuple[str, float]:
+    def perfect_sampling(
+        self, status: Optional[Tensor] = None, incremental: bool = False
+    ) -> Tuple[str, float]:
         """
         Sampling bistrings from the circuit output based on quantum amplitudes.
         Reference: arXiv:1201.3974.
 
         :param status: external randomness, with shape [nqubits], defaults to None
         :type status: Optional[Tensor]
+        :param incremental: whether to contract the network only once into the dense probability
+            tensor and sample the qubits from the conditioned marginals, see ``measure_jit``,
+            defaults to False
+        :type incremental: bool, optional
         :return: Sampled bit string and the corresponding theoretical probability.
         :rtype: Tuple[str, float]
         """
         return self.measure_jit(
-            *[i for i in range(self._nqubits)], with_prob=True, status=status
+            *[i for i in range(self._nqubits)],
+            with_prob=True,
+            status=status,
+            incremental=incremental,
         )
 
+    def batched_perfect_sampling(
+        self,
+        status: Tensor,
+        memory_limit: Optional[float] = None,
+        incremental: bool = False,
+    ) -> Tuple[Tensor, Tensor]:
+        """
+        Vectorized version of ``perfect_sampling`` over the first axis of ``status``,
+        the batch is split into chunks so that the estimated memory of the vectorized
+        contractions (see ``estimate_cost(kind="sample")``) fits in ``memory_limit``.
+
+        :Example:
+
+        >>> c = tc.Circuit(2)
+        >>> c.H(0)
+        >>> c.batched_perfect_sampling(tc.backend.convert_to_tensor([[0.1, 0.4], [0.7, 0.2]]))
+        (array([[0., 0.], [1., 0.]], dtype=float32), array([0.5, 0.5], dtype=float32))
+
+        :param status: external randomness, uniform in [0, 1) with shape [batch, nqubits]
+        :type status: Tensor
+        :param memory_limit: the memory budget in bytes for one vectorized call,
+            defaults to None (1GB)
+        :type memory_limit: Optional[float], optional
+        :param incremental: whether to use the incremental engine, see ``perfect_sampling``,
+            defaults to False
+        :type incremental: bool, optional
+        :return: Stacked bitstrings with shape [batch, nqubits]
+            and the corresponding probabilities with shape [batch]
+        :rtype: Tuple[Tensor, Tensor]
+        """
+        if memory_limit is None:
+            memory_limit = 2**30
+        batch = backend.shape_tuple(status)[0]
+        peak = self.estimate_cost(kind="sample", incremental=incremental)[
+            "max_intermediate_bytes"
+        ]
+        chunk = max(1, int(memory_limit // max(peak, 1)))
+
+        def f(s: Tensor) -> Tensor:
+            # single output for backends without pytree vmap
+            sample, p = self.perfect_sampling(s, incremental=incremental)
+            return backend.concat([sample, backend.reshape(p, [1])])
+
+        vf = backend.vmap(f, vectorized_argnums=0)
+        if chunk >= batch:
+            r = vf(status)
+        else:
+            r = backend.concat(
+                [vf(status[start : start + chunk]) for start in range(0, batch, chunk)]
+            )
+        return r[:, :-1], r[:, -1]
+
+    def _marginal_probabilities(self) -> Tensor:
+        """
+        The probability tensor on the computational basis with shape ``[2^n]``
+        (the product of the local dimensions for qudits),
+        i.e. :math:`\\vert\\psi\\vert^2` or the diagonal of the density matrix,
+        from one contraction of the circuit network.
+        """
+        nodes, front = self._copy()
+        if self.is_dm:
+            # only the diagonal is contracted, by joining the ket and bra legs of each site
+            # with a copy tensor, so that the output stays within the local dimensions product
+            nq = self._nqubits
+            front_diag = []
+            for j, d in enumerate(self._local_dims()):
+                delta = np.zeros([d, d, d])
+                for i in range(d):
+                    delta[i, i, i] = 1.0
+                n = Gate(gates.array_to_tensor(delta))
+                n.id = id(n)
+                n.is_dagger = False
+                n.flag = "measurement"
+                n.get_edge(0) ^ front[j]
+                n.get_edge(1) ^ front[j + nq]
+                nodes.append(n)
+                front_diag.append(n.get_edge(2))
+            t = contractor(nodes, output_edge_order=front_diag).tensor
+            t = backend.reshape(t, [-1])
+        else:
+            t = contractor(nodes, output_edge_order=front).tensor
+            t = backend.reshape(t, [-1])
+            t = t * backend.conj(t)
+        return backend.cast(backend.real(t), rdtypestr)
+
+    def _sample_bit(self, pu: Tensor, k: int, status: Optional[Tensor]) -> Tensor:
+        if status is None:
+            r = backend.implicit_randu()[0]
+        else:
+            r = status[k]
+        r = backend.real(backend.cast(r, dtypestr))
+        eps = 0.31415926 * 1e-12
+        sign = backend.sign(r - pu + eps) / 2 + 0.5  # in case status is exactly 0.5
+        sign = backend.convert_to_tensor(sign)
+        return backend.cast(sign, dtype=rdtypestr)
+
+    def _sample_digit(
+        self, pd: Tensor, k: int, status: Optional[Tensor]
+    ) -> Tuple[Tensor, Tensor]:
+        # inverse transform sampling of one qudit outcome from the conditional distribution
+        if status is None:
+            r = backend.implicit_randu()[0]
+        else:
+            r = status[k]
+        r = backend.cast(backend.real(backend.cast(r, dtypestr)), rdtypestr)
+        eps = 0.31415926 * 1e-12
+        cdf = backend.cumsum(pd)[:-1]
+        digit = backend.sum(backend.sign(r - cdf + eps) / 2 + 0.5)
+        m = backend.onehot(backend.cast(digit, "int32"), pd.shape[0])
+        return digit, backend.cast(m, rdtypestr)
+
     def measure_jit(
-        self, *index: int, with_prob: bool = False, status: Optional[Tensor] = None
+        self,
+        *index: int,
+        with_prob: bool = False,
+        status: Optional[Tensor] = None,
+        incremental: bool = False,
     ) -> Tuple[Tensor, Tensor]:
         """
         Take measurement to the given quantum lines.
         This method is jittable is and about 100 times faster than unjit version!
 
+        With ``incremental=True``, the circuit network is contracted only once into the
+        probability tensor, and the marginal distribution of each measured qubit is obtained
+        by summing over the remaining legs of the probability tensor conditioned
+        on (i.e. sliced by) the already sampled outcomes, so that the cost is about
+        one contraction per shot instead of one contraction per measured qubit.
+        The memory of the dense probability tensor scales as :math:`2^n`
+        (only the diagonal is contracted for the density matrix simulator),
+        therefore the incremental engine is opt-in, while the default engine never builds the full state.
+        Qudit circuits are always measured by the incremental engine,
+        and the outcomes are the digits :math:`0, \\cdots, d-1` of the measured sites.
+
         :param index: Measure on which quantum line.
         :type index: int
         :param with_prob: If true, theoretical probability is also returned.
         :type with_prob: bool, optional
         :param status: external randomness, with shape [index], defaults to None
         :type status: Optional[Tensor]
+        :param incremental: whether to use the incremental marginal engine, defaults to False
+        :type incremental: bool, optional
         :return: The sample output and probability (optional) of the quantum line.
         :rtype: Tuple[Tensor, Tensor]
         """
+        if self._dims is not None:
+            incremental = True
         # finally jit compatible ! and much faster than unjit version ! (100x)
         sample: List[Tensor] = []
         p = 1.0
         p = backend.convert_to_tensor(p)
         p = backend.cast(p, dtype=rdtypestr)
+        if incremental:
+            probs = self._marginal_probabilities()
+            legs = list(range(self._nqubits))
+            ldims = self._local_dims()
+            for k, j in enumerate(index):
+                a = legs.index(j)
+                d = ldims[a]
+                t = backend.reshape(
+                    probs,
+                    [int(np.prod(ldims[:a])), d, int(np.prod(ldims[a + 1 :]))],
+                )
+                marginal = backend.sum(backend.sum(t, axis=2), axis=0)
+                if d == 2:
+                    pu = marginal[0] / p
+                    sign = self._sample_bit(pu, k, status)
+                    sample.append(sign)
+                    p = p * (pu * (-1) ** sign + sign)
+                    m = backend.stack([1 - sign, sign])
+                else:
+                    digit, m = self._sample_digit(marginal / p, k, status)
+                    sample.append(digit)
+                    p = backend.sum(marginal * m)
+                # condition the probability tensor on the sampled outcome
+                probs = backend.einsum("aib,i->ab", t, m)
+                legs.remove(j)
+                ldims.pop(a)
+            sample = backend.stack(sample)
+            if with_prob:
+                return sample, p
+            else:
+                return sample, -1.0
+
         for k, j in enumerate(index):
             if self.is_dm is False:
                 nodes1, edge1 = self._copy()
@@ -794,15 +1186,7 @@ class BaseCircuit:
                 * contractor(newnodes, output_edge_order=[edge1[j], edge2[j]]).tensor
             )
             pu = backend.real(rho[0, 0])
-            if status is None:
-                r = backend.implicit_randu()[0]
-            else:
-                r = status[k]
-            r = backend.real(backend.cast(r, dtypestr))
-            eps = 0.31415926 * 1e-12
-            sign = backend.sign(r - pu + eps) / 2 + 0.5  # in case status is exactly 0.5
-            sign = backend.convert_to_tensor(sign)
-            sign = backend.cast(sign, dtype=rdtypestr)
+            sign = self._sample_bit(pu, k, status)
             sign_complex = backend.cast(sign, dtypestr)
             sample.append(sign_complex)
             p = p * (pu * (-1) ** sign + sign)
@@ -880,6 +1264,279 @@ class BaseCircuit:
 
         return qiskit2tc(qc.data, n, inputs, is_dm=cls.is_dm)  # type: ignore
 
+    def _expectation_tensors(
+        self,
+        *ops: Tuple[tn.Node, List[int]],
+        reuse: bool = True,
+    ) -> List[Tensor]:
+        """
+        The tensors of the network given by :py:meth:`expectation_before` in the same order,
+        without building the network.
+        """
+        if reuse:
+            t = getattr(self, "state_tensor", None)
+            if t is None:
+                t = tn.Node(self._contract_state())
+                setattr(self, "state_tensor", t)
+            tensors = [t.tensor]
+        else:
+            tensors = [n.tensor for n in self._nodes]
+        if self.is_dm is False:
+            tensors += [backend.conj(t) for t in tensors]
+        dims = self._local_dims()
+        for op, index in ops:
+            index = [index] if isinstance(index, int) else index
+            op = _operator_tensor(op, [dims[i] for i in index])
+            tensors.append(backend.cast(op, dtype=dtypestr))
+        return tensors
+
+    def _expectation_planned(
+        self,
+        *ops: Tuple[tn.Node, List[int]],
+        reuse: bool = True,
+    ) -> Tensor:
+        """
+        Contract the expectation network with the contraction plan cached on the circuit,
+        the plan is shared by all calls with operators on the same sites and of the same shapes,
+        so that only the first call goes through the path finder.
+        Without ``reuse``, the network is contracted from the network template by reference.
+        """
+        if not reuse:
+            if self._deferred_program_ready():
+                return run_circuit(self, *ops, kind="expectation")
+            return self.network_template().expectation(*ops)
+        algorithm = _get_plan_algorithm(nnodes=len(self._built_nodes()) + len(ops))
+        if algorithm is None:
+            return contractor(self.expectation_before(*ops, reuse=reuse)).tensor
+        tensors = self._expectation_tensors(*ops, reuse=reuse)
+        sites = tuple(
+            [tuple([index] if isinstance(index, int) else index) for _, index in ops]
+        )
+        shapes = tuple([tuple(t.shape) for t in tensors[len(tensors) - len(ops) :]])
+        # the network is the contracted state with the operators
+        state_shape = list(tensors[0].shape)
+        front = list(range(len(state_shape)))
+        inputs, size_dict = self._expectation_structure(
+            [front], front, dict(zip(front, state_shape)), sites
+        )
+        structure = _structure_hash(inputs, [], size_dict, algorithm)
+        key = (reuse, structure, sites, shapes)
+        plans = getattr(self, "_expectation_plans", None)
+        if plans is None:
+            plans = {}
+            setattr(self, "_expectation_plans", plans)
+        if key not in plans:
+            # fresh operator nodes so that the user provided nodes are kept dangling
+            nops = [
+                (Gate(t), index)
+                for t, (_, index) in zip(tensors[len(tensors) - len(ops) :], ops)
+            ]
+            nodes = self.expectation_before(*nops, reuse=reuse)
+            plans[key] = EinsumProgram.from_nodes(nodes, [], algorithm)
+        return plans[key].run(tensors)
+
+    def network_template(self) -> NetworkTemplate:
+        """
+        The immutable template of the circuit tensor network (see ``tc.einsumprogram.NetworkTemplate``),
+        from which the state and expectation networks are contracted by reference
+        instead of copying all nodes. The template is cached and rebuilt once the circuit is changed.
+
+        :Example:
+
+        >>> c = tc.Circuit(2)
+        >>> c.h(0)
+        >>> t = c.network_template()
+        >>> t.expectation((tc.gates.x(), [0]))
+        array(0.99999994+0.j, dtype=complex64)
+        >>> c.network_template() is t
+        True
+
+        :return: The network template.
+        :rtype: NetworkTemplate
+        """
+        template = getattr(self, "_network_template", None)
+        if template is None or not template.matches(self):
+            template = NetworkTemplate.from_circuit(self)
+            setattr(self, "_network_template", template)
+        return template
+
+    def _network_structure(
+        self,
+    ) -> Tuple[List[List[int]], List[int], Dict[int, int]]:
+        """
+        Label structure (inputs, front, size_dict) of the circuit tensor network,
+        no tensor is copied or allocated.
+        """
+        mapping_dict: Dict[int, int] = {}
+        size_dict: Dict[int, int] = {}
+        inputs = []
+        for n in self._nodes:
+            labels = []
+            for e in n.edges:
+                if id(e) not in mapping_dict:
+                    mapping_dict[id(e)] = len(mapping_dict)
+                    size_dict[mapping_dict[id(e)]] = e.dimension
+                labels.append(mapping_dict[id(e)])
+            inputs.append(labels)
+        front = [mapping_dict[id(e)] for e in self._front]
+        return inputs, front, size_dict
+
+    def _expectation_structure(
+        self,
+        inputs: List[List[int]],
+        front: List[int],
+        size_dict: Dict[int, int],
+        sites: Sequence[Sequence[int]],
+    ) -> Tuple[List[List[int]], Dict[int, int]]:
+        """
+        Label structure of the expectation network (see :py:meth:`expectation_before`)
+        with operators on ``sites``, built on the label structure of the state network.
+        """
+        nq = self._nqubits
+        size_dict = dict(size_dict)
+        if self.is_dm:
+            ket, bra = front[:nq], front[nq:]
+            binputs: List[List[int]] = []
+        else:
+            start = max(size_dict) + 1 if size_dict else 0
+            binputs = [[l + start for l in ls] for ls in inputs]
+            ket, bra = front, [l + start for l in front]
+            size_dict.update({l + start: d for l, d in list(size_dict.items())})
+        occupied = set()
+        opinputs = []
+        for index in sites:
+            for e in index:
+                if e in occupied:
+                    raise ValueError("Cannot measure two operators in one index")
+                occupied.add(e)
+            opinputs.append([bra[e] for e in index] + [ket[e] for e in index])
+        joined = {bra[j]: ket[j] for j in range(nq) if j not in occupied}
+        allinputs = inputs + binputs + opinputs
+        return [[joined.get(l, l) for l in ls] for ls in allinputs], size_dict
+
+    def estimate_cost(
+        self,
+        *ops: Tuple[tn.Node, List[int]],
+        kind: str = "state",
+        reuse: bool = False,
+        algorithm: Optional[Any] = None,
+        incremental: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Dry-run cost estimation for the contraction behind ``state``, ``expectation``,
+        ``amplitude`` or ``sample``, the contraction path is searched as the real run
+        while no tensor is contracted or allocated.
+
+        :Example:
+
+        >>> c = tc.Circuit(10)
+        >>> for i in range(9):
+        ...     c.cnot(i, i + 1)
+        >>> c.estimate_cost(kind="state")["max_intermediate_bytes"]
+        8192
+        >>> c.estimate_cost((tc.gates.z(), [1]), kind="expectation")["flops"]
+
+        :param ops: operator and its position for ``kind="expectation"``,
+            the same format as :py:meth:`expectation`
+        :type ops: Tuple[tn.Node, List[int]]
+        :param kind: one of "state" (or "wavefunction"), "expectation", "amplitude" and "sample",
+            defaults to "state"
+        :type kind: str, optional
+        :param reuse: if True, the cost of the final state contraction plus the cost of the
+            following computation on the state is reported, i.e. ``expectation(reuse=True)`` and
+            ``sample(allow_state=True)``, defaults to False
+        :type reuse: bool, optional
+        :param algorithm: ``opt_einsum`` type path finder, defaults to None
+            (the path finder of the current contractor, together with its preprocessing)
+        :type algorithm: Optional[Any], optional
+        :param incremental: for ``kind="sample"``, whether to estimate the incremental engine of
+            ``measure_jit``, i.e. one contraction of the probability tensor (the diagonal for density matrix)
+            with the dense probability buffer counted in "max_intermediate_bytes",
+            instead of one marginal network for each qubit, defaults to False (always True for qudits)
+        :type incremental: bool, optional
+        :return: The cost report dict, see :py:func:`tensorcircuit.cons.estimate`
+        :rtype: Dict[str, Any]
+        """
+        inputs, front, size_dict = self._network_structure()
+        nq = self._nqubits
+        if kind in ["state", "wavefunction"]:
+            return _estimate_from_structure(inputs, front, size_dict, algorithm)
+        if kind == "sample" and (incremental or self._dims is not None):
+            # incremental perfect sampling only contracts the network once,
+            # into the diagonal of the density matrix for density matrix simulator
+            if self.is_dm:
+                start = max(size_dict) + 1 if size_dict else 0
+                diag = list(range(start, start + nq))
+                size_dict = dict(size_dict)
+                size_dict.update({l: size_dict[front[j]] for j, l in enumerate(diag)})
+                inputs = inputs + [
+                    [front[j], front[j + nq], diag[j]] for j in range(nq)
+                ]
+                front = diag
+            report = dict(_estimate_from_structure(inputs, front, size_dict, algorithm))
+            # the dense probability tensor and its conditioned copies (at most the same size)
+            # are kept besides the contraction
+            nprobs = int(np.prod(self._local_dims()))
+            report["max_intermediate_bytes"] += (
+                2 * nprobs * np.dtype(rdtypestr).itemsize
+            )
+            return report
+        if reuse:
+            state_report = _estimate_from_structure(inputs, front, size_dict, algorithm)
+            if kind == "sample":
+                return state_report
+            inputs = [front]
+        start = max(size_dict) + 1 if size_dict else 0
+
+        def conj(
+            inputs: List[List[int]], front: List[int]
+        ) -> Tuple[List[List[int]], List[int]]:
+            return [[l + start for l in ls] for ls in inputs], [
+                l + start for l in front
+            ]
+
+        if self.is_dm:
+            ket, bra = front[:nq], front[nq:]
+        else:
+            binputs, bra = conj(inputs, front)
+            ket = front
+        if kind == "amplitude":
+            # projector vectors on each (ket and bra for density matrix) leg
+            if self.is_dm:
+                legs = front
+            else:
+                binputs, legs = [], front
+            report = _estimate_from_structure(
+                inputs + binputs + [[l] for l in legs], [], size_dict, algorithm
+            )
+        elif kind == "expectation":
+            sites = [[index] if isinstance(index, int) else index for _, index in ops]
+            allinputs, size_dict = self._expectation_structure(
+                inputs, front, size_dict, sites
+            )
+            report = _estimate_from_structure(allinputs, [], size_dict, algorithm)
+        elif kind == "sample":
+            if not self.is_dm:
+                size_dict.update({l + start: d for l, d in size_dict.items()})
+            # non-incremental perfect sampling: one marginal network for each qubit
+            reports = []
+            for k in range(nq):
+                joined = {bra[j]: ket[j] for j in range(k + 1, nq)}
+                projectors = [[ket[j]] for j in range(k)] + [[bra[j]] for j in range(k)]
+                allinputs = inputs + ([] if self.is_dm else binputs) + projectors
+                allinputs = [[joined.get(l, l) for l in ls] for ls in allinputs]
+                reports.append(
+                    _estimate_from_structure(
+                        allinputs, [ket[k], bra[k]], size_dict, algorithm
+                    )
+                )
+            report = _merge_cost(*reports)
+        else:
+            raise ValueError("Unsupported kind for cost estimation: %s" % kind)
+        if reuse:
+            return _merge_cost(state_report, report)
+        return report
+
     def amplitude(self, l: Union[str, Tensor]) -> Tensor:
         r"""
         Returns the amplitude of the circuit given the bitstring l.
@@ -897,30 +1554,33 @@ class BaseCircuit:
         >>> c.amplitude("11")
         array(1.+0.j, dtype=complex64)
 
-        :param l: The bitstring of 0 and 1s.
+        :param l: The bitstring of 0 and 1s (the base 36 digits for qudits).
         :type l: Union[str, Tensor]
         :return: The amplitude of the circuit.
         :rtype: tn.Node.tensor
         """
         no, d_edges = self._copy()
+        dims = self._local_dims()
         ms = []
         if self.is_dm:
             msconj = []
         if isinstance(l, str):
-            for s in l:
-                if s == "1":
-                    endn = np.array([0, 1], dtype=npdtype)
-                elif s == "0":
-                    endn = np.array([1, 0], dtype=npdtype)
+            for i, s in enumerate(l):
+                endn = np.zeros([dims[i]], dtype=npdtype)
+                endn[int(s, 36)] = 1.0
                 ms.append(tn.Node(endn))
                 if self.is_dm:
                     msconj.append(tn.Node(endn))
         else:  # l is Tensor
-            l = backend.cast(l, dtype=dtypestr)
             for i in range(self._nqubits):
-                endn = l[i] * gates.array_to_tensor(np.array([0, 1])) + (
-                    1 - l[i]
-                ) * gates.array_to_tensor(np.array([1, 0]))
+                if dims[i] == 2:
+                    li = backend.cast(l[i], dtype=dtypestr)
+                    endn = li * gates.array_to_tensor(np.array([0, 1])) + (
+                        1 - li
+                    ) * gates.array_to_tensor(np.array([1, 0]))
+                else:
+                    endn = backend.onehot(backend.cast(l[i], "int32"), dims[i])
+                    endn = backend.cast(endn, dtypestr)
                 ms.append(tn.Node(endn))
                 if self.is_dm:
                     msconj.append(tn.Node(endn))
@@ -943,6 +1603,148 @@ class BaseCircuit:
             no.extend(msconj)
         return contractor(no).tensor
 
+    def _projected_tensor(
+        self, closed: Sequence[int], bits: Optional[Tensor] = None
+    ) -> Tensor:
+        """
+        Contract the circuit network with the computational basis projectors ``bits``
+        on qubits ``closed`` (and on the bra legs for density matrix),
+        the remaining qubit legs are left open and flattened.
+        """
+        nodes, front = self._copy()
+        nq = self._nqubits
+        dims = self._local_dims()
+        legs = [[j] for j in closed]
+        if self.is_dm:
+            legs = [[j, j + nq] for j in closed]
+        for k, ls in enumerate(legs):
+            if dims[closed[k]] == 2:
+                b = backend.cast(bits[k], dtypestr)
+                m = (1 - b) * gates.array_to_tensor(
+                    np.array([1, 0])
+                ) + b * gates.array_to_tensor(np.array([0, 1]))
+            else:
+                m = backend.onehot(backend.cast(bits[k], "int32"), dims[closed[k]])
+                m = backend.cast(m, dtypestr)
+            for i, l in enumerate(ls):
+                nodes.append(Gate(m))
+                nodes[-1].id = id(nodes[-1])
+                nodes[-1].is_dagger = i > 0
+                nodes[-1].flag = "measurement"
+                nodes[-1].get_edge(0) ^ front[l]
+        opened = [j for j in range(nq) if j not in closed]
+        output = [front[j] for j in opened]
+        if self.is_dm:
+            output += [front[j + nq] for j in opened]
+        t = contractor(nodes, output_edge_order=output).tensor
+        if self.is_dm:
+            return backend.diagonal(backend.reshapem(t))
+        return backend.reshape(t, [-1])
+
+    def amplitudes(
+        self, bitstrings: Tensor, memory_limit: Optional[float] = None
+    ) -> Tensor:
+        """
+        Batched version of ``amplitude`` for many bitstrings with shared contraction work.
+        The qubits are split into the open ones, with the largest number of open qubits whose
+        output tensor fits in a fraction of ``memory_limit`` (the whole budget if the full output fits),
+        and the closed ones.
+        The circuit network is contracted once for each distinct assignment
+        of the closed qubits among ``bitstrings`` (vectorized in chunks within ``memory_limit``),
+        and the amplitudes are gathered from the output tensors of each chunk by the bits on the open qubits.
+        When the full output fits, this is a single contraction of the state.
+        For qudit circuits, the entries of ``bitstrings`` are the digits on each site.
+        The split and the deduplication of the closed patterns run eagerly in numpy,
+        so ``bitstrings`` must be concrete: the method can be jitted with respect to
+        the circuit parameters but not to ``bitstrings``, which raises a ``ValueError``,
+        use ``vmap`` over ``amplitude`` for traced bitstrings instead.
+
+        :Example:
+
+        >>> c = tc.Circuit(2)
+        >>> c.H(0)
+        >>> c.amplitudes(np.array([[0, 0], [1, 0], [1, 1]]))
+        array([0.70710677+0.j, 0.70710677+0.j, 0.        +0.j], dtype=complex64)
+
+        :param bitstrings: The bitstrings of 0 and 1s with shape [batch, nqubits].
+        :type bitstrings: Tensor
+        :param memory_limit: the memory budget in bytes for the output tensors of one vectorized
+            contraction, defaults to None (1GB)
+        :type memory_limit: Optional[float], optional
+        :raises ValueError: When ``bitstrings`` is a traced tensor inside jit.
+        :return: The amplitudes with shape [batch]
+            (the diagonal elements of the density matrix for density matrix simulator).
+        :rtype: Tensor
+        """
+        if memory_limit is None:
+            memory_limit = 2**30
+        try:
+            if backend.is_tensor(bitstrings):
+                bitstrings = backend.numpy(bitstrings)
+            bitstrings = np.array(bitstrings)
+        except Exception as e:
+            raise ValueError(
+                "`amplitudes` requires concrete `bitstrings` and cannot be jitted "
+                "with respect to them, use `vmap` over `amplitude` instead"
+            ) from e
+        bitstrings = np.reshape(bitstrings, [-1, self._nqubits]).astype(np.int64)
+        nq = self._nqubits
+        dims = self._local_dims()
+        itemsize = np.dtype(dtypestr).itemsize
+        if self._dims is None:
+            # open the qubits whose bits vary the most among the bitstrings
+            order = np.argsort(np.abs(np.mean(bitstrings, axis=0) - 0.5), kind="stable")
+        else:
+            # open the qudits with the most distinct digits among the bitstrings
+            distinct = [len(np.unique(bitstrings[:, j])) for j in range(nq)]
+            order = np.argsort(-np.array(distinct), kind="stable")
+        # the open sites, whose dimensions multiply to the number of elements in the output
+        # (squared for density matrix) within the memory budget
+        maxsize = max(memory_limit / itemsize, 1)
+        power = 2 if self.is_dm else 1
+        budget = maxsize
+        if float(np.prod(dims)) ** power > maxsize:
+            # leave room in the budget to vectorize over several closed patterns
+            budget = max(maxsize / 16, 1)
+        opened = []
+        nopen = 1
+        for j in order:
+            if (nopen * dims[j]) ** power <= budget:
+                opened.append(int(j))
+                nopen *= dims[j]
+        opened = sorted(opened)
+        closed = [j for j in range(nq) if j not in opened]
+        # mixed radix weights of the digits on the open sites
+        weights = np.ones([len(opened)], dtype=np.int64)
+        for i in range(len(opened) - 2, -1, -1):
+            weights[i] = weights[i + 1] * dims[opened[i + 1]]
+        openindex = bitstrings[:, opened] @ weights
+        if not closed:
+            t = backend.reshape(self._projected_tensor([]), [-1])
+            return backend.gather1d(t, backend.convert_to_tensor(openindex))
+        patterns, inverse = np.unique(
+            bitstrings[:, closed], axis=0, return_inverse=True
+        )
+        inverse = np.reshape(inverse, [-1]).astype(np.int64)
+        f = backend.vmap(partial(self._projected_tensor, closed), vectorized_argnums=0)
+        chunk = max(1, int(maxsize // nopen**power))
+        npatterns = patterns.shape[0]
+        patterns = backend.convert_to_tensor(patterns)
+        # the bitstrings grouped by their closed pattern, so that each chunk gathers
+        # its own amplitudes and its output tensors can be dropped right after
+        rows = np.argsort(inverse, kind="stable")
+        grouped = inverse[rows]
+        amps = []
+        for start in range(0, npatterns, chunk):
+            lo, hi = np.searchsorted(grouped, [start, start + chunk])
+            t = backend.reshape(f(patterns[start : start + chunk]), [-1])
+            index = (grouped[lo:hi] - start) * nopen + openindex[rows[lo:hi]]
+            amps.append(backend.gather1d(t, backend.convert_to_tensor(index)))
+        amps = backend.concat(amps)
+        return backend.gather1d(
+            amps, backend.convert_to_tensor(np.argsort(rows).astype(np.int64))
+        )
+
     def vis_tex(self, **kws: Any) -> str:
         """
         Generate latex string based on quantikz latex package
@@ -966,6 +1768,8 @@ class BaseCircuit:
         batch: Optional[int] = None,
         allow_state: bool = False,
         status: Optional[Tensor] = None,
+        vectorized: bool = False,
+        memory_limit: Optional[float] = None,
     ) -> Any:
         """
         batched sampling from state or circuit tensor network directly
@@ -977,9 +1781,30 @@ class BaseCircuit:
         :type allow_state: bool, optional
         :param status: random generator,  defaults to None
         :type status: Optional[Tensor], optional
-        :return: List (if batch) of tuple (binary configuration tensor and correponding probability)
+        :param vectorized: if true, the samples are returned as stacked tensors
+            (binary configurations with shape [batch, nqubits] and probabilities with shape [batch]),
+            and the perfect sampling (``allow_state=False``) is vectorized over the batch
+            instead of a python loop, which is also jittable, defaults to False
+        :type vectorized: bool, optional
+        :param memory_limit: the memory budget in bytes for one vectorized perfect sampling call,
+            see ``batched_perfect_sampling``, defaults to None
+        :type memory_limit: Optional[float], optional
+        :return: List (if batch) of tuple (binary configuration tensor and correponding probability),
+            the configurations are the digits on each site for qudit circuits
         :rtype: Any
         """
+        if vectorized and not allow_state:
+            nbatch = 1 if batch is None else batch
+            shape = [nbatch, self._nqubits]
+            if status is None:
+                r = backend.implicit_randu(shape)
+            else:
+                r = backend.stateful_randu(status, shape=shape)
+            confg, prob = self.batched_perfect_sampling(r, memory_limit=memory_limit)
+            if batch is None:
+                return confg[0], prob[0]
+            return confg, prob
+
         # allow_state = False is compatibility issue
         if not allow_state:
             if status is None:
@@ -1012,24 +1837,87 @@ class BaseCircuit:
             p = backend.abs(s) ** 2
         else:
             p = backend.real(backend.diagonal(s))
+        dims = self._local_dims()
+        a = int(np.prod(dims))
         if status is None:
-            ch = backend.implicit_randc(a=2**self._nqubits, shape=[nbatch], p=p)
+            ch = backend.implicit_randc(a=a, shape=[nbatch], p=p)
         else:
-            ch = backend.stateful_randc(
-                status, a=2**self._nqubits, shape=[nbatch], p=p
-            )
+            ch = backend.stateful_randc(status, a=a, shape=[nbatch], p=p)
         prob = backend.gather1d(p, ch)
-        confg = backend.mod(
-            backend.right_shift(
-                ch[..., None], backend.reverse(backend.arange(self._nqubits))
-            ),
-            2,
-        )
+        if self._dims is None:
+            confg = backend.mod(
+                backend.right_shift(
+                    ch[..., None], backend.reverse(backend.arange(self._nqubits))
+                ),
+                2,
+            )
+        else:
+            # mixed radix digits of the sampled basis indices
+            weights = np.cumprod([1] + dims[:0:-1])[::-1]
+            ch = backend.cast(ch, "int32")
+            confg = backend.mod(
+                ch[..., None] // backend.convert_to_tensor(weights.astype(np.int32)),
+                backend.convert_to_tensor(np.array(dims, dtype=np.int32)),
+            )
+        if vectorized:
+            if batch is None:
+                return confg[0], prob[0]
+            return confg, prob
         r = list(zip(confg, prob))
         if batch is None:
             r = r[0]
         return r
 
+    def sample_counts(
+        self,
+        shots: int,
+        index: Optional[Sequence[int]] = None,
+        sparse: bool = True,
+        chunk_size: Optional[int] = None,
+        random_state: Optional[Any] = None,
+    ) -> Any:
+        """
+        Measurement counts of ``shots`` shots sampled from the final state,
+        the shots are drawn in chunks and directly accumulated into counts
+        without per shot bit configurations, see :py:func:`tensorcircuit.quantum.sample_counts`.
+        The outcomes of qudit circuits are keyed by the base 36 digits on each site.
+
+        :Example:
+
+        >>> c = tc.Circuit(3)
+        >>> c.H(0)
+        >>> c.cnot(0, 1)
+        >>> c.sample_counts(1000, random_state=42)
+        {'000': 503, '110': 497}
+        >>> c.sample_counts(1000, index=[1], sparse=False, random_state=42)
+        array([503, 497])
+
+        :param shots: The number of measurement shots.
+        :type shots: int
+        :param index: Only count the marginal outcomes on these qubits (in the given order),
+            defaults to None (all qubits)
+        :type index: Optional[Sequence[int]], optional
+        :param sparse: If True, return a dict from bitstrings to nonzero counts,
+            otherwise return the dense histogram, defaults to True
+        :type sparse: bool, optional
+        :param chunk_size: The number of shots drawn in one chunk, defaults to None (:math:`2^{20}`)
+        :type chunk_size: Optional[int], optional
+        :param random_state: seed or ``np.random.Generator`` for the shots, defaults to None
+        :type random_state: Optional[Any], optional
+        :return: The counts dict or the dense histogram (numpy int64 array).
+        :rtype: Any
+        """
+        p = self._marginal_probabilities()
+        return sample_counts(
+            p,
+            shots,
+            index=index,
+            sparse=sparse,
+            chunk_size=chunk_size,
+            random_state=random_state,
+            dim=self._dims,
+        )
+
     def replace_inputs(self, inputs: Tensor) -> None:
         """
         Replace the input state with the circuit structure unchanged.
@@ -1038,14 +1926,14 @@ class BaseCircuit:
         :type inputs: Tensor
         """
         inputs = backend.reshape(inputs, [-1])
-        N = inputs.shape[0]
-        n = int(np.log(N) / np.log(2))
-        assert n == self._nqubits
-        inputs = backend.reshape(inputs, [2 for _ in range(n)])
+        dims = self._local_dims()
+        assert inputs.shape[0] == int(np.prod(dims))
+        inputs = backend.reshape(inputs, dims)
         if self.inputs is not None:
             self._nodes[0].tensor = inputs
             if self.is_dm:
                 self._nodes[1].tensor = backend.conj(inputs)
+            self._qir_complete = False
         else:  # TODO(@refraction-ray) replace several start as inputs
             raise NotImplementedError("not support replace with no inputs")
 
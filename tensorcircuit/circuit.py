@@ -3,7 +3,7 @@ Quantum circuit: the state simulator
 """
 # pylint: disable=invalid-name
 
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 from functools import reduce
 from operator import add
 
@@ -12,8 +12,8 @@ import tensornetwork as tn
 
 from . import gates
 from .cons import backend, contractor, dtypestr, npdtype
-from .quantum import QuOperator, identity
-from .simplify import _full_light_cone_cancel
+from .quantum import QuOperator, identity, _ps2masks, _ps_index_masks
+from .simplify import _full_light_cone_cancel, qir_light_cone
 from .basecircuit import BaseCircuit
 
 Gate = gates.Gate
@@ -36,6 +36,11 @@ class Circuit(BaseCircuit):
     """
 
     is_dm = False
+    # light cone reduction on qir is turned on automatically for expectations without reuse
+    # when the cone has less gates than this fraction of the circuit
+    lightcone_ratio = 0.5
+    # whether the network is fully described by ``circuit_param`` and qir
+    _qir_complete = True
 
     def __init__(
         self,
@@ -43,6 +48,8 @@ class Circuit(BaseCircuit):
         inputs: Optional[Tensor] = None,
         mps_inputs: Optional[QuOperator] = None,
         split: Optional[Dict[str, Any]] = None,
+        deferred: Union[bool, Dict[str, Any]] = False,
+        dim: Optional[Union[int, Sequence[int]]] = None,
     ) -> None:
         """
         Circuit object based on state simulator.
@@ -57,29 +64,53 @@ class Circuit(BaseCircuit):
         :param split: dict if two qubit gate is ready for split, including parameters for at least one of
             ``max_singular_values`` and ``max_truncation_err``.
         :type split: Optional[Dict[str, Any]]
+        :param deferred: If True, the gates are only recorded in the qir during the construction
+            and the tensor network is built in one pass when it is first needed
+            (by ``state``, ``expectation``, ``sample``, ``amplitude`` and so on), defaults to False.
+            A dict turns on the deferred mode with options, i.e. ``{"fuse": True}`` to fuse
+            the gates into (at most) two qubit blocks (or an int for the max block size) before building the network.
+        :type deferred: Union[bool, Dict[str, Any]], optional
+        :param dim: The local dimension of the qudits, or the list of local dimensions
+            for a mixed dimension register, defaults to None (qubits).
+            The local dimensions are otherwise inferred from ``mps_inputs``.
+            Gates on qudits are given as matrices, i.e. ``c.any(0, 1, unitary=u)``
+            with ``u`` of shape :math:`[d_0d_1, d_0d_1]`.
+        :type dim: Optional[Union[int, Sequence[int]]], optional
         """
         self.inputs = inputs
         self.mps_inputs = mps_inputs
         self.split = split
         self._nqubits = nqubits
+        if deferred is not False:
+            self._deferred = {} if deferred is True else dict(deferred)  # type: ignore
 
         self.circuit_param = {
             "nqubits": nqubits,
             "inputs": inputs,
             "mps_inputs": mps_inputs,
             "split": split,
+            "deferred": deferred,
+            "dim": dim,
         }
+        dims = None
+        if dim is not None:
+            dims = [dim for _ in range(nqubits)] if isinstance(dim, int) else list(dim)
+            assert len(dims) == nqubits
         if (inputs is None) and (mps_inputs is None):
-            nodes = self.all_zero_nodes(nqubits)
+            nodes = self.all_zero_nodes(nqubits, d=2 if dims is None else dims)
             self._front = [n.get_edge(0) for n in nodes]
         elif inputs is not None:  # provide input function
             inputs = backend.convert_to_tensor(inputs)
             inputs = backend.cast(inputs, dtype=dtypestr)
             inputs = backend.reshape(inputs, [-1])
-            N = inputs.shape[0]
-            n = int(np.log(N) / np.log(2))
-            assert n == nqubits or n == 2 * nqubits
-            inputs = backend.reshape(inputs, [2 for _ in range(n)])
+            if dims is None:
+                N = inputs.shape[0]
+                n = int(np.log(N) / np.log(2))
+                assert n == nqubits or n == 2 * nqubits
+                inputs = backend.reshape(inputs, [2 for _ in range(n)])
+            else:
+                n = nqubits
+                inputs = backend.reshape(inputs, dims)
             inputs = Gate(inputs)
             nodes = [inputs]
             self._front = [inputs.get_edge(i) for i in range(n)]
@@ -100,6 +131,9 @@ class Circuit(BaseCircuit):
 
         self.coloring_nodes(nodes)
         self._nodes = nodes  # type: ignore
+        dims = [e.dimension for e in self._front[:nqubits]]
+        if any(d != 2 for d in dims):
+            self._dims = dims
 
         self._start_index = len(nodes)
         # self._start = nodes
@@ -163,6 +197,7 @@ class Circuit(BaseCircuit):
         self.coloring_nodes(new_nodes)
         self._nodes = new_nodes + self._nodes[self._start_index :]
         self._start_index = len(new_nodes)
+        self._qir_complete = False
 
     # TODO(@refraction-ray): add noise support in IR
     # TODO(@refraction-ray): unify mid measure to basecircuit
@@ -175,12 +210,17 @@ class Circuit(BaseCircuit):
 
         :param index: The index of qubit that the Z direction postselection applied on.
         :type index: int
-        :param keep: 0 for spin up, 1 for spin down, defaults to be 0.
+        :param keep: 0 for spin up, 1 for spin down, defaults to be 0
+            (the kept digit for qudits).
         :type keep: int, optional
         """
         # normalization not guaranteed
         # assert keep in [0, 1]
-        if keep < 0.5:
+        d = self._local_dims()[index]
+        if d > 2:
+            gate = np.zeros([d, 1], dtype=npdtype)
+            gate[keep, 0] = 1.0
+        elif keep < 0.5:
             gate = np.array(
                 [
                     [1.0],
@@ -206,6 +246,7 @@ class Circuit(BaseCircuit):
         # mg2.is_dagger = False
         # mg2.id = id(mg2)
         self.coloring_nodes([mg1, mg2], flag="post-select")
+        self._qir_complete = False
         mg1.get_edge(0) ^ self._front[index]
         mg1.get_edge(1) ^ mg2.get_edge(1)
         self._front[index] = mg2.get_edge(0)
@@ -561,6 +602,9 @@ class Circuit(BaseCircuit):
         This function is jittable in theory. But only jax+GPU combination is recommended for jit
         since the graph building time is too long for other backend options; though the running
         time of the function is very fast for every case.
+        :py:class:`tensorcircuit.statevector.StateVectorCircuit` evaluates the branch probabilities
+        from the running state instead, and trajectories can be run in batches by
+        :py:class:`tensorcircuit.trajectory.TrajectoryEngine`.
 
         :param kraus: A list of ``tn.Node`` for Kraus operators.
         :type kraus: Sequence[Gate]
@@ -600,15 +644,14 @@ class Circuit(BaseCircuit):
         :return: Tensor with the corresponding shape.
         :rtype: Tensor
         """
-        nodes, d_edges = self._copy()
-        t = contractor(nodes, output_edge_order=d_edges)
+        t = self._contract_state()
         if form == "default":
             shape = [-1]
         elif form == "ket":
             shape = [-1, 1]
         elif form == "bra":  # no conj here
             shape = [1, -1]
-        return backend.reshape(t.tensor, shape=shape)
+        return backend.reshape(t, shape=shape)
 
     state = wavefunction
 
@@ -619,8 +662,8 @@ class Circuit(BaseCircuit):
         :return: ``QuOperator`` object for the circuit unitary (open indices for the input state)
         :rtype: QuOperator
         """
-        mps = identity([2 for _ in range(self._nqubits)])
-        c = Circuit(self._nqubits)
+        mps = identity(self._local_dims())
+        c = Circuit(self._nqubits, dim=self._dims)
         ns, es = self._copy()
         c._nodes = ns
         c._front = es
@@ -640,8 +683,8 @@ class Circuit(BaseCircuit):
         :return: The circuit unitary matrix
         :rtype: Tensor
         """
-        mps = identity([2 for _ in range(self._nqubits)])
-        c = Circuit(self._nqubits)
+        mps = identity(self._local_dims())
+        c = Circuit(self._nqubits, dim=self._dims)
         ns, es = self._copy()
         c._nodes = ns
         c._front = es
@@ -716,7 +759,7 @@ class Circuit(BaseCircuit):
         self,
         *ops: Tuple[tn.Node, List[int]],
         reuse: bool = True,
-        enable_lightcone: bool = False,
+        enable_lightcone: Optional[bool] = None,
     ) -> Tensor:
         """
         Compute the expectation of corresponding operators.
@@ -734,8 +777,15 @@ class Circuit(BaseCircuit):
         :param reuse: If True, then the wavefunction tensor is cached for further expectation evaluation,
             defaults to be true.
         :type reuse: bool, optional
-        :param enable_lightcone: whether enable light cone simplification, defaults to False
-        :type enable_lightcone: bool, optional
+        :param enable_lightcone: whether enable light cone simplification, the gates outside the
+            backward light cone of the operators are dropped from the qir (see ``tc.simplify.qir_light_cone``)
+            before the network is built, defaults to None, i.e. enabled when ``reuse`` is False
+            and the light cone has less gates than ``lightcone_ratio`` of the circuit.
+            For circuits with post-selection
+            or replaced inputs, the light cone cancellation on the network nodes is used instead
+            when ``enable_lightcone=True``. The light cone circuit is cached for the same sites
+            until a new gate is applied.
+        :type enable_lightcone: Optional[bool], optional
         :raises ValueError: "Cannot measure two operators in one index"
         :return: Tensor with one element
         :rtype: Tensor
@@ -746,12 +796,117 @@ class Circuit(BaseCircuit):
         # else:  # reuse
 
         # self._nodes = nodes1
+        # with ``reuse``, the cached state is shared by all the expectations
+        # so that the light cone is only turned on automatically without ``reuse``
+        if self._qir_complete and (
+            enable_lightcone or (enable_lightcone is None and not reuse)
+        ):
+            c = self._lightcone_circuit(ops, bool(enable_lightcone))
+            if c is not None:
+                return c.expectation(*ops, reuse=False, enable_lightcone=False)
         if enable_lightcone:
-            reuse = False
-        nodes1 = self.expectation_before(*ops, reuse=reuse)
-        if enable_lightcone:
+            nodes1 = self.expectation_before(*ops, reuse=False)
             nodes1 = _full_light_cone_cancel(nodes1)
-        return contractor(nodes1).tensor
+            return contractor(nodes1).tensor
+        # the contraction plan is cached for operators on the same sites
+        return self._expectation_planned(*ops, reuse=reuse)
+
+    def _lightcone_circuit(
+        self, ops: Sequence[Tuple[tn.Node, List[int]]], force: bool
+    ) -> Optional["Circuit"]:
+        """
+        The circuit with only the gates in the backward light cone of the operators,
+        or None when the light cone reduction is not used (see ``expectation``).
+        The cone circuits are cached per site set until a new gate is applied,
+        so that the network template and plan caches of the cone circuit are kept across calls.
+        """
+        sites = []
+        for _, index in ops:
+            sites += [index] if isinstance(index, int) else list(index)
+        cache = getattr(self, "_lightcone_circuits", None)
+        if cache is None or cache[0] != len(self._qir):
+            cache = (len(self._qir), {})
+            setattr(self, "_lightcone_circuits", cache)
+        key = (tuple(sorted(set(sites))), force)
+        if key not in cache[1]:
+            cone = qir_light_cone(self._qir, sites)
+            # gates directly applied by ``apply_general_gate`` cannot be replayed
+            replayable = all("gatef" in d for d in cone)
+            c = None
+            if replayable and (
+                force or len(cone) < self.lightcone_ratio * len(self._qir)
+            ):
+                # only the gates in the light cone are built into the network
+                c = type(self)(**self.circuit_param)
+                self._apply_qir(c, cone)
+            cache[1][key] = c
+        return cache[1][key]  # type: ignore
+
+    def expectation_ps_sum(
+        self,
+        structures: Sequence[Sequence[int]],
+        weights: Optional[Sequence[float]] = None,
+        reuse: bool = True,
+        chunk_size: Optional[int] = None,
+    ) -> Tensor:
+        """
+        Compute the expectation of a Pauli string sum on the (cached) output state,
+        the Pauli strings are applied in batch via bit masks on the wavefunction indices
+        instead of contracting one tensor network for each term.
+
+        :Example:
+
+        >>> c = tc.Circuit(2)
+        >>> c.H(0)
+        >>> c.expectation_ps_sum([[1, 0], [3, 3]], [0.5, 2.0])
+        array(0.5+0.j, dtype=complex64)
+
+        :param structures: 2D array, each row is for a Pauli string,
+            e.g. [1, 0, 0, 3, 2] is for :math:`X_0Z_3Y_4`,
+            the same format as ``tc.quantum.PauliStringSum2COO``
+        :type structures: Sequence[Sequence[int]]
+        :param weights: 1D Tensor for the weight of each Pauli string, defaults to None (all weights 1.0)
+        :type weights: Optional[Sequence[float]], optional
+        :param reuse: whether to cache and reuse the wavefunction, defaults to True
+        :type reuse: bool, optional
+        :param chunk_size: the number of Pauli strings evaluated in one batch,
+            defaults to None (about :math:`2^{22}` wavefunction elements in one batch)
+        :type chunk_size: Optional[int], optional
+        :return: Expectation value
+        :rtype: Tensor
+        """
+        structures = np.array(structures, dtype=np.int64)
+        nterms, n = structures.shape
+        if weights is None:
+            weights = np.ones([nterms])
+        weights = backend.cast(backend.convert_to_tensor(weights), dtypestr)
+        if chunk_size is None:
+            chunk_size = max(1, (1 << 22) >> n)
+
+        nodes, _ = self._copy_state_tensor(reuse=reuse)
+        psi = backend.reshape(nodes[0].tensor, [-1])
+        flips, signs, ny = _ps2masks(structures)
+        # Y = iXZ, the overall phase of each string
+        phases = 1j**ny
+        # the index tensor is the only [2^n] sized integer buffer,
+        # the masks and signs are computed chunk by chunk
+        itype = "int64" if n > 31 else "int32"
+        idx = backend.reshape(backend.cast(backend.arange(2**n), itype), [-1, 1])
+
+        values = []
+        for start in range(0, nterms, chunk_size):
+            end = min(start + chunk_size, nterms)
+            flipped, sign = _ps_index_masks(idx, flips[start:end], signs[start:end], n)
+            g = backend.gather1d(psi, backend.reshape(flipped, [-1]))
+            g = backend.reshape(g, [2**n, end - start])
+            v = backend.sum(
+                backend.conj(g)
+                * backend.cast(sign, dtypestr)
+                * backend.reshape(psi, [-1, 1]),
+                axis=0,
+            )
+            values.append(v * backend.cast(phases[start:end], dtypestr))
+        return backend.sum(weights * backend.concat(values))
 
 
 Circuit._meta_apply()
@@ -3,12 +3,31 @@ Constants and setups
 """
 # pylint: disable=invalid-name
 
+from bisect import bisect_left
+from collections import OrderedDict, deque
+import hashlib
+import inspect
+import json
 import logging
+import os
 import sys
+import tempfile
+import time
 from contextlib import contextmanager
 from functools import partial, reduce, wraps
+from itertools import product
 from operator import mul
-from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import numpy as np
 import opt_einsum
@@ -218,49 +237,245 @@ def _sizen(node: tn.Node, is_log: bool = False) -> int:
 def _merge_single_gates(
     nodes: List[Any], total_size: Optional[int] = None
 ) -> Tuple[List[Any], int]:
-    # TODO(@refraction-ray): investigate whether too much copy here so that staging is slow for large circuit
+    """
+    Merge all rank no larger than 2 nodes into their neighbors.
+    Nodes are tracked by position maps (with removed nodes as ``None`` placeholders)
+    so that each merge takes constant time.
+    """
     nodes = list(nodes)
     if total_size is None:
         total_size = sum([_sizen(t) for t in nodes])
-    queue = [n for n in nodes if len(n.tensor.shape) <= 2]
+    # ids are not recycled for alive objects, the identity check below guards the stale entries
+    position = {id(n): i for i, n in enumerate(nodes)}
+    queue = deque([n for n in nodes if len(n.tensor.shape) <= 2])
+    queued = {id(n): n for n in queue}
     while queue:
-        n0 = queue[0]
+        n0 = queue.popleft()
+        if queued.get(id(n0), None) is not n0:
+            continue  # already merged as a neighbor
+        del queued[id(n0)]
         try:
             n0[0]
         except IndexError:
-            queue = _multi_remove(queue, [0])
             continue
         if n0[0].is_dangling():
             try:
                 e0 = n0[1]
                 if e0.is_dangling():
-                    queue = _multi_remove(queue, [0])
                     continue
             except IndexError:
-                queue = _multi_remove(queue, [0])
                 continue
         else:
             e0 = n0[0]
-        njs = [i for i, n in enumerate(nodes) if id(n) in [id(e0.node1), id(e0.node2)]]
-        qjs = [i for i, n in enumerate(queue) if id(n) in [id(e0.node1), id(e0.node2)]]
+        ends = [e0.node1] if e0.node1 is e0.node2 else [e0.node1, e0.node2]
+        njs = sorted(
+            [
+                position[id(n)]
+                for n in ends
+                if id(n) in position and nodes[position[id(n)]] is n
+            ]
+        )
+        for n in ends:
+            if queued.get(id(n), None) is n:
+                del queued[id(n)]
         new_node = tn.contract(e0)
         total_size += _sizen(new_node)  # type: ignore
 
-        logger.debug(
-            _sizen(new_node, is_log=True),
-        )
-        queue = _multi_remove(queue, qjs)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(_sizen(new_node, is_log=True))
         if len(njs) > 1:
             nodes[njs[1]] = new_node
-            nodes = _multi_remove(nodes, [njs[0]])
+            nodes[njs[0]] = None
+            del position[id(ends[0])], position[id(ends[1])]
+            position[id(new_node)] = njs[1]
         else:  # trace edge?
             nodes[njs[0]] = new_node
+            position[id(new_node)] = njs[0]
         if len(new_node.tensor.shape) <= 2:
-            # queue.append(new_node)
-            queue.insert(0, new_node)
+            queue.appendleft(new_node)
+            queued[id(new_node)] = new_node
+    nodes = [n for n in nodes if n is not None]
+    return nodes, total_size  # type: ignore
+
+
+def _absorb_nodes(
+    nodes: List[Any], total_size: Optional[int] = None
+) -> Tuple[List[Any], int]:
+    """
+    One sweep over the nodes, each node is absorbed into its largest neighbor
+    as long as the contracted tensor is not larger than the larger one of them,
+    e.g. rank-2 nodes and two-qubit gates acting on the same pair of legs.
+    """
+    nodes = list(nodes)
+    if total_size is None:
+        total_size = sum([_sizen(t) for t in nodes])
+    position = {id(n): i for i, n in enumerate(nodes)}
+    for i in range(len(nodes)):
+        n0 = nodes[i]
+        if n0 is None:
+            continue
+        size0 = _sizen(n0)
+        shared: Dict[int, int] = {}
+        neighbors = {}
+        for e in n0.edges:
+            if e.is_dangling() or e.node1 is e.node2:
+                continue
+            n1 = e.node2 if e.node1 is n0 else e.node1
+            if id(n1) not in position or nodes[position[id(n1)]] is not n1:
+                continue  # outside of the network
+            shared[id(n1)] = shared.get(id(n1), 1) * e.dimension
+            neighbors[id(n1)] = n1
+        best = None
+        for k, n1 in neighbors.items():
+            size1 = _sizen(n1)
+            if size0 * size1 // shared[k] ** 2 <= max(size0, size1):
+                if best is None or size1 > _sizen(best):
+                    best = n1
+        if best is None:
+            continue
+        new_node = tn.contract_between(n0, best)
+        total_size += _sizen(new_node)  # type: ignore
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(_sizen(new_node, is_log=True))
+        j = position.pop(id(best))
+        del position[id(n0)]
+        nodes[i] = None
+        nodes[j] = new_node
+        position[id(new_node)] = j
+    nodes = [n for n in nodes if n is not None]
     return nodes, total_size  # type: ignore
 
 
+def _preprocess(nodes: List[Any], level: Any) -> Tuple[List[Any], Optional[int]]:
+    """
+    ``preprocessing=True`` (or 1) merges single qubit gates,
+    ``preprocessing=2`` further absorbs the nodes into their neighbors when the size doesn't grow.
+    """
+    if not level:
+        return nodes, None
+    nodes, total_size = _merge_single_gates(nodes)
+    if level >= 2:
+        nodes, total_size = _absorb_nodes(nodes, total_size)
+    return nodes, total_size
+
+
+def _preprocess_structure(
+    input_sets: Sequence[Any], output_set: Any, size_dict: Dict[Any, int], level: Any
+) -> Tuple[List[Tuple[int, int]], List[Set[Any]]]:
+    """
+    The structural counterpart of :py:func:`_preprocess` on the einsum style network,
+    such that the preprocessing can be replayed as the leading steps of a contraction path.
+    Returns the linear path of the preprocessing contractions and the label sets of the remaining tensors,
+    ordered as the linear path convention (untouched inputs followed by the merged tensors).
+    """
+    labels = [set(l) for l in input_sets]
+    n = len(labels)
+    if not level:
+        return [], labels
+    output = set(output_set)
+    where: Dict[Any, Set[int]] = {}
+    for i, l in enumerate(labels):
+        for e in l:
+            where.setdefault(e, set()).add(i)
+    position: List[Optional[int]] = list(range(n))
+    position_of = {i: i for i in range(n)}
+    ssa_path: List[Tuple[int, int]] = []
+
+    def size(i: int) -> int:
+        return _size_of_labels(list(labels[i]), size_dict)
+
+    def merge(a: int, b: int) -> int:
+        la, lb = labels[a], labels[b]
+        lr = (la | lb) - ((la & lb) - output)
+        k = len(labels)
+        labels.append(lr)
+        for e in la:
+            where[e].discard(a)
+        for e in lb:
+            where[e].discard(b)
+        for e in lr:
+            where[e].add(k)
+        ssa_path.append((a, b))
+        pa, pb = sorted([position_of.pop(a), position_of.pop(b)])
+        position[pa] = None
+        position[pb] = k
+        position_of[k] = pb
+        return k
+
+    # merge all rank no larger than 2 tensors into their neighbors
+    queue = deque([i for i in range(n) if len(labels[i]) <= 2])
+    queued = set(queue)
+    while queue:
+        i = queue.popleft()
+        if i not in queued:
+            continue
+        queued.discard(i)
+        neighbor = None
+        for e in sorted(labels[i])[:2]:
+            others = where[e] - {i}
+            if others and e not in output:
+                neighbor = min(others)
+                break
+        if neighbor is None:
+            continue
+        queued.discard(neighbor)
+        k = merge(i, neighbor)
+        if len(labels[k]) <= 2:
+            queue.appendleft(k)
+            queued.add(k)
+    if level >= 2:
+        # absorb the tensors into their largest neighbors when the size doesn't grow
+        for p in range(n):
+            i = position[p]  # type: ignore
+            if i is None:
+                continue
+            size0 = size(i)
+            shared: Dict[int, int] = {}
+            for e in sorted(labels[i]):
+                if e in output:
+                    continue
+                for j in sorted(where[e] - {i}):
+                    shared[j] = shared.get(j, 1) * size_dict[e]
+            best = None
+            for j, d in shared.items():
+                size1 = size(j)
+                if size0 * size1 // d**2 <= max(size0, size1):
+                    if best is None or size1 > size(best):
+                        best = j
+            if best is not None:
+                merge(i, best)
+    # ssa ids to linear ids for the partial path, the alive ids are kept sorted
+    ids = list(range(n))
+    path = []
+    for k, ab in enumerate(ssa_path):
+        con = sorted([bisect_left(ids, i) for i in ab])
+        for j in reversed(con):
+            ids.pop(j)
+        ids.append(n + k)
+        path.append((con[0], con[1]))
+    return path, [labels[i] for i in ids]
+
+
+def _preprocessed_path(
+    input_sets: Sequence[Any],
+    output_set: Any,
+    size_dict: Dict[Any, int],
+    algorithm: Any = None,
+    level: Any = True,
+    **kws: Any
+) -> List[Tuple[int, ...]]:
+    """
+    Path finder applying the contractor ``preprocessing`` as the leading steps of the path,
+    the remaining network is handed over to ``algorithm``.
+    """
+    path, remaining = _preprocess_structure(input_sets, output_set, size_dict, level)
+    if len(remaining) > 1:
+        path = list(path) + list(
+            algorithm(remaining, set(output_set), size_dict, **kws)
+        )
+    return [tuple(ab) for ab in path]
+
+
 def experimental_contractor(
     nodes: List[Any],
     output_edge_order: Optional[List[Any]] = None,
@@ -427,12 +642,185 @@ def _get_path(
 ) -> Tuple[List[Tuple[int, int]], List[tn.Node]]:
     nodes = list(nodes)
     input_sets = [set([id(e) for e in node.edges]) for node in nodes]
-    output_set = set([id(e) for e in tn.get_subgraph_dangling(nodes)])
+    output_set = set([id(e) for e in _get_subgraph_dangling(nodes)])
     size_dict = {id(edge): edge.dimension for edge in tn.get_all_edges(nodes)}
 
     return algorithm(input_sets, output_set, size_dict), nodes  # type: ignore
 
 
+# persistent contraction path cache
+
+_path_cache_conf: Dict[str, Any] = {"enabled": False, "cache_dir": None, "maxsize": 512}
+_path_cache: "OrderedDict[str, List[Tuple[int, ...]]]" = OrderedDict()
+
+
+def set_path_cache(
+    enabled: bool = True, cache_dir: Optional[str] = None, maxsize: int = 512
+) -> None:
+    """
+    Configure the contraction path cache shared by all ``opt_einsum`` type contractors
+    (``custom``, ``custom_stateful`` and the builtin ones such as ``greedy``).
+    The path is keyed by a canonical structural hash of the tensor network together
+    with the path finder, so that the path search is skipped for networks of the same structure.
+    Optimizer instances are distinguished by their configuration (the attributes named after
+    their constructor arguments), an explicit ``cache_key`` attribute (str) on the optimizer
+    takes precedence if the configuration is not captured that way.
+
+    :Example:
+
+    >>> tc.cons.set_path_cache(cache_dir="~/.tc_path_cache")
+    >>> tc.set_contractor("custom", optimizer=opt)
+    >>> c.expectation_ps(z=[0])  # path search only for the first process
+
+    :param enabled: Whether to enable the path cache, defaults to True
+    :type enabled: bool, optional
+    :param cache_dir: The directory for the on-disk path store, defaults to None (in-memory LRU only).
+        The store is safe to be shared across processes as each entry is written atomically.
+    :type cache_dir: Optional[str], optional
+    :param maxsize: The max number of paths kept in the in-memory LRU cache, defaults to 512
+    :type maxsize: int, optional
+    """
+    if cache_dir is not None:
+        cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        os.makedirs(cache_dir, exist_ok=True)
+    _path_cache_conf["enabled"] = enabled
+    _path_cache_conf["cache_dir"] = cache_dir
+    _path_cache_conf["maxsize"] = maxsize
+    while len(_path_cache) > maxsize:
+        _path_cache.popitem(last=False)
+
+
+def clear_path_cache(disk: bool = False) -> None:
+    """
+    Clear the in-memory contraction path cache.
+
+    :param disk: Whether to also remove the on-disk entries in the configured ``cache_dir``,
+        defaults to False
+    :type disk: bool, optional
+    """
+    _path_cache.clear()
+    cache_dir = _path_cache_conf["cache_dir"]
+    if disk and cache_dir is not None and os.path.isdir(cache_dir):
+        for f in os.listdir(cache_dir):
+            if f.endswith(".json"):
+                try:
+                    os.remove(os.path.join(cache_dir, f))
+                except OSError:
+                    pass
+
+
+def _value_signature(v: Any) -> str:
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return repr(v)
+    if isinstance(v, (list, tuple)):
+        return "[" + ",".join(_value_signature(i) for i in v) + "]"
+    if isinstance(v, dict):
+        return str(sorted((str(k), _value_signature(i)) for k, i in v.items()))
+    return _algorithm_signature(v)
+
+
+def _optimizer_conf(optimizer: Any) -> List[Tuple[str, str]]:
+    # the configuration of an optimizer instance: the attributes named after its constructor arguments,
+    # the runtime states (best trials, costs, ...) are excluded so that the signature is stable
+    names = set()
+    for cls in type(optimizer).__mro__:
+        init = cls.__dict__.get("__init__", None)
+        if init is None:
+            continue
+        try:
+            names.update(inspect.signature(init).parameters)
+        except (TypeError, ValueError):
+            pass
+    conf = getattr(optimizer, "__dict__", {})
+    return sorted(
+        (k, _value_signature(conf[k]))
+        for k in names
+        if k not in ["self", "args", "kwargs", "kws"] and k in conf
+    )
+
+
+def _algorithm_signature(algorithm: Any) -> str:
+    if isinstance(algorithm, partial):
+        kws = sorted((k, _value_signature(v)) for k, v in algorithm.keywords.items())
+        return _algorithm_signature(algorithm.func) + str(kws)
+    cache_key = getattr(algorithm, "cache_key", None)
+    if isinstance(cache_key, str):  # explicit key given by the user
+        return "cache_key." + cache_key
+    wrapped = getattr(algorithm, "__wrapped__", None)
+    if wrapped is not None:  # decorated path finder
+        return _algorithm_signature(wrapped)
+    name = getattr(algorithm, "__name__", None)
+    if name is None:  # optimizer instance
+        name = type(algorithm).__name__ + str(_optimizer_conf(algorithm))
+        return str(type(algorithm).__module__) + "." + name
+    return str(getattr(algorithm, "__module__", "")) + "." + str(name)
+
+
+def _structure_hash(
+    input_lists: List[List[int]],
+    output_set: Any,
+    size_dict: Dict[int, int],
+    algorithm: Any,
+) -> str:
+    # relabel edges by the first appearance so that the hash only depends on the network structure
+    relabel: Dict[int, int] = {}
+    for l in input_lists:
+        for e in l:
+            if e not in relabel:
+                relabel[e] = len(relabel)
+    structure = {
+        "inputs": [sorted(set(relabel[e] for e in l)) for l in input_lists],
+        "output": sorted(relabel[e] for e in output_set),
+        "sizes": [size_dict[e] for e in sorted(relabel, key=lambda e: relabel[e])],
+        "algorithm": _algorithm_signature(algorithm),
+    }
+    return hashlib.sha256(
+        json.dumps(structure, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def _load_path(key: str) -> Optional[List[Tuple[int, ...]]]:
+    if key in _path_cache:
+        _path_cache.move_to_end(key)
+        logger.debug("contraction path cache hit (memory): %s" % key)
+        return _path_cache[key]
+    cache_dir = _path_cache_conf["cache_dir"]
+    if cache_dir is None:
+        return None
+    try:
+        with open(os.path.join(cache_dir, key + ".json"), "r") as f:
+            path = [tuple(ab) for ab in json.load(f)]
+    except (OSError, ValueError, TypeError):
+        return None
+    logger.debug("contraction path cache hit (disk): %s" % key)
+    _remember_path(key, path)
+    return path
+
+
+def _remember_path(key: str, path: List[Tuple[int, ...]]) -> None:
+    _path_cache[key] = path
+    _path_cache.move_to_end(key)
+    while len(_path_cache) > _path_cache_conf["maxsize"]:
+        _path_cache.popitem(last=False)
+
+
+def _save_path(key: str, path: Any) -> None:
+    path = [tuple(int(i) for i in ab) for ab in path]
+    _remember_path(key, path)
+    cache_dir = _path_cache_conf["cache_dir"]
+    if cache_dir is None:
+        return
+    # write to a temporary file first and then atomically rename,
+    # so that concurrent processes never see partially written entries
+    try:
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump([list(ab) for ab in path], f)
+        os.replace(tmp, os.path.join(cache_dir, key + ".json"))
+    except OSError as e:
+        logger.warning("failed to write the contraction path cache: %s" % e)
+
+
 def _get_path_cache_friendly(
     nodes: List[tn.Node], algorithm: Any
 ) -> Tuple[List[Tuple[int, int]], List[tn.Node]]:
@@ -453,18 +841,278 @@ def _get_path_cache_friendly(
         return algorithm, nodes_new
 
     input_sets = [set([mapping_dict[id(e)] for e in node.edges]) for node in nodes_new]
-    output_set = set([mapping_dict[id(e)] for e in tn.get_subgraph_dangling(nodes_new)])
+    output_set = set([mapping_dict[id(e)] for e in _get_subgraph_dangling(nodes_new)])
     size_dict = {
         mapping_dict[id(edge)]: edge.dimension for edge in tn.get_all_edges(nodes_new)
     }
-    logger.debug("input_sets: %s" % input_sets)
-    logger.debug("output_set: %s" % output_set)
-    logger.debug("size_dict: %s" % size_dict)
-    logger.debug("path finder algorithm: %s" % algorithm)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("input_sets: %s" % input_sets)
+        logger.debug("output_set: %s" % output_set)
+        logger.debug("size_dict: %s" % size_dict)
+        logger.debug("path finder algorithm: %s" % algorithm)
+    if _path_cache_conf["enabled"]:
+        input_lists = [[mapping_dict[id(e)] for e in node.edges] for node in nodes_new]
+        key = _structure_hash(input_lists, output_set, size_dict, algorithm)
+        path = _load_path(key)
+        if path is None:
+            path = algorithm(input_sets, output_set, size_dict)
+            _save_path(key, path)
+        return path, nodes_new
     return algorithm(input_sets, output_set, size_dict), nodes_new  # type: ignore
     # directly get input_sets, output_set and size_dict by using identity function as algorithm
 
 
+# sliced contraction
+
+
+def _einsum_form(
+    nodes: Sequence[tn.Node], output_edge_order: Sequence[tn.Edge]
+) -> Tuple[List[Any], List[List[int]], List[int], Dict[int, int]]:
+    """
+    Translate the list of nodes into einsum style inputs:
+    tensors, integer labels for each tensor, output labels and the size dict.
+    """
+    mapping_dict: Dict[int, int] = {}
+    for n in nodes:
+        for e in n:
+            if id(e) not in mapping_dict:
+                mapping_dict[id(e)] = len(mapping_dict)
+    tensors = [n.tensor for n in nodes]
+    inputs = [[mapping_dict[id(e)] for e in n.edges] for n in nodes]
+    output = [mapping_dict[id(e)] for e in output_edge_order]
+    size_dict = {mapping_dict[id(e)]: e.dimension for n in nodes for e in n.edges}
+    return tensors, inputs, output, size_dict
+
+
+def _einsum_subscripts(inputs: Sequence[Sequence[int]], output: Sequence[int]) -> str:
+    # local symbols for each einsum call so that the number of distinct letters is bounded
+    symbols: Dict[int, str] = {}
+    for l in list(inputs) + [output]:
+        for i in l:
+            if i not in symbols:
+                symbols[i] = opt_einsum.get_symbol(len(symbols))
+    return (
+        ",".join(["".join(symbols[i] for i in l) for l in inputs])
+        + "->"
+        + "".join(symbols[i] for i in output)
+    )
+
+
+def _path_intermediates(
+    inputs: Sequence[Sequence[int]], output: Sequence[int], path: Sequence[Any]
+) -> List[Tuple[List[int], List[int], List[int]]]:
+    """
+    Follow the linear ``opt_einsum`` type path symbolically,
+    return the (labels of a, labels of b, labels of result) for each pairwise step.
+    """
+    ssa_path, _ = _linear_to_ssa(path, len(inputs))
+    operands = dict(enumerate([list(l) for l in inputs]))
+    # number of occurrences of each label in the remaining operands and the output
+    count: Dict[int, int] = {}
+    for l in list(inputs) + [output]:
+        for i in l:
+            count[i] = count.get(i, 0) + 1
+    steps = []
+    for k, (a, b) in enumerate(ssa_path):
+        la, lb = operands.pop(a), operands.pop(b)
+        for i in la + lb:
+            count[i] -= 1
+        lr = [i for i in la if count[i] > 0 and i not in lb] + [
+            i for i in lb if count[i] > 0
+        ]
+        # repeated (hyper) labels are kept only once
+        lr = list(dict.fromkeys(lr))
+        for i in lr:
+            count[i] += 1
+        operands[len(inputs) + k] = lr
+        steps.append((la, lb, lr))
+    return steps
+
+
+def _size_of_labels(labels: Sequence[int], size_dict: Dict[int, int]) -> int:
+    return reduce(mul, [size_dict[i] for i in labels], 1)  # type: ignore
+
+
+def _find_slices(
+    inputs: Sequence[Sequence[int]],
+    output: Sequence[int],
+    size_dict: Dict[int, int],
+    path: Sequence[Any],
+    memory_limit: int,
+    itemsize: int,
+) -> List[int]:
+    """
+    Greedily pick the labels to be sliced so that the largest intermediate
+    tensor along ``path`` fits in ``memory_limit`` bytes.
+    """
+    steps = _path_intermediates(inputs, output, path)
+    # the final output has to be allocated anyway and is excluded from the budget
+    tensors = [list(l) for l in inputs] + [lr for _, _, lr in steps[:-1]]
+    sizes = dict(size_dict)
+    sliced: List[int] = []
+
+    def peak() -> int:
+        return max([_size_of_labels(l, sizes) for l in tensors] + [1])
+
+    while peak() * itemsize > memory_limit:
+        largest = peak()
+        candidates = set()
+        for l in tensors:
+            if _size_of_labels(l, sizes) == largest:
+                candidates.update(i for i in l if i not in output and sizes[i] > 1)
+        if not candidates:
+            logger.warning(
+                "cannot fit the contraction into %s bytes by slicing" % memory_limit
+            )
+            break
+
+        def score(i: int) -> Tuple[int, int]:
+            nsizes = dict(sizes)
+            nsizes[i] = 1
+            ls = [_size_of_labels(l, nsizes) for l in tensors]
+            return max(ls), sum(ls)
+
+        best = min(sorted(candidates), key=score)
+        sizes[best] = 1
+        sliced.append(best)
+    return sliced
+
+
+def _contract_path_arrays(
+    tensors: Sequence[Any],
+    inputs: Sequence[Sequence[int]],
+    output: Sequence[int],
+    path: Sequence[Any],
+    einsum: Callable[..., Any],
+) -> Any:
+    operands = list(zip(tensors, [list(l) for l in inputs]))
+    for ab in path:
+        if len(ab) < 2:
+            continue
+        a, b = ab
+        (ta, la), (tb, lb) = operands[a], operands[b]
+        operands = _multi_remove(operands, [a, b])
+        keep = set(output)
+        for _, l in operands:
+            keep.update(l)
+        lr = list(
+            dict.fromkeys(
+                [i for i in la if i in keep and i not in lb]
+                + [i for i in lb if i in keep]
+            )
+        )
+        operands.append((einsum(_einsum_subscripts([la, lb], lr), ta, tb), lr))
+    t, l = operands[0]
+    if list(l) != list(output):
+        t = einsum(_einsum_subscripts([l], output), t)
+    return t
+
+
+def _take_slice(
+    tensor: Any, labels: Sequence[int], assignment: Dict[int, int]
+) -> Tuple[Any, List[int]]:
+    index = tuple(assignment.get(i, slice(None)) for i in labels)
+    if all(isinstance(i, slice) for i in index):
+        return tensor, list(labels)
+    return tensor[index], [i for i in labels if i not in assignment]
+
+
+def _contract_slice(
+    tensors: Sequence[Any],
+    inputs: Sequence[Sequence[int]],
+    output: Sequence[int],
+    path: Sequence[Any],
+    assignment: Dict[int, int],
+    backend_name: Optional[str] = None,
+) -> Any:
+    # module level function, so that it can be pickled for process pool executor
+    if backend_name is None:
+        K = backend
+    else:
+        K = get_backend(backend_name)
+    sliced = [_take_slice(t, l, assignment) for t, l in zip(tensors, inputs)]
+    return _contract_path_arrays(
+        [t for t, _ in sliced], [l for _, l in sliced], output, path, K.einsum
+    )
+
+
+def _sliced_contract(
+    nodes: List[tn.Node],
+    path: Sequence[Any],
+    output_edge_order: Sequence[tn.Edge],
+    memory_limit: int,
+    executor: Optional[Any] = None,
+) -> tn.Node:
+    """
+    Contract the nodes along ``path`` with some edges sliced such that
+    the largest intermediate tensor fits into ``memory_limit`` bytes.
+    Each slice is contracted independently and the results are summed up.
+    """
+    tensors, inputs, output, size_dict = _einsum_form(nodes, output_edge_order)
+    itemsize = np.dtype(dtypestr).itemsize
+    sliced = _find_slices(inputs, output, size_dict, path, memory_limit, itemsize)
+    assignments = (
+        dict(zip(sliced, values))
+        for values in product(*[range(size_dict[i]) for i in sliced])
+    )
+    nslices = int(np.prod([size_dict[i] for i in sliced]))
+    logger.info("----- SLICES: %s on %s edges --------\n" % (nslices, len(sliced)))
+    # the slice results are accumulated in a running sum,
+    # so that the peak memory is not multiplied by the number of slices
+    result = None
+    if executor is None:
+        for a in assignments:
+            r = _contract_slice(tensors, inputs, output, path, a)
+            result = r if result is None else result + r
+    else:
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        backend_name = None
+        own_executor = False
+        if isinstance(executor, str):
+            own_executor = True
+            if executor == "process":
+                executor = ProcessPoolExecutor()
+            else:  # "thread"
+                executor = ThreadPoolExecutor()
+        if isinstance(executor, ProcessPoolExecutor):
+            # only numpy arrays are safe to be sent to the worker processes
+            tensors = [backend.numpy(t) for t in tensors]
+            backend_name = "numpy"
+        # the number of slices in flight is capped by the number of workers
+        max_inflight = getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+        futures: Any = deque()
+
+        def collect() -> None:
+            nonlocal result
+            r = futures.popleft().result()
+            if backend_name is not None:
+                r = backend.convert_to_tensor(r)
+            result = r if result is None else result + r
+
+        try:
+            for a in assignments:
+                if len(futures) >= max_inflight:
+                    collect()
+                futures.append(
+                    executor.submit(
+                        _contract_slice, tensors, inputs, output, path, a, backend_name
+                    )
+                )
+            while futures:
+                collect()
+        finally:
+            if own_executor:
+                executor.shutdown()
+    final_node = tn.Node(result)
+    for i, e in enumerate(output_edge_order):
+        e.update_axis(
+            old_node=e.node1, old_axis=e.axis1, new_axis=i, new_node=final_node
+        )
+        final_node.add_edge(e, i, override=True)
+    return final_node
+
+
 # some contractor setup usages
 """
 import cotengra as ctg
@@ -502,6 +1150,251 @@ tc.set_contractor("custom", optimizer=opt_reconf)
 """
 
 
+# contraction telemetry
+
+_contraction_hooks: List[Callable[[Dict[str, Any]], None]] = []
+
+
+class ContractionRecorder:
+    """
+    Collect the telemetry records emitted by ``opt_einsum`` type contractors,
+    see :py:func:`record_contraction`.
+    Each record is a dict for one contraction with keys:
+    "nnodes", "path_time", "contract_time", "flops", "write_bytes", "peak_live_bytes",
+    "sliced", "planned" (replayed from a compiled contraction plan without path finding) and "steps" (list of dicts with keys "step", "time", "shape", "bytes",
+    "live_bytes" and "flops" for each pairwise contraction).
+    Times are in seconds and measure the tracing time instead when staged by jit.
+    """
+
+    def __init__(self) -> None:
+        self.records: List[Dict[str, Any]] = []
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        self.records.append(record)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """
+        Flatten the records into one dict per contraction step (pandas friendly),
+        the contraction level fields are prefixed with "contraction_".
+
+        :return: List of flat dicts, e.g. ``pd.DataFrame(recorder.to_list())``
+        :rtype: List[Dict[str, Any]]
+        """
+        rows = []
+        for i, r in enumerate(self.records):
+            summary = {"contraction": i}
+            summary.update(
+                {"contraction_" + k: v for k, v in r.items() if k != "steps"}
+            )
+            for step in r["steps"]:
+                row = dict(summary)
+                row.update(step)
+                rows.append(row)
+        return rows
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        """
+        Dump the records as json string, and write to file ``path`` if provided.
+
+        :param path: The file path, defaults to None
+        :type path: Optional[str], optional
+        :return: The json string.
+        :rtype: str
+        """
+        r = json.dumps(self.records)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(r)
+        return r
+
+
+def add_contraction_hook(hook: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Register a callback called with the telemetry record (see :py:class:`ContractionRecorder`)
+    after each contraction by ``opt_einsum`` type contractors.
+
+    :param hook: Callable accepting the record dict.
+    :type hook: Callable[[Dict[str, Any]], None]
+    """
+    _contraction_hooks.append(hook)
+
+
+def remove_contraction_hook(hook: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Unregister the telemetry callback added by :py:func:`add_contraction_hook`.
+
+    :param hook: The registered callback.
+    :type hook: Callable[[Dict[str, Any]], None]
+    """
+    _contraction_hooks.remove(hook)
+
+
+@contextmanager
+def record_contraction() -> Iterator[ContractionRecorder]:
+    """
+    Context manager recording the telemetry of contractions within the context.
+
+    :Example:
+
+    >>> with tc.cons.record_contraction() as recorder:
+    ...     c = tc.Circuit(4)
+    ...     c.h(0)
+    ...     c.cnot(0, 1)
+    ...     c.state()
+    >>> recorder.records[0]["flops"], recorder.records[0]["peak_live_bytes"]
+    >>> recorder.to_json("contraction.json")
+    >>> import pandas as pd
+    >>> pd.DataFrame(recorder.to_list())
+
+    :yield: The recorder with the records collected.
+    :rtype: Iterator[ContractionRecorder]
+    """
+    recorder = ContractionRecorder()
+    add_contraction_hook(recorder)
+    try:
+        yield recorder
+    finally:
+        remove_contraction_hook(recorder)
+
+
+def _tensor_nbytes(tensor: Any) -> int:
+    itemsize = getattr(tensor.dtype, "size", None)  # tf dtype
+    if itemsize is None:
+        itemsize = np.dtype(tensor.dtype).itemsize
+    return reduce(mul, list(tensor.shape) + [1]) * itemsize  # type: ignore
+
+
+def _nbytes(node: tn.Node) -> int:
+    return _tensor_nbytes(node.tensor)
+
+
+def _emit_contraction_record(record: Dict[str, Any]) -> None:
+    for hook in list(_contraction_hooks):
+        hook(record)
+
+
+def _contract_ssa_path_recorded(
+    store: Dict[int, tn.Node],
+    ssa_path: Sequence[Tuple[int, int]],
+    debug_level: int,
+    record: Dict[str, Any],
+) -> None:
+    """
+    Instrumented version of the contraction loop in ``_base``.
+    """
+    if debug_level == 1:
+        from .simplify import pseudo_contract_between
+    n = len(store)
+    live = sum([_nbytes(t) for t in store.values()])
+    peak = live
+    flops_total = 0
+    write = 0
+    time0 = time.perf_counter()
+    for i, (a, b) in enumerate(ssa_path):
+        na, nb = store.pop(a), store.pop(b)
+        shared = reduce(mul, [e.dimension for e in tn.get_shared_edges(na, nb)] + [1])
+        flops = _sizen(na) * _sizen(nb) // shared
+        stime = time.perf_counter()
+        if debug_level == 1:
+            new_node = pseudo_contract_between(na, nb)
+        else:
+            new_node = tn.contract_between(na, nb, allow_outer_product=True)
+        stime = time.perf_counter() - stime
+        store[n + i] = new_node
+        nbytes = _nbytes(new_node)
+        peak = max(peak, live + nbytes)
+        live += nbytes - _nbytes(na) - _nbytes(nb)
+        flops_total += flops
+        write += nbytes
+        record["steps"].append(
+            {
+                "step": i,
+                "time": stime,
+                "shape": [int(d) for d in new_node.tensor.shape],
+                "bytes": nbytes,
+                "live_bytes": live,
+                "flops": flops,
+            }
+        )
+    record["contract_time"] = time.perf_counter() - time0
+    record["flops"] = flops_total
+    record["write_bytes"] = write
+    record["peak_live_bytes"] = peak
+
+
+def _get_subgraph_dangling(nodes: Sequence[tn.Node]) -> Set[tn.Edge]:
+    """
+    Linear time version of ``tn.get_subgraph_dangling``, get the edges of ``nodes``
+    which are dangling or connected to nodes outside of ``nodes``.
+    """
+    ids = set([id(n) for n in nodes])
+    output = set()
+    for n in nodes:
+        for e in n.edges:
+            if e.is_dangling() or id(e.node1) not in ids or id(e.node2) not in ids:
+                output.add(e)
+    return output
+
+
+def _linear_to_ssa(
+    path: Sequence[Sequence[int]], n: int
+) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """
+    Convert the linear ``opt_einsum`` type path on ``n`` tensors into the
+    static single assignment form where the contracted tensor of step ``i`` has id ``n + i``.
+    Single element tuples are skipped with a warning.
+
+    :return: The ssa path and the ssa ids of the tensors left after the path
+    :rtype: Tuple[List[Tuple[int, int]], List[int]]
+    """
+    # the ssa id of a tensor is also its slot, the position in the linear list is the rank
+    # of the slot among the alive ones, a Fenwick tree over the alive flags gives the rank
+    # lookup and the removal in O(log n) instead of the O(n) ``del`` on the list
+    size = n + len(path)
+    alive = [False] * size
+    tree = [0] * (size + 1)
+
+    def add(i: int, v: int) -> None:
+        i += 1
+        while i <= size:
+            tree[i] += v
+            i += i & -i
+
+    def find(k: int) -> int:
+        # slot of the ``k``-th (0 based) alive tensor
+        pos, step = 0, 1 << size.bit_length()
+        while step:
+            if pos + step <= size and tree[pos + step] <= k:
+                pos += step
+                k -= tree[pos]
+            step >>= 1
+        return pos
+
+    # linear time construction with the first ``n`` slots alive
+    for i in range(1, size + 1):
+        if i <= n:
+            alive[i - 1] = True
+            tree[i] += 1
+        parent = i + (i & -i)
+        if parent <= size:
+            tree[parent] += tree[i]
+    ssa_path = []
+    for ab in path:
+        if len(ab) < 2:
+            logger.warning("single element tuple in contraction path!")
+            continue
+        a, b = ab
+        sa, sb = find(a), find(b)
+        ssa_path.append((sa, sb))
+        for j in (sa, sb):
+            alive[j] = False
+            add(j, -1)
+        new = n + len(ssa_path) - 1
+        alive[new] = True
+        add(new, 1)
+    return ssa_path, [i for i in range(size) if alive[i]]
+
+
 def _base(
     nodes: List[tn.Node],
     algorithm: Any,
@@ -509,6 +1402,8 @@ def _base(
     ignore_edge_order: bool = False,
     total_size: Optional[int] = None,
     debug_level: int = 0,
+    slicing_memory_limit: Optional[int] = None,
+    slicing_executor: Optional[Any] = None,
 ) -> tn.Node:
     """
     The base method for all `opt_einsum` contractors.
@@ -525,6 +1420,13 @@ def _base(
     :type ignore_edge_order: bool
     :param total_size: The total size of the tensor network.
     :type total_size: Optional[int], optional
+    :param slicing_memory_limit: If set, some edges are sliced such that the largest intermediate
+        tensor fits into the byte budget, the slices are contracted independently and summed up.
+    :type slicing_memory_limit: Optional[int], optional
+    :param slicing_executor: "thread", "process" or a ``concurrent.futures.Executor`` to
+        contract the slices in parallel (only for eager execution), defaults to None (sequential).
+        The process pool only works with numpy arrays.
+    :type slicing_executor: Optional[Any], optional
     :raises ValueError:"The final node after contraction has more than
         one remaining edge. In this case `output_edge_order` has to be provided," or
         "Output edges are not equal to the remaining non-contracted edges of the final node."
@@ -539,7 +1441,7 @@ def _base(
 
     if not ignore_edge_order:
         if output_edge_order is None:
-            output_edge_order = list(tn.get_subgraph_dangling(nodes))
+            output_edge_order = list(_get_subgraph_dangling(nodes))
             if len(output_edge_order) > 1:
                 raise ValueError(
                     "The final node after contraction has more than "
@@ -547,20 +1449,23 @@ def _base(
                     "has to be provided."
                 )
 
-        if set(output_edge_order) != tn.get_subgraph_dangling(nodes):
+        if set(output_edge_order) != _get_subgraph_dangling(nodes):
             raise ValueError(
                 "output edges are not equal to the remaining "
                 "non-contracted edges of the final node."
             )
 
+    position = {id(n): i for i, n in enumerate(nodes)}
+    nodes = list(nodes)
+    traced = []
     for edge in edges:
         if not edge.is_disabled:  # if its disabled we already contracted it
             if edge.is_trace():
-                idx = [i for i, n in enumerate(nodes) if id(n) == id(edge.node1)]
-                nodes = _multi_remove(nodes, idx)
-                nodes.append(tn.contract_parallel(edge))
-                # nodes_set.remove(edge.node1)
-                # nodes_set.add(tn.contract_parallel(edge))
+                nodes[position.pop(id(edge.node1))] = None
+                traced.append(tn.contract_parallel(edge))
+    if traced:
+        # traced nodes are moved to the end as they are contracted
+        nodes = [n for n in nodes if n is not None] + traced
 
     if len(nodes) == 1:
         # There's nothing to contract.
@@ -574,40 +1479,81 @@ def _base(
     # if isinstance(algorithm, list):
     #     path = algorithm
     # else:
-    path, nodes = _get_path_cache_friendly(nodes, algorithm)
+    record = None
+    if _contraction_hooks:
+        time0 = time.perf_counter()
+        path, nodes = _get_path_cache_friendly(nodes, algorithm)
+        record = {
+            "nnodes": len(nodes),
+            "path_time": time.perf_counter() - time0,
+            "contract_time": 0.0,
+            "flops": 0,
+            "write_bytes": 0,
+            "peak_live_bytes": 0,
+            "sliced": False,
+            "planned": False,
+            "steps": [],
+        }
+    else:
+        path, nodes = _get_path_cache_friendly(nodes, algorithm)
     if debug_level == 2:  # do nothing
+        if record is not None:
+            _emit_contraction_record(record)
         if output_edge_order:
             shape = [e.dimension for e in output_edge_order]
         else:
             shape = []
         return tn.Node(backend.zeros(shape))
-    logger.info("the contraction path is given as %s" % str(path))
-    if total_size is None:
-        total_size = sum([_sizen(t) for t in nodes])
-    for ab in path:
-        if len(ab) < 2:
-            logger.warning("single element tuple in contraction path!")
-            continue
-        a, b = ab
-
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("the contraction path is given as %s" % str(path))
+    if slicing_memory_limit is not None and debug_level == 0:
+        if ignore_edge_order:
+            output_edge_order = list(_get_subgraph_dangling(nodes))
+        if record is not None:
+            time0 = time.perf_counter()
+        final_node = _sliced_contract(
+            nodes,
+            path,
+            output_edge_order,  # type: ignore
+            slicing_memory_limit,
+            slicing_executor,
+        )
+        if record is not None:
+            record["contract_time"] = time.perf_counter() - time0
+            record["sliced"] = True
+            _emit_contraction_record(record)
+        return final_node
+    # nodes are kept in a static single assignment store with O(1) removal
+    store = dict(enumerate(nodes))
+    ssa_path, remaining = _linear_to_ssa(path, len(nodes))
+    if record is not None:
+        _contract_ssa_path_recorded(store, ssa_path, debug_level, record)
+        _emit_contraction_record(record)
+    else:
+        log_debug = logger.isEnabledFor(logging.DEBUG)
+        log_info = logger.isEnabledFor(logging.INFO)
+        if log_info and total_size is None:
+            total_size = sum([_sizen(t) for t in nodes])
         if debug_level == 1:
             from .simplify import pseudo_contract_between
-
-            new_node = pseudo_contract_between(nodes[a], nodes[b])
-        else:
-            new_node = tn.contract_between(nodes[a], nodes[b], allow_outer_product=True)
-        nodes.append(new_node)
-        # nodes[a] = backend.zeros([1])
-        # nodes[b] = backend.zeros([1])
-        nodes = _multi_remove(nodes, [a, b])
-
-        logger.debug(_sizen(new_node, is_log=True))
-        total_size += _sizen(new_node)  # type: ignore
-    logger.info("----- WRITE: %s --------\n" % np.log2(total_size))  # type: ignore
+        for i, (a, b) in enumerate(ssa_path):
+            na, nb = store.pop(a), store.pop(b)
+            if debug_level == 1:
+                new_node = pseudo_contract_between(na, nb)
+            else:
+                new_node = tn.contract_between(na, nb, allow_outer_product=True)
+            store[len(nodes) + i] = new_node
+
+            if log_debug:
+                logger.debug(_sizen(new_node, is_log=True))
+            if log_info:
+                total_size += _sizen(new_node)  # type: ignore
+        if log_info:
+            logger.info("----- WRITE: %s --------\n" % np.log2(total_size))  # type: ignore
 
     # if the final node has more than one edge,
     # output_edge_order has to be specified
-    final_node = nodes[0]  # nodes were connected, we checked this
+    final_node = store[remaining[0]]  # nodes were connected, we checked this
     if not ignore_edge_order:
         final_node.reorder_edges(output_edge_order)
     return final_node
@@ -624,12 +1570,17 @@ def custom(
     if len(nodes) < 5:
         alg = opt_einsum.paths.optimal
         # not good at minimize WRITE actually...
-        return _base(nodes, alg, output_edge_order, ignore_edge_order)
+        return _base(
+            nodes,
+            alg,
+            output_edge_order,
+            ignore_edge_order,
+            slicing_memory_limit=kws.get("slicing_memory_limit", None),
+            slicing_executor=kws.get("slicing_executor", None),
+        )
 
-    total_size = None
-    if kws.get("preprocessing", None):
-        # nodes = _full_light_cone_cancel(nodes)
-        nodes, total_size = _merge_single_gates(nodes)
+    # nodes = _full_light_cone_cancel(nodes)
+    nodes, total_size = _preprocess(nodes, kws.get("preprocessing", None))
     if not isinstance(optimizer, list):
         alg = partial(optimizer, memory_limit=memory_limit)
     else:
@@ -642,6 +1593,8 @@ def custom(
         ignore_edge_order,
         total_size,
         debug_level=debug_level,
+        slicing_memory_limit=kws.get("slicing_memory_limit", None),
+        slicing_executor=kws.get("slicing_executor", None),
     )
 
 
@@ -658,11 +1611,16 @@ def custom_stateful(
         alg = opt_einsum.paths.optimal
         # dynamic_programming has a potential bug for outer product
         # not good at minimize WRITE actually...
-        return _base(nodes, alg, output_edge_order, ignore_edge_order)
+        return _base(
+            nodes,
+            alg,
+            output_edge_order,
+            ignore_edge_order,
+            slicing_memory_limit=kws.get("slicing_memory_limit", None),
+            slicing_executor=kws.get("slicing_executor", None),
+        )
 
-    total_size = None
-    if kws.get("preprocessing", None):
-        nodes, total_size = _merge_single_gates(nodes)
+    nodes, total_size = _preprocess(nodes, kws.get("preprocessing", None))
     if opt_conf is None:
         opt_conf = {}
     opt = optimizer(**opt_conf)  # reinitiate the optimizer each time
@@ -678,6 +1636,8 @@ def custom_stateful(
         ignore_edge_order,
         total_size,
         debug_level=debug_level,
+        slicing_memory_limit=kws.get("slicing_memory_limit", None),
+        slicing_executor=kws.get("slicing_executor", None),
     )
 
 
@@ -704,9 +1664,166 @@ def contraction_info_decorator(algorithm: Callable[..., Any]) -> Callable[..., A
         )
         return path
 
+    new_algorithm.__wrapped__ = algorithm  # type: ignore
     return new_algorithm
 
 
+def _get_algorithm(cf: Optional[Any] = None, nnodes: int = 5) -> Any:
+    """
+    Get the path finding algorithm underlying the contractor ``cf``
+    (defaults to the global contractor), fallback to greedy for contractors
+    without an ``opt_einsum`` type path finder.
+    The ``preprocessing`` option of the contractor is included as the leading steps of the path.
+    """
+    if cf is None:
+        cf = getattr(thismodule, "contractor")
+    if isinstance(cf, partial) and cf.func in [custom, custom_stateful]:
+        if nnodes < 5:
+            return opt_einsum.paths.optimal
+        optimizer = cf.keywords.get("optimizer", None)
+        memory_limit = cf.keywords.get("memory_limit", None)
+        if isinstance(optimizer, list):
+            return optimizer
+        if cf.func is custom_stateful:
+            optimizer = optimizer(**(cf.keywords.get("opt_conf", None) or {}))
+        if optimizer is not None:
+            alg = partial(optimizer, memory_limit=memory_limit)
+            level = cf.keywords.get("preprocessing", None)
+            if level:
+                # the preprocessing of the contractor is replayed as the leading path steps
+                return partial(_preprocessed_path, algorithm=alg, level=level)
+            return alg
+    return opt_einsum.paths.greedy
+
+
+def _get_plan_algorithm(cf: Optional[Any] = None, nnodes: int = 5) -> Any:
+    """
+    The path finder of the contractor ``cf`` (defaults to the global contractor)
+    if the contraction can be replayed by a precompiled plan,
+    i.e. ``opt_einsum`` type contractors without slicing or debug options, otherwise None.
+    The ``preprocessing`` option is replayed by the plan as the leading contraction steps.
+    """
+    if cf is None:
+        cf = getattr(thismodule, "contractor")
+    if not (isinstance(cf, partial) and cf.func in [custom, custom_stateful]):
+        return None
+    for k in ["slicing_memory_limit", "debug_level", "contraction_info"]:
+        if cf.keywords.get(k, None):
+            return None
+    return _get_algorithm(cf, nnodes)
+
+
+def _get_path_from_structure(
+    inputs: Sequence[Sequence[int]],
+    output: Sequence[int],
+    size_dict: Dict[int, int],
+    algorithm: Optional[Any] = None,
+) -> List[Tuple[int, ...]]:
+    """
+    Get the linear contraction path for the einsum style network structure
+    (with the path cache if enabled), ``algorithm`` defaults to the path finder of the current contractor.
+    """
+    if algorithm is None:
+        algorithm = _get_algorithm(nnodes=len(inputs))
+    if len(inputs) < 2:
+        return []
+    if isinstance(algorithm, list):
+        return algorithm
+    input_sets = [set(l) for l in inputs]
+    if _path_cache_conf["enabled"]:
+        key = _structure_hash(inputs, set(output), size_dict, algorithm)
+        path = _load_path(key)
+        if path is None:
+            path = algorithm(input_sets, set(output), size_dict)
+            _save_path(key, path)
+        return path  # type: ignore
+    return algorithm(input_sets, set(output), size_dict)  # type: ignore
+
+
+def _estimate_from_structure(
+    inputs: Sequence[Sequence[int]],
+    output: Sequence[int],
+    size_dict: Dict[int, int],
+    algorithm: Optional[Any] = None,
+) -> Dict[str, Any]:
+    path = _get_path_from_structure(inputs, output, size_dict, algorithm)
+    flops = 0
+    write = 0
+    largest = max([_size_of_labels(l, size_dict) for l in inputs] + [1])
+    for la, lb, lr in _path_intermediates(inputs, output, path):
+        flops += _size_of_labels(list(set(la) | set(lb)), size_dict)
+        size = _size_of_labels(lr, size_dict)
+        write += size
+        largest = max(largest, size)
+    return {
+        "flops": flops,
+        "write": write,
+        "size": largest,
+        "max_intermediate_bytes": largest * np.dtype(dtypestr).itemsize,
+        "width": float(np.log2(largest)),
+        "path": [tuple(ab) for ab in path],
+    }
+
+
+def _merge_cost(*reports: Dict[str, Any]) -> Dict[str, Any]:
+    largest = max([r["size"] for r in reports])
+    return {
+        "flops": sum([r["flops"] for r in reports]),
+        "write": sum([r["write"] for r in reports]),
+        "size": largest,
+        "max_intermediate_bytes": max([r["max_intermediate_bytes"] for r in reports]),
+        "width": float(np.log2(largest)),
+        "path": [r["path"] for r in reports],
+    }
+
+
+def estimate(
+    nodes: Sequence[tn.Node],
+    output_edge_order: Optional[Sequence[tn.Edge]] = None,
+    algorithm: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """
+    Dry-run estimation of the contraction cost for the tensor network ``nodes``,
+    the path is searched by the current contractor (or ``algorithm``) while no tensor is contracted or allocated.
+    The ``preprocessing`` option of the current contractor is applied as the real contraction,
+    i.e. the merges of the preprocessing are the leading steps of the reported path and are included in the cost.
+
+    :Example:
+
+    >>> c = tc.Circuit(10)
+    >>> for i in range(9):
+    ...     c.cnot(i, i + 1)
+    >>> report = tc.cons.estimate(c._nodes, c._front)
+    >>> report["flops"], report["max_intermediate_bytes"], report["width"]
+
+    :param nodes: The list of ``tn.Node`` in the network
+    :type nodes: Sequence[tn.Node]
+    :param output_edge_order: The dangling edges kept as output, defaults to None
+        (all dangling edges of the network)
+    :type output_edge_order: Optional[Sequence[tn.Edge]], optional
+    :param algorithm: ``opt_einsum`` type path finder or a path, defaults to None
+        (the path finder of the current contractor, together with its preprocessing)
+    :type algorithm: Optional[Any], optional
+    :return: The cost report dict with keys: "flops" (number of multiply-add operations),
+        "write" (total number of elements written for intermediate tensors),
+        "size" (number of elements of the largest intermediate tensor),
+        "max_intermediate_bytes", "width" (log2 of "size") and "path"
+    :rtype: Dict[str, Any]
+    """
+    nodes = list(nodes)
+    if output_edge_order is None:
+        output_edge_order = list(_get_subgraph_dangling(nodes))
+    mapping_dict: Dict[int, int] = {}
+    for n in nodes:
+        for e in n:
+            if id(e) not in mapping_dict:
+                mapping_dict[id(e)] = len(mapping_dict)
+    inputs = [[mapping_dict[id(e)] for e in n.edges] for n in nodes]
+    output = [mapping_dict[id(e)] for e in output_edge_order]
+    size_dict = {mapping_dict[id(e)]: e.dimension for n in nodes for e in n.edges}
+    return _estimate_from_structure(inputs, output, size_dict, algorithm)
+
+
 def set_contractor(
     method: Optional[str] = None,
     optimizer: Optional[Any] = None,
@@ -726,8 +1843,14 @@ def set_contractor(
     :param optimizer: Valid for "custom" or "custom_stateful" as method, defaults to None
     :type optimizer: Optional[Any], optional
     :param memory_limit: It is not very useful, as ``memory_limit`` leads to ``branch`` contraction
-        instead of ``greedy`` which is rather slow, defaults to None
+        instead of ``greedy`` which is rather slow, defaults to None.
+        To bound the peak memory of the contraction, use ``slicing_memory_limit`` (in bytes) instead,
+        which slices the network and contracts the slices one by one (optionally in parallel with
+        ``slicing_executor`` as "thread" or "process").
     :type memory_limit: Optional[int], optional
+    :param preprocessing: (keyword argument) valid for "custom" or "custom_stateful" as method,
+        if True, single qubit gates are merged into their neighbors before path finding,
+        if 2, nodes are further absorbed into their neighbors whenever the tensor size doesn't grow
     :raises Exception: Tensornetwork version is too low to support some of the contractors.
     :raises ValueError: Unknown method options.
     :return: The new tensornetwork with its contractor set.
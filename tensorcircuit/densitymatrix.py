@@ -5,7 +5,7 @@ Quantum circuit class but with density matrix simulator
 
 from functools import reduce
 from operator import add
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import tensornetwork as tn
@@ -14,9 +14,11 @@ from . import gates
 from . import channels
 from .channels import kraus_to_super_gate
 from .circuit import Circuit
-from .cons import backend, contractor, dtypestr
+from .cons import backend, contractor, dtypestr, npdtype
 from .basecircuit import BaseCircuit
+from .noisemodel import NoiseModel
 from .quantum import QuOperator
+from .statevector import _apply_dense, _dense_gate
 
 Gate = gates.Gate
 Tensor = Any
@@ -34,6 +36,7 @@ class DMCircuit(BaseCircuit):
         dminputs: Optional[Tensor] = None,
         mpo_dminputs: Optional[QuOperator] = None,
         split: Optional[Dict[str, Any]] = None,
+        deferred: Union[bool, Dict[str, Any]] = False,
     ) -> None:
         """
         The density matrix simulator based on tensornetwork engine.
@@ -53,6 +56,12 @@ class DMCircuit(BaseCircuit):
         :param split: dict if two qubit gate is ready for split, including parameters for at least one of
             ``max_singular_values`` and ``max_truncation_err``.
         :type split: Optional[Dict[str, Any]]
+        :param deferred: If True, the gates are only recorded in the qir during the construction
+            and the tensor network is built in one pass when it is first needed
+            (by ``state``, ``expectation``, ``sample``, ``amplitude`` and so on), defaults to False.
+            A dict turns on the deferred mode with options, i.e. ``{"fuse": True}`` to fuse
+            the gates into (at most) two qubit blocks (or an int for the max block size) before building the network.
+        :type deferred: Union[bool, Dict[str, Any]], optional
         """
         if not empty:
             if (
@@ -117,6 +126,8 @@ class DMCircuit(BaseCircuit):
         self.mps_inputs = mps_inputs
         self.mpo_dminputs = mpo_dminputs
         self.split = split
+        if deferred is not False:
+            self._deferred = {} if deferred is True else dict(deferred)  # type: ignore
 
         self.circuit_param = {
             "nqubits": nqubits,
@@ -125,6 +136,7 @@ class DMCircuit(BaseCircuit):
             "dminputs": dminputs,
             "mpo_dminputs": mpo_dminputs,
             "split": split,
+            "deferred": deferred,
         }
 
         self._qir: List[Dict[str, Any]] = []
@@ -274,8 +286,7 @@ class DMCircuit(BaseCircuit):
         :return: Tensor with one element
         :rtype: Tensor
         """
-        nodes = self.expectation_before(*ops, reuse=reuse)
-        return contractor(nodes).tensor
+        return self._expectation_planned(*ops, reuse=reuse)
 
     @staticmethod
     def check_density_matrix(dm: Tensor) -> None:
@@ -302,6 +313,96 @@ DMCircuit._meta_apply_channels()
 
 
 class DMCircuit2(DMCircuit):
+    # the last superoperator node and its qubits,
+    # the following channels on the same qubits are composed into it
+    _last_super: Optional[Tuple[tn.Node, Tuple[int, ...]]] = None
+    _noise_model: Optional[NoiseModel] = None
+
+    def __init__(
+        self,
+        nqubits: int,
+        empty: bool = False,
+        inputs: Optional[Tensor] = None,
+        mps_inputs: Optional[QuOperator] = None,
+        dminputs: Optional[Tensor] = None,
+        mpo_dminputs: Optional[QuOperator] = None,
+        split: Optional[Dict[str, Any]] = None,
+        deferred: Union[bool, Dict[str, Any]] = False,
+        noise_model: Optional[NoiseModel] = None,
+    ) -> None:
+        """
+        The density matrix simulator based on tensornetwork engine,
+        where the Kraus channels are inserted as superoperator nodes,
+        see :py:class:`DMCircuit` for the other parameters.
+
+        :param noise_model: The noise model whose channels are attached after the matched gates,
+            each gate and its channels are inserted as one superoperator node,
+            and the gates are not fused in the deferred mode, defaults to None
+        :type noise_model: Optional[NoiseModel], optional
+        """
+        super().__init__(
+            nqubits,
+            empty=empty,
+            inputs=inputs,
+            mps_inputs=mps_inputs,
+            dminputs=dminputs,
+            mpo_dminputs=mpo_dminputs,
+            split=split,
+            deferred=deferred,
+        )
+        if noise_model is not None:
+            self._noise_model = noise_model
+        self.circuit_param["noise_model"] = noise_model
+
+    def _wire_gate(
+        self,
+        gate: Gate,
+        index: Sequence[int],
+        name: str,
+        split: Optional[Dict[str, Any]] = None,
+        mpo: bool = False,
+        ir_dict: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if self._noise_model is not None and not mpo:
+            super_op = self._noise_model.super_operator(
+                gate.tensor, name, index, ir_dict
+            )
+            if super_op is not None:
+                self._wire_super(super_op, index)
+                return
+        super()._wire_gate(gate, index, name, split, mpo)
+
+    def _wire_super(self, super_op: Tensor, index: Sequence[int]) -> None:
+        """
+        Attach the superoperator matrix (rows and columns ordered as ket legs followed by bra legs)
+        to the front of the network, it is composed into the last superoperator node
+        instead if the node is still on the front of exactly the same qubits.
+        """
+        index = tuple(index)
+        nlegs = 4 * len(index)
+        o2i = int(nlegs / 2)
+        r2l = int(nlegs / 4)
+        if self._last_super is not None and self._last_super[1] == index:
+            node = self._last_super[0]
+            if all(
+                self._front[ind] is node.get_edge(i)
+                and self._front[ind + self._nqubits] is node.get_edge(i + r2l)
+                for i, ind in enumerate(index)
+            ):
+                super_op = backend.reshape(super_op, [2**o2i, 2**o2i])
+                t = backend.reshape(node.tensor, [2**o2i, 2**o2i])
+                node.tensor = backend.reshape(super_op @ t, [2 for _ in range(nlegs)])
+                return
+        super_op = backend.reshape(super_op, [2 for _ in range(nlegs)])
+        super_op = Gate(super_op)
+        for i, ind in enumerate(index):
+            super_op.get_edge(i + r2l + o2i) ^ self._front[ind + self._nqubits]
+            self._front[ind + self._nqubits] = super_op.get_edge(i + r2l)
+            super_op.get_edge(i + o2i) ^ self._front[ind]
+            self._front[ind] = super_op.get_edge(i)
+        self._nodes.append(super_op)
+        self._last_super = (super_op, index)
+
     def apply_general_kraus(self, kraus: Sequence[Gate], *index: int, **kws: Any) -> None:  # type: ignore
         # incompatible API for now
         kraus = [
@@ -318,18 +419,7 @@ class DMCircuit2(DMCircuit):
         # assert len(kraus) == len(index) or len(index) == 1
         # if len(index) == 1:
         #     index = [index[0] for _ in range(len(kraus))]
-        super_op = kraus_to_super_gate(kraus)
-        nlegs = 4 * len(index)
-        super_op = backend.reshape(super_op, [2 for _ in range(nlegs)])
-        super_op = Gate(super_op)
-        o2i = int(nlegs / 2)
-        r2l = int(nlegs / 4)
-        for i, ind in enumerate(index):
-            super_op.get_edge(i + r2l + o2i) ^ self._front[ind + self._nqubits]
-            self._front[ind + self._nqubits] = super_op.get_edge(i + r2l)
-            super_op.get_edge(i + o2i) ^ self._front[ind]
-            self._front[ind] = super_op.get_edge(i)
-        self._nodes.append(super_op)
+        self._wire_super(kraus_to_super_gate(kraus), index)
         setattr(self, "state_tensor", None)
 
     general_kraus = apply_general_kraus  # type: ignore
@@ -347,3 +437,224 @@ class DMCircuit2(DMCircuit):
 
 DMCircuit2._meta_apply()
 DMCircuit2._meta_apply_channels()
+
+
+class DenseDMCircuit(DMCircuit2):
+    """
+    ``DenseDMCircuit`` class with the same API of ``DMCircuit2``,
+    gates and Kraus channels are applied eagerly on the dense density matrix tensor
+    with shape ``[2]*2n`` as superoperators :math:`U\\otimes U^*` and :math:`\\sum_k K_k\\otimes K_k^*`,
+    i.e. :math:`U\\rho U^\\dagger` and :math:`\\sum_k K_k\\rho K_k^\\dagger`,
+    by one einsum on only the ket and bra legs of the operation,
+    instead of building a tensor network.
+    The cost of each operation only scales with the size of the density matrix,
+    so that noisy circuits with channels after every gate involve neither repeated contractions
+    of the whole network nor contraction path finding, and the engine is jittable and differentiable.
+    The circuit is kept as a network of one node with the density matrix tensor,
+    so that all methods for ``DMCircuit2`` can be used.
+
+    .. code-block:: python
+
+        c = tc.DenseDMCircuit(3)
+        c.H(0)
+        c.CNOT(0, 1)
+        c.depolarizing(1, px=0.1, py=0.1, pz=0.1)
+        c.expectation([tc.gates.z(), (1, )])
+
+    """
+
+    def __init__(
+        self,
+        nqubits: int,
+        empty: bool = False,
+        inputs: Optional[Tensor] = None,
+        mps_inputs: Optional[QuOperator] = None,
+        dminputs: Optional[Tensor] = None,
+        mpo_dminputs: Optional[QuOperator] = None,
+        split: Optional[Dict[str, Any]] = None,
+        deferred: Union[bool, Dict[str, Any]] = False,
+        noise_model: Optional[NoiseModel] = None,
+    ) -> None:
+        """
+        The dense density matrix simulator.
+
+        :param nqubits: Number of qubits
+        :type nqubits: int
+        :param empty: if True, nothing initialized, only for internal use, defaults to False
+        :type empty: bool, optional
+        :param inputs: the state input for the circuit, defaults to None
+        :type inputs: Optional[Tensor], optional
+        :param mps_inputs: QuVector for a MPS like initial pure state.
+        :type mps_inputs: Optional[QuOperator]
+        :param dminputs: the density matrix input for the circuit, defaults to None
+        :type dminputs: Optional[Tensor], optional
+        :param mpo_dminputs: QuOperator for a MPO like initial density matrix.
+        :type mpo_dminputs: Optional[QuOperator]
+        :param split: Ignored, only for API compatibility with ``DMCircuit2``.
+        :type split: Optional[Dict[str, Any]]
+        :param deferred: Ignored, only for API compatibility with ``DMCircuit2``.
+        :type deferred: Union[bool, Dict[str, Any]]
+        :param noise_model: The noise model whose channels are attached after the matched gates,
+            each gate and its channels are applied as one superoperator, defaults to None
+        :type noise_model: Optional[NoiseModel], optional
+        """
+        self._nqubits = nqubits
+        self.inputs = inputs
+        self.dminputs = dminputs
+        self.mps_inputs = mps_inputs
+        self.mpo_dminputs = mpo_dminputs
+        self.split = split
+
+        self.circuit_param = {
+            "nqubits": nqubits,
+            "inputs": inputs,
+            "mps_inputs": mps_inputs,
+            "dminputs": dminputs,
+            "mpo_dminputs": mpo_dminputs,
+            "split": split,
+            "deferred": deferred,
+            "noise_model": noise_model,
+        }
+        if noise_model is not None:
+            self._noise_model = noise_model
+        self._start_index = 1
+        self._qir: List[Dict[str, Any]] = []
+        # the dense tensors and legs applied on the density matrix, for ``replace_inputs``
+        self._ops: List[Tuple[Tensor, List[int]]] = []
+        if not empty:
+            self._set_state(
+                self._initial_state(inputs, mps_inputs, dminputs, mpo_dminputs)
+            )
+
+    def _initial_state(
+        self,
+        inputs: Optional[Tensor] = None,
+        mps_inputs: Optional[QuOperator] = None,
+        dminputs: Optional[Tensor] = None,
+        mpo_dminputs: Optional[QuOperator] = None,
+    ) -> Tensor:
+        n = self._nqubits
+        shape = [2 for _ in range(2 * n)]
+        if inputs is not None or mps_inputs is not None:
+            if inputs is None:
+                inputs = mps_inputs.eval()  # type: ignore
+            inputs = backend.convert_to_tensor(inputs)
+            inputs = backend.cast(inputs, dtype=dtypestr)
+            inputs = backend.reshape(inputs, [-1])
+            assert int(np.log(inputs.shape[0]) / np.log(2)) == n
+            rho = backend.reshape(inputs, [-1, 1]) @ backend.reshape(
+                backend.conj(inputs), [1, -1]
+            )
+            return backend.reshape(rho, shape)
+        if dminputs is not None or mpo_dminputs is not None:
+            if dminputs is None:
+                dminputs = mpo_dminputs.eval()  # type: ignore
+            dminputs = backend.convert_to_tensor(dminputs)
+            return backend.reshape(backend.cast(dminputs, dtype=dtypestr), shape)
+        rho = np.zeros([2**n, 2**n], dtype=npdtype)
+        rho[0, 0] = 1.0
+        return backend.convert_to_tensor(rho.reshape(shape))
+
+    def _set_state(self, state: Tensor) -> None:
+        node = Gate(state)
+        self.coloring_nodes([node])
+        self._state = state
+        self._nodes = [node]
+        self._front = list(node.edges)
+        self.state_tensor = None
+
+    def _apply_super(
+        self,
+        kraus: Sequence[Tensor],
+        index: Sequence[int],
+        super_op: Optional[Tensor] = None,
+    ) -> None:
+        # the superoperator with legs [ket out, bra out, ket in, bra in]
+        if super_op is None:
+            kraus = [backend.reshapem(k) for k in kraus]
+            super_op = reduce(add, [backend.kron(k, backend.conj(k)) for k in kraus])
+        n = self._nqubits
+        self._ops.append((super_op, list(index) + [i + n for i in index]))
+        self._set_state(_apply_dense(self._state, *self._ops[-1]))
+
+    def apply_general_gate(
+        self,
+        gate: Gate,
+        *index: int,
+        name: Optional[str] = None,
+        split: Optional[Dict[str, Any]] = None,
+        mpo: bool = False,
+        ir_dict: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if name is None:
+            name = ""
+        gate_dict = {
+            "gate": gate,
+            "index": index,
+            "name": name,
+            "split": split,
+            "mpo": mpo,
+        }
+        if ir_dict is not None:
+            ir_dict.update(gate_dict)
+        else:
+            ir_dict = gate_dict
+        self._qir.append(ir_dict)
+        assert len(index) == len(set(index))
+        if not mpo:
+            gate.name = name
+        super_op = None
+        if self._noise_model is not None and not mpo:
+            super_op = self._noise_model.super_operator(
+                gate.tensor, name, index, ir_dict
+            )
+        self._apply_super([_dense_gate(gate)], index, super_op)
+
+    apply = apply_general_gate
+
+    def apply_general_kraus(self, kraus: Sequence[Gate], *index: int, **kws: Any) -> None:  # type: ignore
+        if not isinstance(
+            index[0], int
+        ):  # try best to be compatible with DMCircuit interface
+            index = index[0][0]
+        kraus = [backend.convert_to_tensor(_dense_gate(k)) for k in kraus]
+        kraus = [backend.cast(k, dtypestr) for k in kraus]
+        self._apply_super(kraus, index)
+
+    general_kraus = apply_general_kraus  # type: ignore
+
+    def replace_inputs(self, inputs: Tensor) -> None:
+        """
+        Replace the input state with the circuit structure unchanged,
+        the gates and channels applied on the circuit are applied again on the new inputs.
+
+        :param inputs: Input wavefunction.
+        :type inputs: Tensor
+        """
+        self.inputs = inputs
+        state = self._initial_state(inputs=inputs)
+        for t, legs in self._ops:
+            state = _apply_dense(state, t, legs)
+        self._set_state(state)
+
+    def densitymatrix(self, check: bool = False, reuse: bool = True) -> Tensor:
+        """
+        Return the output density matrix of the circuit.
+
+        :param check: check whether the final return is a legal density matrix, defaults to False
+        :type check: bool, optional
+        :param reuse: Ignored, the density matrix is always at hand, defaults to True
+        :type reuse: bool, optional
+        :return: The output densitymatrix in 2D shape tensor form
+        :rtype: Tensor
+        """
+        dm = backend.reshape(self._state, [2**self._nqubits, 2**self._nqubits])
+        if check:
+            self.check_density_matrix(dm)
+        return dm
+
+    state = densitymatrix
+
+
+DenseDMCircuit._meta_apply()
+DenseDMCircuit._meta_apply_channels()
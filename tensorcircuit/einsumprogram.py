@@ -0,0 +1,835 @@
+"""
+Compiled einsum program: replay a once-planned contraction with backend array operations only
+"""
+# pylint: disable=invalid-name
+
+from collections import OrderedDict
+from functools import reduce
+from operator import mul
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import tensornetwork as tn
+
+from .cons import (
+    backend,
+    contractor,
+    dtypestr,
+    _algorithm_signature,
+    _contraction_hooks,
+    _emit_contraction_record,
+    _tensor_nbytes,
+    _einsum_subscripts,
+    _get_algorithm,
+    _get_path_from_structure,
+    _get_plan_algorithm,
+    _get_subgraph_dangling,
+    _linear_to_ssa,
+    _path_intermediates,
+)
+
+Tensor = Any
+Step = Tuple[Tuple[int, ...], str, int]
+
+_program_cache: "OrderedDict[Any, EinsumProgram]" = OrderedDict()
+_program_cache_maxsize = 128
+
+
+def _operator_tensor(op: Any, dims: Sequence[int]) -> Tensor:
+    """
+    The tensor of an operator given as a node or a matrix, the matrix is reshaped
+    with one ket and one bra leg for each site of local dimension in ``dims``.
+    """
+    if isinstance(op, tn.Node):
+        return op.tensor
+    return backend.reshape(op, list(dims) * 2)
+
+
+def _pairwise_kernel(
+    subscripts: str,
+) -> Optional[Tuple[Any, Optional[List[int]]]]:
+    """
+    The ``tensordot`` axes and the output permutation (None for identity) of a two operand
+    einsum step, or None if the step has batch, trace or summed-only indices and needs einsum.
+    """
+    inputs, lr = subscripts.split("->")
+    operands = inputs.split(",")
+    if len(operands) != 2:
+        return None
+    la, lb = operands
+    if len(set(la)) != len(la) or len(set(lb)) != len(lb):
+        return None
+    shared = [x for x in la if x in lb]
+    if any([x in lr for x in shared]):
+        return None
+    kept = [x for x in la if x not in shared] + [x for x in lb if x not in shared]
+    if sorted(kept) != sorted(lr):
+        return None
+    axes: Any = ([la.index(x) for x in shared], [lb.index(x) for x in shared])
+    if not shared:
+        # outer product
+        axes = 0
+    perm = [kept.index(x) for x in lr]
+    return axes, None if perm == list(range(len(perm))) else perm
+
+
+def _run_step(subscripts: str, kernel: Any, tensors: Sequence[Tensor]) -> Tensor:
+    if kernel is None:
+        return backend.einsum(subscripts, *tensors, optimize=False)
+    # pairwise contractions go through tensordot (i.e. BLAS) instead of the einsum loops
+    axes, perm = kernel
+    t = backend.tensordot(tensors[0], tensors[1], axes)
+    if perm is not None:
+        t = backend.transpose(t, perm)
+    return t
+
+
+class EinsumProgram:
+    """
+    A flat contraction program: each step is ``(operand slots, einsum subscripts, output slot)``.
+    The first ``nslots`` slots are the inputs and the result of step ``i`` is stored in slot ``nslots + i``,
+    so that replaying the program only requires ``backend.tensordot`` (``backend.einsum`` for the steps
+    with batch or trace indices) on arrays, no ``tn.Node`` or ``tn.Edge`` object is built or copied.
+
+    :Example:
+
+    >>> c = tc.Circuit(3)
+    >>> c.h(0)
+    >>> c.rx(1, theta=0.2)
+    >>> c.cnot(0, 1)
+    >>> p = tc.einsumprogram.compile_circuit(c, (tc.gates.z(), [1]), kind="expectation")
+    >>> p.run(p.bind(c, (tc.gates.z(), [1])))  # the same as c.expectation((tc.gates.z(), [1]))
+    >>> # rx parameter of the second qir entry mapped to its input slots
+    >>> p.param_slots[1]
+    [4, 10]
+    >>> p.run(p.bind(c, (tc.gates.z(), [1]), params={1: {"theta": 0.5}}))
+    """
+
+    def __init__(
+        self,
+        nslots: int,
+        steps: Sequence[Step],
+        output: int,
+        sources: Optional[Sequence[Any]] = None,
+        param_slots: Optional[Dict[int, List[int]]] = None,
+    ) -> None:
+        """
+        :param nslots: The number of input slots.
+        :type nslots: int
+        :param steps: The list of ``(operand slots, einsum subscripts, output slot)``.
+        :type steps: Sequence[Tuple[Tuple[int, ...], str, int]]
+        :param output: The slot of the final result.
+        :type output: int
+        :param sources: Where the tensor of each input slot comes from, constant tensors
+            (for programs from nodes) or tuples such as ``("gate", qir index, conj)`` (for programs from circuits),
+            defaults to None.
+        :type sources: Optional[Sequence[Any]], optional
+        :param param_slots: Mapping from the qir index of a gate to its input slots, defaults to None.
+        :type param_slots: Optional[Dict[int, List[int]]], optional
+        """
+        self.nslots = nslots
+        self.steps = list(steps)
+        self._kernels = [
+            _pairwise_kernel(subscripts) for _, subscripts, _ in self.steps
+        ]
+        self.output = output
+        self.sources = list(sources) if sources is not None else None
+        self.param_slots = param_slots or {}
+
+    def __repr__(self) -> str:
+        return "EinsumProgram(nslots=%s, nsteps=%s)" % (self.nslots, len(self.steps))
+
+    @classmethod
+    def from_structure(
+        cls,
+        inputs: Sequence[Sequence[int]],
+        output: Sequence[int],
+        size_dict: Dict[int, int],
+        algorithm: Optional[Any] = None,
+        sources: Optional[Sequence[Any]] = None,
+        param_slots: Optional[Dict[int, List[int]]] = None,
+    ) -> "EinsumProgram":
+        """
+        Compile the program from the einsum style network structure.
+
+        :param inputs: Integer labels for each input tensor.
+        :type inputs: Sequence[Sequence[int]]
+        :param output: Integer labels of the output tensor.
+        :type output: Sequence[int]
+        :param size_dict: The dimension of each label.
+        :type size_dict: Dict[int, int]
+        :param algorithm: ``opt_einsum`` type path finder or a linear path,
+            defaults to None (the path finder of the current contractor).
+        :type algorithm: Optional[Any], optional
+        :return: The compiled program.
+        :rtype: EinsumProgram
+        """
+        n = len(inputs)
+        path = _get_path_from_structure(inputs, output, size_dict, algorithm)
+        ssa_path, remaining = _linear_to_ssa(path, n)
+        labels = dict(enumerate([list(l) for l in inputs]))
+        steps: List[Step] = []
+        for k, ((a, b), (la, lb, lr)) in enumerate(
+            zip(ssa_path, _path_intermediates(inputs, output, path))
+        ):
+            steps.append(((a, b), _einsum_subscripts([la, lb], lr), n + k))
+            labels[n + k] = lr
+        if len(remaining) != 1:
+            raise ValueError("The network is not connected by the contraction path")
+        final = remaining[0]
+        if labels[final] != list(output):
+            # sum over the remaining labels not in the output and transpose
+            steps.append(
+                ((final,), _einsum_subscripts([labels[final]], output), n + len(steps))
+            )
+            final = n + len(steps) - 1
+        return cls(n, steps, final, sources, param_slots)
+
+    @classmethod
+    def from_nodes(
+        cls,
+        nodes: Sequence[tn.Node],
+        output_edge_order: Optional[Sequence[tn.Edge]] = None,
+        algorithm: Optional[Any] = None,
+    ) -> "EinsumProgram":
+        """
+        Compile the program from a tensor network, the tensors of ``nodes`` are kept
+        as the default inputs of :py:meth:`run`.
+
+        :param nodes: The list of ``tn.Node`` in the network.
+        :type nodes: Sequence[tn.Node]
+        :param output_edge_order: The dangling edges kept as output, defaults to None
+            (all dangling edges of the network, which must be at most one).
+        :type output_edge_order: Optional[Sequence[tn.Edge]], optional
+        :param algorithm: ``opt_einsum`` type path finder or a linear path,
+            defaults to None (the path finder of the current contractor).
+        :type algorithm: Optional[Any], optional
+        :return: The compiled program.
+        :rtype: EinsumProgram
+        """
+        nodes = list(nodes)
+        if output_edge_order is None:
+            output_edge_order = list(_get_subgraph_dangling(nodes))
+            if len(output_edge_order) > 1:
+                raise ValueError(
+                    "`output_edge_order` has to be provided for more than one dangling edges"
+                )
+        mapping_dict: Dict[int, int] = {}
+        for n in nodes:
+            for e in n:
+                if id(e) not in mapping_dict:
+                    mapping_dict[id(e)] = len(mapping_dict)
+        inputs = [[mapping_dict[id(e)] for e in n.edges] for n in nodes]
+        output = [mapping_dict[id(e)] for e in output_edge_order]
+        size_dict = {mapping_dict[id(e)]: e.dimension for n in nodes for e in n.edges}
+        return cls.from_structure(
+            inputs, output, size_dict, algorithm, sources=[n.tensor for n in nodes]
+        )
+
+    def run(self, tensors: Optional[Sequence[Tensor]] = None) -> Tensor:
+        """
+        Replay the program on the given input tensors.
+
+        :param tensors: The tensors for the input slots, defaults to None
+            (the tensors the program was compiled from, only for programs from nodes).
+        :type tensors: Optional[Sequence[Tensor]], optional
+        :return: The contraction result.
+        :rtype: Tensor
+        """
+        if tensors is None:
+            tensors = self.sources
+        store: Dict[int, Tensor] = dict(enumerate(tensors))  # type: ignore
+        if _contraction_hooks:
+            return self._run_recorded(store)
+        for (operands, subscripts, out), kernel in zip(self.steps, self._kernels):
+            store[out] = _run_step(subscripts, kernel, [store.pop(i) for i in operands])
+        return store[self.output]
+
+    __call__ = run
+
+    def _run_recorded(self, store: Dict[int, Tensor]) -> Tensor:
+        live = sum([_tensor_nbytes(t) for t in store.values()])
+        record: Dict[str, Any] = {
+            "nnodes": self.nslots,
+            "path_time": 0.0,
+            "flops": 0,
+            "write_bytes": 0,
+            "peak_live_bytes": live,
+            "sliced": False,
+            "planned": True,
+            "steps": [],
+        }
+        time0 = time.perf_counter()
+        for i, (operands, subscripts, out) in enumerate(self.steps):
+            ts = [store.pop(j) for j in operands]
+            dims = {}
+            for labels, t in zip(subscripts.split("->")[0].split(","), ts):
+                dims.update(zip(labels, t.shape))
+            flops = reduce(mul, [int(d) for d in dims.values()] + [1])
+            stime = time.perf_counter()
+            store[out] = _run_step(subscripts, self._kernels[i], ts)
+            stime = time.perf_counter() - stime
+            nbytes = _tensor_nbytes(store[out])
+            record["peak_live_bytes"] = max(record["peak_live_bytes"], live + nbytes)
+            live += nbytes - sum([_tensor_nbytes(t) for t in ts])
+            record["flops"] += flops
+            record["write_bytes"] += nbytes
+            record["steps"].append(
+                {
+                    "step": i,
+                    "time": stime,
+                    "shape": [int(d) for d in store[out].shape],
+                    "bytes": nbytes,
+                    "live_bytes": live,
+                    "flops": flops,
+                }
+            )
+        record["contract_time"] = time.perf_counter() - time0
+        _emit_contraction_record(record)
+        return store[self.output]
+
+    def bind(
+        self,
+        c: Any,
+        *ops: Tuple[Any, List[int]],
+        params: Optional[Dict[int, Dict[str, Any]]] = None,
+    ) -> List[Tensor]:
+        """
+        Collect the input tensors for a program compiled by :py:func:`compile_circuit`
+        from a circuit of the same structure, by reading the gate tensors from its qir.
+
+        :param c: The circuit.
+        :type c: Circuit
+        :param ops: The operators, the same format as ``c.expectation``.
+        :type ops: Tuple[Any, List[int]]
+        :param params: Override the parameters of some gates, the key is the qir index of the gate and
+            the value is the keyword arguments for its ``gatef``, defaults to None.
+        :type params: Optional[Dict[int, Dict[str, Any]]], optional
+        :return: The tensors for the input slots.
+        :rtype: List[Tensor]
+        """
+        if self.sources is None or not isinstance(self.sources[0], tuple):
+            raise ValueError("The program is not compiled from a circuit")
+        params = params or {}
+        gates_cache: Dict[int, Any] = {}
+        tensors = []
+        for source in self.sources:
+            kind, i, conj = source[0], source[1], source[-1]
+            if kind == "start":
+                t = c._built_nodes()[i].tensor
+            elif kind == "op":
+                op, index = ops[i]
+                index = [index] if isinstance(index, int) else index
+                dims = c._local_dims()
+                t = _operator_tensor(op, [dims[j] for j in index])
+            else:  # "gate" or "mpo"
+                if i not in gates_cache:
+                    d = c._qir[i]
+                    if i in params:
+                        gates_cache[i] = d["gatef"](**params[i])
+                    else:
+                        gates_cache[i] = d["gate"]
+                g = gates_cache[i]
+                if kind == "gate":
+                    t = g.tensor
+                else:
+                    t = _canonical_nodes(g)[source[2]].tensor
+            t = backend.cast(t, dtypestr)
+            if conj:
+                t = backend.conj(t)
+            tensors.append(t)
+        return tensors
+
+
+class NetworkTemplate:
+    """
+    An immutable snapshot of the tensor network of a circuit: the einsum style label structure
+    together with references to the node tensors. The ket, bra and expectation networks are produced
+    from the template by relabeling, where the bra copy is only a conjugation flag on the input slots,
+    so that no ``tn.Node`` or ``tn.Edge`` is deep copied and the circuit nodes are never reconnected.
+    The compiled contraction programs are cached on the template.
+
+    Mutation safety:
+
+    * The template is a snapshot taken at construction, later changes to the circuit
+      (new gates, mid measurements, replaced inputs) are not seen by the template.
+      :py:meth:`matches` tells whether the template is still up to date for a circuit,
+      and ``c.network_template()`` returns an up-to-date (cached) template.
+    * The template never modifies the nodes, edges or tensors of the circuit, nor the operators
+      passed in. Nodes built for contractors without a replayable plan are fresh ones.
+    * Tensors are shared by reference instead of being copied, hence in-place modification of the
+      arrays (only possible for the numpy backend) is seen by both the template and the circuit.
+      Conjugated tensors for the bra are computed on each call and never cached,
+      so that the template can be safely reused inside and outside of jitted functions.
+
+    :Example:
+
+    >>> c = tc.Circuit(2)
+    >>> c.h(0)
+    >>> c.cnot(0, 1)
+    >>> t = tc.einsumprogram.NetworkTemplate.from_circuit(c)
+    >>> t.expectation((tc.gates.z(), [1]))  # the same as c.expectation((tc.gates.z(), [1]), reuse=False)
+    array(0.+0.j, dtype=complex64)
+    >>> c.x(1)
+    >>> t.matches(c)
+    False
+    """
+
+    def __init__(
+        self,
+        inputs: Sequence[Sequence[int]],
+        front: Sequence[int],
+        size_dict: Dict[int, int],
+        tensors: Sequence[Tensor],
+        is_dm: bool = False,
+    ) -> None:
+        """
+        :param inputs: Integer labels for the legs of each node.
+        :type inputs: Sequence[Sequence[int]]
+        :param front: Integer labels of the dangling legs, one for each qubit
+            (ket legs followed by bra legs for density matrices).
+        :type front: Sequence[int]
+        :param size_dict: The dimension of each label.
+        :type size_dict: Dict[int, int]
+        :param tensors: The tensor of each node.
+        :type tensors: Sequence[Tensor]
+        :param is_dm: Whether the network is for a density matrix, defaults to False.
+        :type is_dm: bool, optional
+        """
+        self.inputs = tuple([tuple(l) for l in inputs])
+        self.front = tuple(front)
+        self.size_dict = dict(size_dict)
+        self.tensors = tuple(tensors)
+        self.is_dm = is_dm
+        self.nqubits = len(self.front) // 2 if is_dm else len(self.front)
+        self._source: Tuple[Any, ...] = ()
+        self._programs: Dict[Any, EinsumProgram] = {}
+
+    def __repr__(self) -> str:
+        return "NetworkTemplate(nqubits=%s, nnodes=%s, is_dm=%s)" % (
+            self.nqubits,
+            len(self.inputs),
+            self.is_dm,
+        )
+
+    @classmethod
+    def from_circuit(cls, c: Any) -> "NetworkTemplate":
+        """
+        Take the template of the circuit network, no tensor is copied.
+
+        :param c: The circuit.
+        :type c: BaseCircuit
+        :return: The template.
+        :rtype: NetworkTemplate
+        """
+        inputs, front, size_dict = c._network_structure()
+        template = cls(inputs, front, size_dict, [n.tensor for n in c._nodes], c.is_dm)
+        template._source = tuple([(n, n.tensor) for n in c._nodes])
+        return template
+
+    def matches(self, c: Any) -> bool:
+        """
+        Whether the template is still up to date for the circuit,
+        i.e. the circuit holds the same nodes with the same tensors as when the template is taken.
+
+        :param c: The circuit.
+        :type c: BaseCircuit
+        :return: True if the template can be used for the circuit.
+        :rtype: bool
+        """
+        if len(c._nodes) != len(self._source):
+            return False
+        for n, (m, t) in zip(c._nodes, self._source):
+            if n is not m or n.tensor is not t:
+                return False
+        return True
+
+    def state_structure(
+        self,
+    ) -> Tuple[List[List[int]], List[int], Dict[int, int], List[Any]]:
+        """
+        Einsum style structure of the state (or density matrix) network.
+
+        :return: ``(inputs, output, size_dict, slots)``, where each slot is
+            ``("node", node index, conj)``.
+        :rtype: Tuple[List[List[int]], List[int], Dict[int, int], List[Any]]
+        """
+        slots = [("node", i, False) for i in range(len(self.inputs))]
+        return (
+            [list(l) for l in self.inputs],
+            list(self.front),
+            dict(self.size_dict),
+            slots,
+        )
+
+    def expectation_structure(
+        self, sites: Sequence[Sequence[int]]
+    ) -> Tuple[List[List[int]], List[int], Dict[int, int], List[Any]]:
+        """
+        Einsum style structure of the expectation network with operators on ``sites``,
+        for pure states the bra network shares the tensors of the ket network with ``conj=True`` slots.
+
+        :param sites: The qubits of each operator.
+        :type sites: Sequence[Sequence[int]]
+        :raises ValueError: "Cannot measure two operators in one index"
+        :return: ``(inputs, output, size_dict, slots)``, where each slot is
+            ``("node", node index, conj)`` or ``("op", operator index, False)``.
+        :rtype: Tuple[List[List[int]], List[int], Dict[int, int], List[Any]]
+        """
+        nq = self.nqubits
+        inputs = [list(l) for l in self.inputs]
+        size_dict = dict(self.size_dict)
+        slots = [("node", i, False) for i in range(len(inputs))]
+        if self.is_dm:
+            kets, bras = list(self.front[:nq]), list(self.front[nq:])
+        else:
+            shift = max(size_dict) + 1 if size_dict else 0
+            size_dict.update({l + shift: d for l, d in self.size_dict.items()})
+            inputs += [[l + shift for l in ls] for ls in self.inputs]
+            slots += [("node", i, True) for i in range(len(self.inputs))]
+            kets, bras = list(self.front), [l + shift for l in self.front]
+        occupied = set()
+        for k, index in enumerate(sites):
+            for e in index:
+                if e in occupied:
+                    raise ValueError("Cannot measure two operators in one index")
+                occupied.add(e)
+            inputs.append([bras[e] for e in index] + [kets[e] for e in index])
+            slots.append(("op", k, False))
+        joined = {bras[j]: kets[j] for j in range(nq) if j not in occupied}
+        inputs = [[joined.get(l, l) for l in ls] for ls in inputs]
+        return inputs, [], size_dict, slots
+
+    def bind(
+        self, slots: Sequence[Any], ops: Sequence[Tuple[Any, List[int]]] = ()
+    ) -> List[Tensor]:
+        """
+        Collect the tensors for the slots given by :py:meth:`state_structure`
+        or :py:meth:`expectation_structure`.
+
+        :param slots: The slots.
+        :type slots: Sequence[Any]
+        :param ops: The operators, the same format as ``c.expectation``, defaults to ().
+        :type ops: Sequence[Tuple[Any, List[int]]], optional
+        :return: The tensors for the slots.
+        :rtype: List[Tensor]
+        """
+        tensors = []
+        for kind, i, conj in slots:
+            if kind == "node":
+                t = self.tensors[i]
+                if conj:
+                    t = backend.conj(t)
+            else:
+                op, index = ops[i]
+                index = [index] if isinstance(index, int) else index
+                dims = [self.size_dict[self.front[j]] for j in index]
+                t = backend.cast(_operator_tensor(op, dims), dtype=dtypestr)
+            tensors.append(t)
+        return tensors
+
+    def state(self, algorithm: Optional[Any] = None) -> Tensor:
+        """
+        Contract the state (or density matrix) network, with one leg for each dangling edge.
+
+        :param algorithm: ``opt_einsum`` type path finder, defaults to None
+            (the path finder of the current contractor if it can be replayed by a plan).
+        :type algorithm: Optional[Any], optional
+        :return: The state tensor.
+        :rtype: Tensor
+        """
+        inputs, output, size_dict, slots = self.state_structure()
+        return self._contract(
+            ("state",), inputs, output, size_dict, self.bind(slots), algorithm
+        )
+
+    def expectation(
+        self, *ops: Tuple[Any, List[int]], algorithm: Optional[Any] = None
+    ) -> Tensor:
+        """
+        Contract the expectation network of the operators without copying the circuit network.
+
+        :param ops: Operator and its position, the same format as ``c.expectation``.
+        :type ops: Tuple[Any, List[int]]
+        :param algorithm: ``opt_einsum`` type path finder, defaults to None
+            (the path finder of the current contractor if it can be replayed by a plan).
+        :type algorithm: Optional[Any], optional
+        :return: Tensor with one element.
+        :rtype: Tensor
+        """
+        sites = [[index] if isinstance(index, int) else list(index) for _, index in ops]
+        inputs, output, size_dict, slots = self.expectation_structure(sites)
+        tensors = self.bind(slots, ops)
+        shapes = [tuple(t.shape) for t in tensors[len(tensors) - len(ops) :]]
+        key = ("expectation", tuple([tuple(s) for s in sites]), tuple(shapes))
+        return self._contract(key, inputs, output, size_dict, tensors, algorithm)
+
+    def _contract(
+        self,
+        key: Any,
+        inputs: List[List[int]],
+        output: List[int],
+        size_dict: Dict[int, int],
+        tensors: List[Tensor],
+        algorithm: Optional[Any] = None,
+    ) -> Tensor:
+        if algorithm is None:
+            algorithm = _get_plan_algorithm(nnodes=len(inputs))
+        if algorithm is None:
+            # the current contractor cannot be replayed by a plan, contract fresh nodes instead
+            nodes, edges = self.to_nodes(inputs, output, tensors)
+            return contractor(nodes, output_edge_order=edges).tensor
+        key = key + (_algorithm_signature(algorithm),)
+        if key not in self._programs:
+            self._programs[key] = EinsumProgram.from_structure(
+                inputs, output, size_dict, algorithm
+            )
+        return self._programs[key].run(tensors)
+
+    @staticmethod
+    def to_nodes(
+        inputs: Sequence[Sequence[int]],
+        output: Sequence[int],
+        tensors: Sequence[Tensor],
+    ) -> Tuple[List[tn.Node], List[tn.Edge]]:
+        """
+        Build fresh nodes for the einsum style structure, the tensors are not copied.
+
+        :param inputs: Integer labels for each tensor.
+        :type inputs: Sequence[Sequence[int]]
+        :param output: Integer labels of the dangling edges.
+        :type output: Sequence[int]
+        :param tensors: The tensors.
+        :type tensors: Sequence[Tensor]
+        :return: The nodes and the dangling edges in the order of ``output``.
+        :rtype: Tuple[List[tn.Node], List[tn.Edge]]
+        """
+        nodes = [tn.Node(t) for t in tensors]
+        legs: Dict[int, tn.Edge] = {}
+        for n, labels in zip(nodes, inputs):
+            for j, l in enumerate(labels):
+                if l in legs:
+                    legs.pop(l) ^ n[j]
+                else:
+                    legs[l] = n[j]
+        return nodes, [legs[l] for l in output]
+
+
+def _canonical_nodes(qop: Any) -> List[tn.Node]:
+    """
+    The nodes of a ``QuOperator`` in a traversal order only depending on its structure.
+    """
+    order: List[tn.Node] = []
+    visited = set()
+    for e in qop.out_edges + qop.in_edges:
+        if id(e.node1) not in visited:
+            visited.add(id(e.node1))
+            order.append(e.node1)
+    k = 0
+    while k < len(order):
+        for e in order[k].edges:
+            for n in [e.node1, e.node2]:
+                if n is not None and id(n) not in visited:
+                    visited.add(id(n))
+                    order.append(n)
+        k += 1
+    return order
+
+
+def _circuit_structure(
+    c: Any, ops: Sequence[Tuple[Any, List[int]]], kind: str
+) -> Tuple[List[List[int]], List[int], Dict[int, int], List[Any], Dict[int, List[int]]]:
+    """
+    Einsum style structure of the state (``kind="state"``) or expectation (``kind="expectation"``)
+    network built from the qir of the circuit directly.
+    """
+    if c.is_dm:
+        raise NotImplementedError(
+            "Compiling density matrix circuits is not supported, use `EinsumProgram.from_nodes` instead"
+        )
+    if getattr(c, "mps_inputs", None) is not None:
+        raise NotImplementedError("Compiling circuits with mps inputs is not supported")
+    nodes = c._built_nodes()
+    for n in nodes:
+        if getattr(n, "flag", None) == "post-select":
+            raise NotImplementedError(
+                "Compiling circuits with mid measurements is not supported"
+            )
+    size_dict: Dict[int, int] = {}
+
+    def new_label(d: int) -> int:
+        size_dict[len(size_dict)] = d
+        return len(size_dict) - 1
+
+    inputs: List[List[int]] = []
+    sources: List[Any] = []
+    param_slots: Dict[int, List[int]] = {}
+    for i in range(c._start_index):
+        inputs.append([new_label(d) for d in nodes[i].tensor.shape])
+        sources.append(("start", i, False))
+    front = [l for ls in inputs for l in ls]
+    for j, d in enumerate(c._qir):
+        index = d["index"]
+        if isinstance(index, int):
+            index = [index]
+        noe = len(index)
+        param_slots[j] = []
+        if not d.get("mpo", False):
+            shape = d["gate"].tensor.shape
+            outs = [new_label(shape[i]) for i in range(noe)]
+            param_slots[j].append(len(inputs))
+            inputs.append(outs + [front[ind] for ind in index])
+            sources.append(("gate", j, False))
+            for i, ind in enumerate(index):
+                front[ind] = outs[i]
+        else:
+            qop = d["gate"]
+            labels = {}
+            for i, ind in enumerate(index):
+                labels[id(qop.in_edges[i])] = front[ind]
+            for i, ind in enumerate(index):
+                front[ind] = labels[id(qop.out_edges[i])] = new_label(
+                    qop.out_edges[i].dimension
+                )
+            for k, n in enumerate(_canonical_nodes(qop)):
+                for e in n.edges:
+                    if id(e) not in labels:
+                        labels[id(e)] = new_label(e.dimension)
+                param_slots[j].append(len(inputs))
+                inputs.append([labels[id(e)] for e in n.edges])
+                sources.append(("mpo", j, k, False))
+    if kind in ["state", "wavefunction"]:
+        return inputs, front, size_dict, sources, param_slots
+    if kind != "expectation":
+        raise ValueError("Unsupported kind for compiling: %s" % kind)
+    nq = c._nqubits
+    shift = len(size_dict)
+    size_dict.update({l + shift: d for l, d in list(size_dict.items())})
+    nket = len(inputs)
+    inputs += [[l + shift for l in ls] for ls in inputs]
+    sources += [s[:-1] + (True,) for s in sources]
+    for j in param_slots:
+        param_slots[j] += [i + nket for i in param_slots[j]]
+    bra = [l + shift for l in front]
+    occupied = set()
+    for k, (_, index) in enumerate(ops):
+        if isinstance(index, int):
+            index = [index]
+        for e in index:
+            if e in occupied:
+                raise ValueError("Cannot measure two operators in one index")
+            occupied.add(e)
+        inputs.append([bra[e] for e in index] + [front[e] for e in index])
+        sources.append(("op", k, False))
+    joined = {bra[j]: front[j] for j in range(nq) if j not in occupied}
+    inputs = [[joined.get(l, l) for l in ls] for ls in inputs]
+    return inputs, [], size_dict, sources, param_slots
+
+
+def _circuit_key(
+    c: Any, ops: Sequence[Tuple[Any, List[int]]], kind: str, algorithm: Any
+) -> Any:
+    shape = lambda t: tuple(t.tensor.shape if isinstance(t, tn.Node) else t.shape)
+    qir_key = []
+    for d in c._qir:
+        if d.get("mpo", False):
+            g = d["gate"]
+            qir_key.append(
+                (tuple(d["index"]), tuple([shape(n) for n in _canonical_nodes(g)]))
+            )
+        else:
+            qir_key.append((tuple(d["index"]), shape(d["gate"])))
+    ops_key = tuple(
+        [
+            (tuple([index] if isinstance(index, int) else index), shape(op))
+            for op, index in ops
+        ]
+    )
+    return (
+        kind,
+        c._nqubits,
+        tuple([shape(n) for n in c._built_nodes()[: c._start_index]]),
+        tuple(qir_key),
+        ops_key,
+        _algorithm_signature(algorithm),
+    )
+
+
+def compile_circuit(
+    c: Any,
+    *ops: Tuple[Any, List[int]],
+    kind: str = "state",
+    algorithm: Optional[Any] = None,
+) -> EinsumProgram:
+    """
+    Compile the state or expectation network of the circuit into an :py:class:`EinsumProgram`
+    directly from the circuit qir, the program is cached by the circuit structure
+    (gate positions and tensor shapes, operator positions and shapes) and the path finder.
+    Gates with ``split`` configuration are kept unsplit in the program.
+
+    :param c: The circuit.
+    :type c: Circuit
+    :param ops: The operators for ``kind="expectation"``, the same format as ``c.expectation``.
+    :type ops: Tuple[Any, List[int]]
+    :param kind: "state" or "expectation", defaults to "state"
+    :type kind: str, optional
+    :param algorithm: ``opt_einsum`` type path finder, defaults to None
+        (the path finder of the current contractor)
+    :type algorithm: Optional[Any], optional
+    :return: The compiled program, use ``program.run(program.bind(c, *ops))`` to evaluate.
+    :rtype: EinsumProgram
+    """
+    if algorithm is None:
+        algorithm = _get_algorithm(nnodes=c._start_index + len(c._qir))
+    key = _circuit_key(c, ops, kind, algorithm)
+    if key in _program_cache:
+        _program_cache.move_to_end(key)
+        return _program_cache[key]
+    inputs, output, size_dict, sources, param_slots = _circuit_structure(c, ops, kind)
+    program = EinsumProgram.from_structure(
+        inputs, output, size_dict, algorithm, sources, param_slots
+    )
+    _program_cache[key] = program
+    if len(_program_cache) > _program_cache_maxsize:
+        _program_cache.popitem(last=False)
+    return program
+
+
+def run_circuit(
+    c: Any,
+    *ops: Tuple[Any, List[int]],
+    kind: str = "state",
+    algorithm: Optional[Any] = None,
+) -> Tensor:
+    """
+    Evaluate the state (as a tensor with one leg for each qubit) or the expectation
+    of the circuit via the cached compiled program.
+
+    :Example:
+
+    >>> c = tc.Circuit(2)
+    >>> c.h(0)
+    >>> c.cnot(0, 1)
+    >>> tc.einsumprogram.run_circuit(c, (tc.gates.z(), [1]), kind="expectation")
+    array(0.+0.j, dtype=complex64)
+
+    :param c: The circuit.
+    :type c: Circuit
+    :param ops: The operators for ``kind="expectation"``.
+    :type ops: Tuple[Any, List[int]]
+    :param kind: "state" or "expectation", defaults to "state"
+    :type kind: str, optional
+    :param algorithm: ``opt_einsum`` type path finder, defaults to None
+    :type algorithm: Optional[Any], optional
+    :return: The result tensor.
+    :rtype: Tensor
+    """
+    program = compile_circuit(c, *ops, kind=kind, algorithm=algorithm)
+    return program.run(program.bind(c, *ops))
+
+
+def clear_program_cache() -> None:
+    """
+    Clear the cache of compiled circuit programs.
+    """
+    _program_cache.clear()
@@ -667,6 +667,8 @@ def random_two_qubit_gate() -> Gate:
 def any_gate(unitary: Tensor, name: str = "any") -> Gate:
     """
     Note one should provide the gate with properly reshaped.
+    Matrices whose size is not a power of 2 (qudit gates) are kept as they are,
+    and they are reshaped to the local dimensions when applied on a qudit circuit.
 
     :param unitary: corresponding gate
     :type unitary: Tensor
@@ -680,12 +682,40 @@ def any_gate(unitary: Tensor, name: str = "any") -> Gate:
         unitary.tensor = backend.cast(unitary.tensor, dtypestr)
         return unitary
     unitary = backend.cast(unitary, dtypestr)
-    unitary = backend.reshape2(unitary)
+    size = backend.sizen(unitary)
+    if size & (size - 1) == 0:
+        unitary = backend.reshape2(unitary)
     # nleg = int(np.log2(backend.sizen(unitary)))
     # unitary = backend.reshape(unitary, [2 for _ in range(nleg)])
     return Gate(unitary, name=name)
 
 
+def shift_matrix(d: int) -> Tensor:
+    r"""
+    The generalized Pauli X (shift) matrix :math:`X\vert j\rangle = \vert j+1 \bmod d\rangle`
+    for a qudit of dimension ``d``.
+
+    :param d: The local dimension.
+    :type d: int
+    :return: The ``[d, d]`` shift matrix.
+    :rtype: Tensor
+    """
+    return np.roll(np.eye(d), 1, axis=0).astype(npdtype)
+
+
+def clock_matrix(d: int) -> Tensor:
+    r"""
+    The generalized Pauli Z (clock) matrix :math:`Z\vert j\rangle = \omega^j\vert j\rangle`
+    with :math:`\omega = e^{2\pi i/d}` for a qudit of dimension ``d``.
+
+    :param d: The local dimension.
+    :type d: int
+    :return: The ``[d, d]`` clock matrix.
+    :rtype: Tensor
+    """
+    return np.diag(np.exp(2j * np.pi * np.arange(d) / d)).astype(npdtype)
+
+
 # any = any_gate
 
 
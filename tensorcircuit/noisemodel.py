@@ -0,0 +1,221 @@
+"""
+Global noise model attaching quantum channels after gates for density matrix simulators
+"""
+# pylint: disable=invalid-name
+
+from functools import reduce
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import tensornetwork as tn
+
+from . import channels
+from .backends import get_backend  # type: ignore
+from .cons import backend, dtypestr, runtime_backend
+
+Tensor = Any
+npb = get_backend("numpy")
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float, complex, np.number))
+
+
+def _kraus_matrices(kraus: Sequence[Any], K: Any) -> List[Tensor]:
+    ms = []
+    for k in kraus:
+        if isinstance(k, tn.Node):
+            k = k.tensor
+        k = K.cast(K.convert_to_tensor(k), dtypestr)
+        ms.append(K.reshapem(k))
+    return ms
+
+
+def compose_super_operator(
+    u: Optional[Tensor], kraus_list: Sequence[Sequence[Tensor]], K: Any = None
+) -> Tensor:
+    r"""
+    The superoperator matrix :math:`\sum_k (K_kU)\otimes (K_kU)^*` of the gate ``u``
+    followed by the local channels in ``kraus_list``,
+    with rows (columns) ordered as the output (input) ket legs followed by the bra legs.
+
+    :param u: The gate matrix on :math:`k` qubits, None for no gate.
+    :type u: Optional[Tensor]
+    :param kraus_list: The Kraus matrices of the channel on each of the :math:`k` qubits,
+        an empty sequence for no channel on the qubit.
+    :type kraus_list: Sequence[Sequence[Tensor]]
+    :param K: The backend for the composition, defaults to None (the global backend)
+    :type K: Any, optional
+    :return: The superoperator matrix with shape :math:`[4^k, 4^k]`.
+    :rtype: Tensor
+    """
+    if K is None:
+        K = backend
+    eye = K.eye(2, dtype=dtypestr)
+    # the Kraus operators of the product channel on all qubits
+    kraus = [None]
+    for ks in kraus_list:
+        ks = ks if ks else [eye]
+        kraus = [k1 if k0 is None else K.kron(k0, k1) for k0 in kraus for k1 in ks]
+    if u is not None:
+        u = K.reshapem(K.cast(K.convert_to_tensor(u), dtypestr))
+        kraus = [u if k is None else k @ u for k in kraus]
+    return reduce(
+        lambda a, b: a + b, [K.kron(k, K.conj(k)) for k in kraus]  # type: ignore
+    )
+
+
+class NoiseModel:
+    """
+    ``NoiseModel`` maps gate names (and optionally qubits) to quantum channels,
+    which are attached automatically after the matched gates on each of their qubits
+    for density matrix simulators constructed with ``noise_model``.
+    The gate and its channels are composed into one superoperator before insertion,
+    and the composition is cached for each gate and parameter set when all the tensors involved are concrete.
+
+    :Example:
+
+    >>> nm = tc.NoiseModel()
+    >>> nm.add_channel("depolarizing", gates=["h", "cnot"], px=0.01, py=0.01, pz=0.01)
+    >>> nm.add_channel("amplitudedamping", qubits=[0], gamma=0.1, p=1.0)
+    >>> c = tc.DMCircuit2(2, noise_model=nm)
+    >>> c.h(0)
+    >>> c.cnot(0, 1)
+    """
+
+    def __init__(self) -> None:
+        self._rules: List[Dict[str, Any]] = []
+        self._cache: Dict[Any, Tensor] = {}
+
+    def add_channel(
+        self,
+        channel: Union[str, Callable[..., Sequence[Any]]],
+        gates: Optional[Union[str, Sequence[str]]] = None,
+        qubits: Optional[Sequence[int]] = None,
+        **params: Any,
+    ) -> "NoiseModel":
+        """
+        Attach a single qubit channel after the given gates on each of their qubits.
+
+        :param channel: The channel name in ``tc.channels.channels``, e.g. ``"depolarizing"``,
+            or a function returning the list of Kraus operators (``Gate`` or matrices).
+        :type channel: Union[str, Callable[..., Sequence[Any]]]
+        :param gates: The (lower case) gate names the channel is attached to,
+            defaults to None (all gates)
+        :type gates: Optional[Union[str, Sequence[str]]], optional
+        :param qubits: Only attach the channel on these qubits, defaults to None (all qubits)
+        :type qubits: Optional[Sequence[int]], optional
+        :param params: The parameters of the channel.
+        :type params: Any
+        :return: The noise model itself for chained calls.
+        :rtype: NoiseModel
+        """
+        if isinstance(channel, str):
+            if channel not in channels.channels:
+                raise ValueError("Unknown channel: %s" % channel)
+            channel = getattr(channels, channel + "channel")
+        if isinstance(gates, str):
+            gates = [gates]
+        rule = {
+            "channel": channel,
+            "gates": None if gates is None else set(g.lower() for g in gates),
+            "qubits": None if qubits is None else set(qubits),
+            "params": params,
+            "kraus": None,
+        }
+        if all(_is_number(v) for v in params.values()):
+            # concrete channels are evaluated only once
+            with runtime_backend("numpy"):
+                rule["kraus"] = _kraus_matrices(channel(**params), npb)  # type: ignore
+        self._rules.append(rule)
+        self._cache = {}
+        return self
+
+    def _matched(self, name: str, index: Sequence[int]) -> Tuple[Tuple[int, ...], ...]:
+        name = name.lower()
+        matched = []
+        for q in index:
+            matched.append(
+                tuple(
+                    i
+                    for i, r in enumerate(self._rules)
+                    if (r["gates"] is None or name in r["gates"])
+                    and (r["qubits"] is None or q in r["qubits"])
+                )
+            )
+        return tuple(matched)
+
+    def channels(self, name: str, index: Sequence[int]) -> List[List[Tensor]]:
+        """
+        The Kraus matrices of the channels attached after the gate ``name`` on qubits ``index``,
+        several channels on one qubit are composed in the order they are added.
+
+        :param name: The gate name.
+        :type name: str
+        :param index: The qubits of the gate.
+        :type index: Sequence[int]
+        :return: The list of Kraus matrices on each qubit of the gate, empty for no channel.
+        :rtype: List[List[Tensor]]
+        """
+        return [self._channels_on(m, backend) for m in self._matched(name, index)]
+
+    def _channels_on(self, rules: Sequence[int], K: Any) -> List[Tensor]:
+        kraus: List[Tensor] = []
+        for i in rules:
+            r = self._rules[i]
+            if r["kraus"] is not None:
+                ks = [K.convert_to_tensor(k) for k in r["kraus"]]
+            else:
+                ks = _kraus_matrices(r["channel"](**r["params"]), K)
+            kraus = ks if not kraus else [k1 @ k0 for k0 in kraus for k1 in ks]
+        return kraus
+
+    def super_operator(
+        self,
+        gate: Tensor,
+        name: str,
+        index: Sequence[int],
+        ir_dict: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Tensor]:
+        """
+        The superoperator matrix of the gate followed by its attached channels,
+        see :py:func:`compose_super_operator`, or None if no channel is attached to the gate.
+        When the qir entry ``ir_dict`` gives the gate by its gate function with number parameters
+        (or no parameters), and the channels have number parameters,
+        the composition is evaluated with numpy once and cached for the parameter set.
+
+        :param gate: The gate tensor.
+        :type gate: Tensor
+        :param name: The gate name.
+        :type name: str
+        :param index: The qubits of the gate.
+        :type index: Sequence[int]
+        :param ir_dict: The qir entry of the gate, defaults to None
+        :type ir_dict: Optional[Dict[str, Any]], optional
+        :return: The superoperator matrix with shape :math:`[4^k, 4^k]` or None.
+        :rtype: Optional[Tensor]
+        """
+        matched = self._matched(name, index)
+        if not any(matched):
+            return None
+        rules = set(i for m in matched for i in m)
+        if ir_dict is None:
+            ir_dict = {}
+        gatef = ir_dict.get("gatef", None)
+        params = ir_dict.get("parameters", {})
+        if (
+            gatef is not None
+            and all(_is_number(v) for v in params.values())
+            and all(self._rules[i]["kraus"] is not None for i in rules)
+        ):
+            key = (gatef, tuple(sorted(params.items())), matched, dtypestr)
+            if key not in self._cache:
+                with runtime_backend("numpy"):
+                    u = gatef(**params).tensor
+                self._cache[key] = compose_super_operator(
+                    u, [self._channels_on(m, npb) for m in matched], npb
+                )
+            return backend.convert_to_tensor(self._cache[key])
+        return compose_super_operator(
+            gate, [self._channels_on(m, backend) for m in matched]
+        )
@@ -16,6 +16,7 @@ from typing import (
     Any,
     Callable,
     Collection,
+    Dict,
     List,
     Optional,
     Sequence,
@@ -1103,196 +1104,448 @@ def quimb2qop(qb_mpo: Any) -> QuOperator:
     return qop
 
 
-try:
+def _ps2masks(ls: Sequence[Sequence[int]]) -> Tuple[Tensor, Tensor, Tensor]:
+    """
+    Bit masks of Pauli strings: the flip mask for X and Y,
+    the sign mask for Z and Y and the number of Y in each string.
+    The first qubit corresponds to the most significant bit.
+    """
+    ls = np.real(np.array(ls)).astype(np.int64)
+    if ls.ndim == 1:
+        ls = ls[None, :]
+    n = ls.shape[1]
+    bits = np.left_shift(np.int64(1), np.arange(n - 1, -1, -1, dtype=np.int64))
+    flip = ((ls == 1) | (ls == 2)).astype(np.int64) @ bits
+    sign = ((ls == 2) | (ls == 3)).astype(np.int64) @ bits
+    ny = np.sum(ls == 2, axis=1)
+    return flip, sign, ny
+
+
+def _parity(x: Tensor, K: Any = None, nbits: int = 64) -> Tensor:
+    """
+    The parity of the number of 1 bits for each element in the integer array ``x``
+    (numpy int64 array, or backend tensor with ``K`` the backend) of at most ``nbits`` bits
+    """
+    shifts = []
+    s = 1
+    while s < nbits:
+        shifts.append(s)
+        s *= 2
+    for s in reversed(shifts):
+        if K is None:
+            x = x ^ (x >> s)
+        else:
+            x = K.bitwise_xor(x, K.right_shift(x, s))
+    if K is None:
+        return x & 1
+    return K.bitwise_and(x, 1)
 
-    def _id(x: Any) -> Any:
-        return x
 
-    if is_m1mac():
-        compiled_jit = _id
-    else:
-        compiled_jit = partial(get_backend("tensorflow").jit, jit_compile=True)
+def _ps_index_masks(
+    idx: Tensor, flips: Tensor, signs: Tensor, nbits: int, K: Any = None
+) -> Tuple[Tensor, Tensor]:
+    """
+    The permuted indices ``idx ^ flip`` and the signs ``(-1)^{popcount(idx & sign)}``
+    of the Pauli strings with the bit masks ``flips`` and ``signs`` (see ``_ps2masks``)
+    for the index column ``idx`` with shape ``[m, 1]``, both results with shape ``[m, nterms]``.
+    The indices are int32 backend tensors for at most 31 qubits (``nbits``) and int64 otherwise.
+    """
+    if K is None:
+        K = backend
+    itype, nptype = ("int64", np.int64) if nbits > 31 else ("int32", np.int32)
+    flips = K.cast(K.convert_to_tensor(np.array(flips).astype(nptype)[None, :]), itype)
+    signs = K.cast(K.convert_to_tensor(np.array(signs).astype(nptype)[None, :]), itype)
+    flipped = K.bitwise_xor(idx, flips)
+    sign = 1 - 2 * _parity(K.bitwise_and(idx, signs), K, nbits)
+    return flipped, sign
+
+
+def PauliStringSum2COO_numpy(
+    ls: Sequence[Sequence[int]],
+    weight: Optional[Sequence[float]] = None,
+    csr: bool = False,
+    chunk_size: Optional[int] = None,
+) -> Tensor:
+    """
+    Generate scipy sparse matrix from Pauli string sum with numpy only,
+    the bit masks, phases and ``(row, col, value)`` triples are computed for a chunk of Pauli strings
+    in one vectorized pass, and the duplicate entries are coalesced.
 
-    def heisenberg_hamiltonian(
-        g: Graph,
-        hzz: float = 1.0,
-        hxx: float = 1.0,
-        hyy: float = 1.0,
-        hz: float = 0.0,
-        hx: float = 0.0,
-        hy: float = 0.0,
-        sparse: bool = True,
-        numpy: bool = False,
-    ) -> Tensor:
-        """
-        Generate Heisenberg Hamiltonian with possible external fields.
+    :Example:
 
-        :Example:
+    >>> tc.quantum.PauliStringSum2COO_numpy([[1, 0], [3, 3]], [0.5, 1.0]).todense()
+    matrix([[ 1. +0.j,  0. +0.j,  0.5+0.j,  0. +0.j],
+            [ 0. +0.j, -1. +0.j,  0. +0.j,  0.5+0.j],
+            [ 0.5+0.j,  0. +0.j, -1. +0.j,  0. +0.j],
+            [ 0. +0.j,  0.5+0.j,  0. +0.j,  1. +0.j]], dtype=complex64)
+
+    :param ls: 2D Tensor, each row is for a Pauli string,
+        e.g. [1, 0, 0, 3, 2] is for :math:`X_0Z_3Y_4`
+    :type ls: Sequence[Sequence[int]]
+    :param weight: 1D Tensor, each element corresponds the weight for each Pauli string
+        defaults to None (all Pauli strings weight 1.0)
+    :type weight: Optional[Sequence[float]], optional
+    :param csr: whether to return the matrix in csr format instead of coo format, defaults to False
+    :type csr: bool, optional
+    :param chunk_size: the number of Pauli strings processed in one pass,
+        defaults to None (about :math:`2^{22}` non zero entries in one pass)
+    :type chunk_size: Optional[int], optional
+    :return: the scipy coo (or csr) sparse matrix
+    :rtype: Tensor
+    """
+    from scipy.sparse import coo_matrix
+
+    flip, sign, ny = _ps2masks(ls)
+    nterms = flip.shape[0]
+    n = np.array(ls).shape[-1]
+    s = 0b1 << n
+    if weight is None:
+        weight = np.ones([nterms])
+    weight = np.array(weight).reshape([-1]).astype(npdtype)
+    # the phase from Y in the convention of X and Z flips and signs
+    weight = weight * (-1j) ** np.mod(ny, 4)
+    if chunk_size is None:
+        chunk_size = max(1, (1 << 22) >> n)
+
+    # Pauli strings with the same flip mask share the same non zero positions,
+    # so the duplicate entries are coalesced by accumulating the values per flip mask
+    flips, inverse = np.unique(flip, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    inverse, sign, weight = inverse[order], sign[order], weight[order]
+    rows = np.arange(s, dtype=np.int64)
+    values = np.zeros([len(flips), s], dtype=npdtype)
+    for start in range(0, nterms, chunk_size):
+        end = min(start + chunk_size, nterms)
+        signs = 1 - 2 * _parity(rows[None, :] & sign[start:end, None])
+        group = inverse[start:end]
+        heads = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+        values[group[heads]] += np.add.reduceat(
+            signs * weight[start:end, None], heads, axis=0
+        )
+    cols = rows[None, :] ^ flips[:, None]
+    mask = values != 0
+    r = coo_matrix(
+        (values[mask], (np.broadcast_to(rows, cols.shape)[mask], cols[mask])),
+        shape=(s, s),
+    )
+    if csr:
+        return r.tocsr()
+    return r
+
+
+def heisenberg_hamiltonian(
+    g: Graph,
+    hzz: float = 1.0,
+    hxx: float = 1.0,
+    hyy: float = 1.0,
+    hz: float = 0.0,
+    hx: float = 0.0,
+    hy: float = 0.0,
+    sparse: bool = True,
+    numpy: bool = False,
+) -> Tensor:
+    """
+    Generate Heisenberg Hamiltonian with possible external fields.
 
-        >>> g = tc.templates.graphs.Line1D(6)
-        >>> h = qu.heisenberg_hamiltonian(g, sparse=False)
-        >>> tc.backend.eigh(h)[0][:10]
-        array([-11.2111025,  -8.4721365,  -8.472136 ,  -8.472136 ,  -6.       ,
-                -5.123106 ,  -5.123106 ,  -5.1231055,  -5.1231055,  -5.1231055],
-            dtype=float32)
-
-        :param g: input circuit graph
-        :type g: Graph
-        :param hzz: zz coupling, default is 1.0
-        :type hzz: float
-        :param hxx: xx coupling, default is 1.0
-        :type hxx: float
-        :param hyy: yy coupling, default is 1.0
-        :type hyy: float
-        :param hz: External field on z direction, default is 0.0
-        :type hz: float
-        :param hx: External field on y direction, default is 0.0
-        :type hx: float
-        :param hy: External field on x direction, default is 0.0
-        :type hy: float
-        :param sparse: Whether to return sparse Hamiltonian operator, default is True.
-        :type sparse: bool, defalts True
-        :param numpy: whether return the matrix in numpy or tensorflow form
-        :type numpy: bool, defaults False,
-
-        :return: Hamiltonian measurements
-        :rtype: Tensor
-        """
-        n = len(g.nodes)
-        ls = []
-        weight = []
-        for e in g.edges:
-            if hzz != 0:
-                r = [0 for _ in range(n)]
-                r[e[0]] = 3
-                r[e[1]] = 3
-                ls.append(r)
-                weight.append(hzz)
-            if hxx != 0:
-                r = [0 for _ in range(n)]
-                r[e[0]] = 1
-                r[e[1]] = 1
-                ls.append(r)
-                weight.append(hxx)
-            if hyy != 0:
-                r = [0 for _ in range(n)]
-                r[e[0]] = 2
-                r[e[1]] = 2
-                ls.append(r)
-                weight.append(hyy)
-        for node in g.nodes:
-            if hz != 0:
-                r = [0 for _ in range(n)]
-                r[node] = 3
-                ls.append(r)
-                weight.append(hz)
-            if hx != 0:
-                r = [0 for _ in range(n)]
-                r[node] = 1
-                ls.append(r)
-                weight.append(hx)
-            if hy != 0:
-                r = [0 for _ in range(n)]
-                r[node] = 2
-                ls.append(r)
-                weight.append(hy)
-        ls = tf.constant(ls)
-        weight = tf.constant(weight)
-        ls = get_backend("tensorflow").cast(ls, dtypestr)
-        weight = get_backend("tensorflow").cast(weight, dtypestr)
-        if sparse:
-            r = PauliStringSum2COO_numpy(ls, weight)
-            if numpy:
-                return r
-            return backend.coo_sparse_matrix_from_numpy(r)
-        return PauliStringSum2Dense(ls, weight, numpy=numpy)
+    :Example:
 
-    def PauliStringSum2Dense(
+    >>> g = tc.templates.graphs.Line1D(6)
+    >>> h = qu.heisenberg_hamiltonian(g, sparse=False)
+    >>> tc.backend.eigh(h)[0][:10]
+    array([-11.2111025,  -8.4721365,  -8.472136 ,  -8.472136 ,  -6.       ,
+            -5.123106 ,  -5.123106 ,  -5.1231055,  -5.1231055,  -5.1231055],
+        dtype=float32)
+
+    :param g: input circuit graph
+    :type g: Graph
+    :param hzz: zz coupling, default is 1.0
+    :type hzz: float
+    :param hxx: xx coupling, default is 1.0
+    :type hxx: float
+    :param hyy: yy coupling, default is 1.0
+    :type hyy: float
+    :param hz: External field on z direction, default is 0.0
+    :type hz: float
+    :param hx: External field on y direction, default is 0.0
+    :type hx: float
+    :param hy: External field on x direction, default is 0.0
+    :type hy: float
+    :param sparse: Whether to return sparse Hamiltonian operator, default is True.
+    :type sparse: bool, defalts True
+    :param numpy: whether return the matrix in numpy or tensorflow form
+    :type numpy: bool, defaults False,
+
+    :return: Hamiltonian measurements
+    :rtype: Tensor
+    """
+    n = len(g.nodes)
+    ls = []
+    weight = []
+    for e in g.edges:
+        if hzz != 0:
+            r = [0 for _ in range(n)]
+            r[e[0]] = 3
+            r[e[1]] = 3
+            ls.append(r)
+            weight.append(hzz)
+        if hxx != 0:
+            r = [0 for _ in range(n)]
+            r[e[0]] = 1
+            r[e[1]] = 1
+            ls.append(r)
+            weight.append(hxx)
+        if hyy != 0:
+            r = [0 for _ in range(n)]
+            r[e[0]] = 2
+            r[e[1]] = 2
+            ls.append(r)
+            weight.append(hyy)
+    for node in g.nodes:
+        if hz != 0:
+            r = [0 for _ in range(n)]
+            r[node] = 3
+            ls.append(r)
+            weight.append(hz)
+        if hx != 0:
+            r = [0 for _ in range(n)]
+            r[node] = 1
+            ls.append(r)
+            weight.append(hx)
+        if hy != 0:
+            r = [0 for _ in range(n)]
+            r[node] = 2
+            ls.append(r)
+            weight.append(hy)
+    if sparse:
+        r = PauliStringSum2COO_numpy(ls, weight)
+        if numpy:
+            return r
+        return backend.coo_sparse_matrix_from_numpy(r)
+    return PauliStringSum2Dense(ls, weight, numpy=numpy)
+
+
+def PauliStringSum2Dense(
+    ls: Sequence[Sequence[int]],
+    weight: Optional[Sequence[float]] = None,
+    numpy: bool = False,
+) -> Tensor:
+    """
+    Generate dense matrix from Pauli string sum
+
+    :param ls: 2D Tensor, each row is for a Pauli string,
+        e.g. [1, 0, 0, 3, 2] is for :math:`X_0Z_3Y_4`
+    :type ls: Sequence[Sequence[int]]
+    :param weight: 1D Tensor, each element corresponds the weight for each Pauli string
+        defaults to None (all Pauli strings weight 1.0)
+    :type weight: Optional[Sequence[float]], optional
+    :param numpy: default False. If True, return numpy coo
+        else return backend compatible sparse tensor
+    :type numpy: bool
+    :return: the tensorflow dense matrix
+    :rtype: Tensor
+    """
+    sparsem = PauliStringSum2COO_numpy(ls, weight)
+    if numpy:
+        return sparsem.todense()
+    sparsem = backend.coo_sparse_matrix_from_numpy(sparsem)
+    densem = backend.to_dense(sparsem)
+    return densem
+
+
+# already implemented as backend method
+#
+# def _tf2numpy_sparse(a: Tensor) -> Tensor:
+#     return get_backend("numpy").coo_sparse_matrix(
+#         indices=a.indices,
+#         values=a.values,
+#         shape=a.get_shape(),
+#     )
+
+# def _numpy2tf_sparse(a: Tensor) -> Tensor:
+#     return get_backend("tensorflow").coo_sparse_matrix(
+#         indices=np.array([a.row, a.col]).T,
+#         values=a.data,
+#         shape=a.shape,
+#     )
+
+
+def PauliStringSum2COO(
+    ls: Sequence[Sequence[int]],
+    weight: Optional[Sequence[float]] = None,
+    numpy: bool = False,
+) -> Tensor:
+    """
+    Generate sparse tensor from Pauli string sum
+
+    :param ls: 2D Tensor, each row is for a Pauli string,
+        e.g. [1, 0, 0, 3, 2] is for :math:`X_0Z_3Y_4`
+    :type ls: Sequence[Sequence[int]]
+    :param weight: 1D Tensor, each element corresponds the weight for each Pauli string
+        defaults to None (all Pauli strings weight 1.0)
+    :type weight: Optional[Sequence[float]], optional
+    :param numpy: default False. If True, return numpy coo
+        else return backend compatible sparse tensor
+    :type numpy: bool
+    :return: the scipy coo sparse matrix
+    :rtype: Tensor
+    """
+    rsparse = PauliStringSum2COO_numpy(ls, weight)
+    if numpy:
+        return rsparse
+    return backend.coo_sparse_matrix_from_numpy(rsparse)
+
+
+class PauliSumOperator:
+    """
+    Matrix free representation of the Pauli string sum operator, only the bit masks
+    and the weights of Pauli strings are stored instead of the :math:`2^n\\times 2^n` matrix.
+    The operator is applied on states by index permutations and sign vectors,
+    which is jittable and differentiable (with respect to both the states and the weights).
+
+    :Example:
+
+    >>> h = tc.quantum.PauliSumOperator([[1, 0], [3, 3]], [0.5, 1.0])
+    >>> h.apply(tc.array_to_tensor([1.0, 0, 0, 0]))
+    array([1. +0.j, 0. +0.j, 0.5+0.j, 0. +0.j], dtype=complex64)
+    >>> scipy.sparse.linalg.eigsh(h.to_linear_operator(), k=1, which="SA")[0]
+    array([-1.118034])
+    """
+
+    def __init__(
+        self,
         ls: Sequence[Sequence[int]],
         weight: Optional[Sequence[float]] = None,
-        numpy: bool = False,
-    ) -> Tensor:
+        chunk_size: Optional[int] = None,
+    ) -> None:
         """
-        Generate dense matrix from Pauli string sum
-
         :param ls: 2D Tensor, each row is for a Pauli string,
             e.g. [1, 0, 0, 3, 2] is for :math:`X_0Z_3Y_4`
         :type ls: Sequence[Sequence[int]]
         :param weight: 1D Tensor, each element corresponds the weight for each Pauli string
             defaults to None (all Pauli strings weight 1.0)
         :type weight: Optional[Sequence[float]], optional
-        :param numpy: default False. If True, return numpy coo
-            else return backend compatible sparse tensor
-        :type numpy: bool
-        :return: the tensorflow dense matrix
+        :param chunk_size: the number of Pauli strings applied in one batch,
+            defaults to None (about :math:`2^{22}` state elements in one batch)
+        :type chunk_size: Optional[int], optional
+        """
+        self.flips, self.signs, ny = _ps2masks(ls)
+        self.nterms = self.flips.shape[0]
+        self.nqubits = int(np.array(ls).shape[-1])
+        self.shape = (2**self.nqubits, 2**self.nqubits)
+        self.dtype = npdtype
+        self._itype = "int64" if self.nqubits > 31 else "int32"
+        # the phase from Y in the convention of X and Z flips and signs
+        self.phases = ((-1j) ** np.mod(ny, 4)).astype(npdtype)
+        if weight is None:
+            weight = np.ones([self.nterms])
+        self.weight = weight
+        if chunk_size is None:
+            chunk_size = max(1, (1 << 22) >> self.nqubits)
+        self.chunk_size = chunk_size
+
+    def _masks(self, start: int, end: int, K: Any) -> Tuple[Tensor, Tensor]:
+        """
+        The permuted indices ``i ^ flip`` and signs ``(-1)^{popcount(i & sign)}``
+        for Pauli strings in ``[start, end)``, both with shape ``[2^n, end - start]``.
+        """
+        n = self.nqubits
+        idx = K.reshape(K.cast(K.arange(2**n), self._itype), [-1, 1])
+        return _ps_index_masks(idx, self.flips[start:end], self.signs[start:end], n, K)
+
+    def _apply(self, state: Tensor, K: Any) -> Tensor:
+        s = self.shape[0]
+        state = K.cast(K.convert_to_tensor(state), dtypestr)
+        shape = K.shape_tuple(state)
+        state = K.reshape(state, [s, -1])
+        nbatch = K.shape_tuple(state)[1]
+        flat = K.reshape(state, [-1])
+        weight = K.cast(K.convert_to_tensor(self.weight), dtypestr)
+        r = K.zeros([s, nbatch], dtype=dtypestr)
+        for start in range(0, self.nterms, self.chunk_size):
+            end = min(start + self.chunk_size, self.nterms)
+            flipped, sign = self._masks(start, end, K)
+            coeff = weight[start:end] * K.convert_to_tensor(self.phases[start:end])
+            coeff = K.cast(sign, dtypestr) * coeff[None, :]
+            indices = K.reshape(flipped, [-1, 1]) * nbatch + K.reshape(
+                K.cast(K.arange(nbatch), self._itype), [1, -1]
+            )
+            g = K.reshape(K.gather1d(flat, K.reshape(indices, [-1])), [s, -1, nbatch])
+            r += K.sum(coeff[:, :, None] * g, axis=1)
+        return K.reshape(r, shape)
+
+    def apply(self, state: Tensor) -> Tensor:
+        """
+        Apply the operator on the state vector with shape ``[2^n]``
+        or on a batch of states with shape ``[2^n, batch]``.
+
+        :param state: the state vector(s)
+        :type state: Tensor
+        :return: the resulted state vector(s) with the same shape as ``state``
         :rtype: Tensor
         """
-        sparsem = PauliStringSum2COO_numpy(ls, weight)
-        if numpy:
-            return sparsem.todense()
-        sparsem = backend.coo_sparse_matrix_from_numpy(sparsem)
-        densem = backend.to_dense(sparsem)
-        return densem
-
-    # already implemented as backend method
-    #
-    # def _tf2numpy_sparse(a: Tensor) -> Tensor:
-    #     return get_backend("numpy").coo_sparse_matrix(
-    #         indices=a.indices,
-    #         values=a.values,
-    #         shape=a.get_shape(),
-    #     )
-
-    # def _numpy2tf_sparse(a: Tensor) -> Tensor:
-    #     return get_backend("tensorflow").coo_sparse_matrix(
-    #         indices=np.array([a.row, a.col]).T,
-    #         values=a.data,
-    #         shape=a.shape,
-    #     )
-
-    def PauliStringSum2COO(
-        ls: Sequence[Sequence[int]],
-        weight: Optional[Sequence[float]] = None,
-        numpy: bool = False,
-    ) -> Tensor:
+        return self._apply(state, backend)
+
+    __matmul__ = apply
+
+    def expectation(self, state: Tensor) -> Tensor:
         """
-        Generate sparse tensor from Pauli string sum
+        The (real) expectation :math:`\\langle\\psi\\vert H\\vert\\psi\\rangle` on the state vector.
 
-        :param ls: 2D Tensor, each row is for a Pauli string,
-            e.g. [1, 0, 0, 3, 2] is for :math:`X_0Z_3Y_4`
-        :type ls: Sequence[Sequence[int]]
-        :param weight: 1D Tensor, each element corresponds the weight for each Pauli string
-            defaults to None (all Pauli strings weight 1.0)
-        :type weight: Optional[Sequence[float]], optional
-        :param numpy: default False. If True, return numpy coo
-            else return backend compatible sparse tensor
-        :type numpy: bool
-        :return: the scipy coo sparse matrix
+        :param state: the state vector with shape ``[2^n]``
+        :type state: Tensor
+        :return: the expectation value
         :rtype: Tensor
         """
-        # numpy version is 3* faster!
+        state = backend.cast(backend.reshape(state, [-1]), dtypestr)
+        return backend.real(backend.sum(backend.conj(state) * self.apply(state)))
 
-        nterms = len(ls)
-        n = len(ls[0])
-        s = 0b1 << n
-        if weight is None:
-            weight = [1.0 for _ in range(nterms)]
-        if not (isinstance(weight, tf.Tensor) or isinstance(weight, tf.Variable)):
-            weight = tf.constant(weight, dtype=getattr(tf, dtypestr))
-        rsparse = get_backend("numpy").coo_sparse_matrix(
-            indices=np.array([[0, 0]], dtype=np.int64),
-            values=np.array([0.0], dtype=getattr(np, dtypestr)),  # type: ignore
-            shape=(s, s),
+    def to_coo(self, csr: bool = False) -> Tensor:
+        """
+        Materialize the operator as a scipy sparse matrix, see ``PauliStringSum2COO_numpy``.
+
+        :param csr: whether to return the matrix in csr format, defaults to False
+        :type csr: bool, optional
+        :return: the scipy coo (or csr) sparse matrix
+        :rtype: Tensor
+        """
+        ls = np.zeros([self.nterms, self.nqubits], dtype=np.int64)
+        for i in range(self.nqubits):
+            b = self.nqubits - 1 - i
+            x = (self.flips >> b) & 1
+            z = (self.signs >> b) & 1
+            ls[:, i] = x + 3 * z - 2 * x * z
+        return PauliStringSum2COO_numpy(
+            ls, np.array(self.weight), csr=csr, chunk_size=self.chunk_size
         )
-        for i in range(nterms):
-            rsparse += get_backend("tensorflow").numpy(PauliString2COO(ls[i], weight[i]))  # type: ignore
-            # auto transformed into csr format!!
-        rsparse = rsparse.tocoo()
-        if numpy:
-            return rsparse
-        return backend.coo_sparse_matrix_from_numpy(rsparse)
 
-    PauliStringSum2COO_numpy = partial(PauliStringSum2COO, numpy=True)
+    def to_linear_operator(self) -> Any:
+        """
+        Wrap the operator as ``scipy.sparse.linalg.LinearOperator`` (in numpy),
+        which can be directly used by scipy eigensolvers such as ``eigsh``.
+
+        :return: the scipy linear operator
+        :rtype: scipy.sparse.linalg.LinearOperator
+        """
+        from scipy.sparse.linalg import LinearOperator
+
+        npb = get_backend("numpy")
+        return LinearOperator(
+            self.shape,
+            matvec=partial(self._apply, K=npb),
+            matmat=partial(self._apply, K=npb),
+            dtype=self.dtype,
+        )
+
+
+try:
+
+    def _id(x: Any) -> Any:
+        return x
+
+    if is_m1mac():
+        compiled_jit = _id
+    else:
+        compiled_jit = partial(get_backend("tensorflow").jit, jit_compile=True)
 
     def PauliStringSum2COO_tf(
         ls: Sequence[Sequence[int]], weight: Optional[Sequence[float]] = None
@@ -1826,8 +2079,117 @@ def mutual_information(s: Tensor, cut: Union[int, List[int]]) -> Tensor:
     return ha + hb - hab
 
 
+def _cdf_counts(
+    p: Tensor,
+    shots: int,
+    index: Optional[Sequence[int]] = None,
+    chunk_size: Optional[int] = None,
+    random_state: Optional[Any] = None,
+    dim: Optional[Sequence[int]] = None,
+) -> Tensor:
+    """
+    Dense histogram (numpy int64 array) of ``shots`` samples drawn from the probability vector ``p``,
+    marginalized on qubits (or qudits with local dimensions ``dim``) ``index`` first if provided.
+    """
+    p = np.real(np.reshape(backend.numpy(backend.convert_to_tensor(p)), [-1]))
+    p = p.astype(np.float64)
+    if dim is None:
+        n = int(round(np.log2(p.shape[0])))
+        dim = [2 for _ in range(n)]
+    n = len(dim)
+    if index is not None:
+        index = list(index)
+        p = np.reshape(p, list(dim))
+        p = np.sum(p, axis=tuple(i for i in range(n) if i not in index))
+        # the remaining legs are in ascending order, rearrange them in the order of ``index``
+        p = np.reshape(np.transpose(p, np.argsort(np.argsort(index))), [-1])
+    d = p.shape[0]
+    cdf = np.cumsum(np.maximum(p, 0.0))
+    cdf /= cdf[-1]
+    rng = np.random.default_rng(random_state)
+    if chunk_size is None:
+        chunk_size = 2**20
+    counts = np.zeros([d], dtype=np.int64)
+    for start in range(0, shots, chunk_size):
+        m = min(chunk_size, shots - start)
+        u = np.sort(rng.random(m))
+        if m < d:
+            # bin index of each sorted uniform, runs of the same bin are counted at once
+            ch = np.minimum(np.searchsorted(cdf, u, side="right"), d - 1)
+            runs = np.concatenate([[0], np.flatnonzero(np.diff(ch)) + 1])
+            counts[ch[runs]] += np.diff(np.append(runs, m))
+        else:
+            # number of sorted uniforms falling in each bin of the cdf
+            counts += np.diff(np.searchsorted(u, cdf, side="left"), prepend=0)
+    return counts
+
+
+def sample_counts(
+    p: Tensor,
+    shots: int,
+    index: Optional[Sequence[int]] = None,
+    sparse: bool = True,
+    chunk_size: Optional[int] = None,
+    random_state: Optional[Any] = None,
+    dim: Optional[Sequence[int]] = None,
+) -> Union[Dict[str, int], Tensor]:
+    """
+    Measurement counts of ``shots`` shots drawn from the probability vector ``p``
+    on the computational basis. The cdf is computed once, and the shots are drawn as sorted uniforms
+    in chunks of ``chunk_size`` which are directly accumulated into counts,
+    so that the memory is independent of the number of shots.
+
+    :Example:
+
+    >>> p = tc.backend.convert_to_tensor(np.array([0.5, 0, 0, 0.5]))
+    >>> qu.sample_counts(p, 1000, random_state=42)
+    {'00': 503, '11': 497}
+    >>> qu.sample_counts(p, 1000, index=[1], sparse=False, random_state=42)
+    array([503, 497])
+
+    :param p: The probability vector with shape ``[2^n]``, not necessarily normalized.
+    :type p: Tensor
+    :param shots: The number of measurement shots.
+    :type shots: int
+    :param index: Only count the marginal outcomes on these qubits (in the given order),
+        defaults to None (all qubits)
+    :type index: Optional[Sequence[int]], optional
+    :param sparse: If True, return a dict from bitstrings to nonzero counts,
+        otherwise return the dense histogram with shape ``[2^{len(index)}]``, defaults to True
+    :type sparse: bool, optional
+    :param chunk_size: The number of shots drawn in one chunk, defaults to None (:math:`2^{20}`)
+    :type chunk_size: Optional[int], optional
+    :param random_state: seed or ``np.random.Generator`` for the uniforms, defaults to None
+    :type random_state: Optional[Any], optional
+    :param dim: The local dimensions of the sites for qudit probability vectors,
+        whose outcomes are keyed by base 36 digit strings, defaults to None (qubits)
+    :type dim: Optional[Sequence[int]], optional
+    :return: The counts dict or the dense histogram (numpy int64 array).
+    :rtype: Union[Dict[str, int], Tensor]
+    """
+    counts = _cdf_counts(p, shots, index, chunk_size, random_state, dim)
+    if not sparse:
+        return counts
+    if dim is None:
+        n = int(round(np.log2(counts.shape[0])))
+        return {
+            np.binary_repr(i, width=n): int(counts[i]) for i in np.flatnonzero(counts)
+        }
+    if index is not None:
+        dim = [dim[i] for i in index]
+    nonzero = np.flatnonzero(counts)
+    digits = np.stack(np.unravel_index(nonzero, list(dim)), axis=1)
+    return {
+        "".join(np.base_repr(j, 36).lower() for j in ds): int(counts[i])
+        for i, ds in zip(nonzero, digits)
+    }
+
+
 def measurement_counts(
-    state: Tensor, counts: int = 8192, sparse: bool = True
+    state: Tensor,
+    counts: int = 8192,
+    sparse: bool = True,
+    random_state: Optional[Any] = None,
 ) -> Union[Tuple[Tensor, Tensor], Tensor]:
     """
     Simulate the measuring of each qubit of ``p`` in the computational basis,
@@ -1850,6 +2212,10 @@ def measurement_counts(
     :param sparse: Defaults True. The bool indicating whether
         the return form is in the form of two array or one of the same length as the ``state`` (if ``sparse=False``).
     :type sparse: bool
+    :param random_state: seed or ``np.random.Generator`` to draw the shots by the chunked cdf sampler
+        of ``sample_counts``, defaults to None (the shots are drawn by the backend random state,
+        see ``tc.backend.set_random_state``)
+    :type random_state: Optional[Any], optional
     :return: The counts for each bit string measured.
     :rtype: Tuple[]
     """
@@ -1860,6 +2226,14 @@ def measurement_counts(
         state /= backend.norm(state)
         pi = backend.real(backend.conj(state) * state)
     pi = backend.reshape(pi, [-1])
+    if random_state is not None:
+        dense_counts = _cdf_counts(pi, counts, random_state=random_state)
+        if sparse:
+            nonzero = np.flatnonzero(dense_counts)
+            return backend.convert_to_tensor(nonzero), backend.convert_to_tensor(
+                dense_counts[nonzero]
+            )
+        return backend.convert_to_tensor(dense_counts)
     d = int(pi.shape[0])
     # raw counts in terms of integers
     raw_counts = backend.implicit_randc(d, shape=counts, p=pi)
@@ -8,10 +8,11 @@ Tensornetwork Simplification
 # and consider less on general tensornetwork topology.
 # Note we have no direct hyperedge support in tensornetwork package
 
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import tensornetwork as tn
+from opt_einsum import get_symbol
 
 
 def infer_new_size(a: tn.Node, b: tn.Node, include_old: bool = True) -> Any:
@@ -280,3 +281,208 @@ def _full_light_cone_cancel(nodes: List[Any]) -> List[Any]:
     while is_changed:
         nodes, is_changed = _light_cone_cancel(nodes)
     return nodes
+
+
+def _fuse_block(
+    entries: Sequence[Dict[str, Any]],
+    qubits: Sequence[int],
+    dims: Optional[Sequence[int]] = None,
+) -> Dict[str, Any]:
+    """
+    Multiply the gates in qir ``entries`` into one dense gate on ``qubits``
+    (with local dimensions ``dims``, defaults to qubits),
+    only backend operations are involved so that the gate parameters are kept differentiable.
+    """
+    from .cons import backend, dtypestr
+    from . import gates
+
+    m = len(qubits)
+    if dims is None:
+        dims = [2 for _ in range(m)]
+    dims = list(dims)
+    symbols = [get_symbol(i) for i in range(2 * m)]
+    u = backend.reshape(backend.eye(int(np.prod(dims)), dtype=dtypestr), dims + dims)
+    for d in entries:
+        index = d["index"]
+        noe = len(index)
+        t = backend.cast(backend.convert_to_tensor(d["gate"].tensor), dtypestr)
+        t = backend.reshape(t, [dims[qubits.index(q)] for q in index] * 2)
+        ins = [symbols[qubits.index(q)] for q in index]
+        outs = [get_symbol(2 * m + i) for i in range(noe)]
+        after = list(symbols)
+        for q, s in zip(index, outs):
+            after[qubits.index(q)] = s
+        expr = "".join(outs + ins) + "," + "".join(symbols) + "->" + "".join(after)
+        u = backend.einsum(expr, t, u, optimize=False)
+    return {
+        "gatef": gates.any,
+        "gate": gates.Gate(u, name="any"),
+        "index": tuple(qubits),
+        "name": "any",
+        "split": None,
+        "mpo": False,
+        "parameters": {"unitary": u},
+    }
+
+
+def fuse_qir(
+    qir: List[Dict[str, Any]], k: int = 2, dims: Optional[Sequence[int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Fuse adjacent gates in the quantum intermediate representation into dense blocks
+    acting on at most ``k`` qubits. A gate is merged into the blocks on its qubits when these blocks
+    are the latest ones on all of their qubits and the merged block acts on no more than ``k`` qubits,
+    otherwise a new block is started. MPO type gates and gates on more than ``k`` qubits are kept as they are.
+    Blocks with only one gate are also kept as they are, and the fused blocks are recorded as ``any`` gates.
+
+    :Example:
+
+    >>> c = tc.Circuit(3)
+    >>> c.h(0)
+    >>> c.rx(0, theta=0.2)
+    >>> c.cnot(0, 1)
+    >>> c.rz(1, theta=0.3)
+    >>> c.h(2)
+    >>> qir = tc.simplify.fuse_qir(c.to_qir())
+    >>> [(d["name"], d["index"]) for d in qir]
+    [('any', (0, 1)), ('h', (2,))]
+    >>> c2 = tc.Circuit.from_qir(c.to_qir(), fuse=True)
+
+    :param qir: The quantum intermediate representation of a circuit.
+    :type qir: List[Dict[str, Any]]
+    :param k: The max number of qubits of the fused blocks, defaults to 2
+    :type k: int, optional
+    :param dims: The local dimension of each site for qudit circuits, defaults to None,
+        i.e. inferred from the gate tensors with one leg for each site (2 otherwise)
+    :type dims: Optional[Sequence[int]], optional
+    :return: The quantum intermediate representation with fused gates.
+    :rtype: List[Dict[str, Any]]
+    """
+    # each block: [qubits in order of appearance, [(qir position, qir entry)], fusable]
+    blocks: List[Any] = []
+    last: Dict[int, int] = {}
+    site_dims: Dict[int, int] = {}
+    if dims is not None:
+        site_dims.update(enumerate(dims))
+    for i, d in enumerate(qir):
+        index = list(d["index"])
+        if dims is None and not d["mpo"]:
+            shape = list(getattr(d["gate"], "tensor", d["gate"]).shape)
+            if len(shape) == 2 * len(index):
+                site_dims.update(zip(index, shape))
+        fusable = (not d["mpo"]) and len(index) <= k
+        if fusable:
+            candidates = sorted(set(last[q] for q in index if q in last))
+            qubits: List[int] = []
+            for b in candidates:
+                qubits += [q for q in blocks[b][0] if q not in qubits]
+            qubits += [q for q in index if q not in qubits]
+            if (
+                len(qubits) <= k
+                and all(blocks[b][2] for b in candidates)
+                and all(last[q] == b for b in candidates for q in blocks[b][0])
+            ):
+                entries = []
+                for b in candidates:
+                    entries += blocks[b][1]
+                    blocks[b] = None
+                # the merged block takes the place of the latest one
+                # as the earlier blocks are not followed by any gate on their qubits
+                target = candidates[-1] if candidates else len(blocks)
+                block = [qubits, sorted(entries, key=lambda e: e[0]) + [(i, d)], True]
+                if target == len(blocks):
+                    blocks.append(block)
+                else:
+                    blocks[target] = block
+                for q in qubits:
+                    last[q] = target
+                continue
+        blocks.append([index, [(i, d)], fusable])
+        for q in index:
+            last[q] = len(blocks) - 1
+
+    fused = []
+    for block in blocks:
+        if block is None:
+            continue
+        if len(block[1]) == 1:
+            fused.append(block[1][0][1])
+        else:
+            fused.append(
+                _fuse_block(
+                    [d for _, d in block[1]],
+                    block[0],
+                    [site_dims.get(q, 2) for q in block[0]],
+                )
+            )
+    return fused
+
+
+_unitary_gate_names = (
+    ["i", "x", "y", "z", "h", "t", "s", "td", "sd", "wroot"]
+    + ["cnot", "cz", "swap", "cy", "iswap", "ox", "oy", "oz", "toffoli", "fredkin"]
+    + ["r", "cr", "rx", "ry", "rz", "rxx", "ryy", "rzz"]
+    + ["crx", "cry", "crz", "orx", "ory", "orz"]
+)
+
+
+def _is_unitary_entry(d: Dict[str, Any]) -> bool:
+    """
+    Whether the qir entry is known to be unitary, by the name of a built-in gate or by checking
+    the (concrete) gate matrix, MPO type gates and traced gate tensors are treated as non-unitary.
+    """
+    from . import gates
+
+    if d["mpo"]:
+        return False
+    name = d["name"]
+    # user supplied gates may carry any name, only the built-in gate functions are trusted
+    if name in _unitary_gate_names and d.get("gatef") is getattr(gates, name, None):
+        return True
+    gate = d["gate"]
+    try:
+        m = np.array(getattr(gate, "tensor", gate))
+    except Exception:  # pylint: disable=broad-except
+        # traced tensors in jit
+        return False
+    m = np.reshape(m, [int(np.sqrt(m.size)), -1])
+    return bool(np.allclose(m.conj().T @ m, np.eye(m.shape[0]), atol=1e-5))
+
+
+def qir_light_cone(
+    qir: List[Dict[str, Any]], sites: Sequence[int]
+) -> List[Dict[str, Any]]:
+    """
+    Light cone reduction on the quantum intermediate representation for local observables on ``sites``.
+    Working backwards from the end of the circuit, a unitary gate on qubits outside the current cone
+    cancels with its adjoint in the expectation network and is dropped,
+    otherwise the gate is kept and its qubits join the cone.
+    Gates not known to be unitary (see ``_is_unitary_entry``) are always kept.
+
+    :Example:
+
+    >>> c = tc.Circuit(3)
+    >>> c.h(0)
+    >>> c.cnot(0, 1)
+    >>> c.h(2)
+    >>> c.cnot(1, 2)
+    >>> [(d["name"], d["index"]) for d in tc.simplify.qir_light_cone(c.to_qir(), [0])]
+    [('h', (0,)), ('cnot', (0, 1))]
+
+    :param qir: The quantum intermediate representation of a circuit.
+    :type qir: List[Dict[str, Any]]
+    :param sites: The qubits where the observables are measured.
+    :type sites: Sequence[int]
+    :return: The quantum intermediate representation with only the gates in the backward light cone.
+    :rtype: List[Dict[str, Any]]
+    """
+    cone = set(sites)
+    kept = []
+    for d in reversed(qir):
+        index = d["index"]
+        if isinstance(index, int):
+            index = [index]
+        if cone.intersection(index) or not _is_unitary_entry(d):
+            kept.append(d)
+            cone.update(index)
+    return kept[::-1]
@@ -0,0 +1,376 @@
+"""
+Quantum circuit: the dense state vector simulator
+"""
+# pylint: disable=invalid-name
+
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import tensornetwork as tn
+from opt_einsum import get_symbol
+
+from . import gates
+from .cons import backend, dtypestr, npdtype
+from .circuit import Circuit
+from .quantum import QuOperator
+
+Gate = gates.Gate
+Tensor = Any
+
+
+def _apply_dense(state: Tensor, gate: Tensor, index: Sequence[int]) -> Tensor:
+    """
+    Apply the ``gate`` tensor with legs ``[out..., in...]`` on the legs ``index`` of ``state``,
+    the other legs of ``state`` (including extra legs beyond qubits) are kept in place.
+    The untouched legs between the gate legs are grouped so that the einsum involves
+    tensors of rank at most ``2*len(index)+1`` without any explicit transpose.
+    """
+    shape = list(state.shape)
+    noe = len(index)
+    dims = [shape[i] for i in index]
+    gate = backend.reshape(gate, dims * 2)
+    outs = [get_symbol(i) for i in range(noe)]
+    ins = [get_symbol(noe + i) for i in range(noe)]
+    position = {q: k for k, q in enumerate(index)}
+    grouped: List[int] = []
+    before: List[str] = []
+    after: List[str] = []
+    rest = 1
+    for i, d in enumerate(shape + [0]):
+        if i in position or i == len(shape):
+            if rest > 1:
+                symbol = get_symbol(2 * noe + len(grouped))
+                grouped.append(rest)
+                before.append(symbol)
+                after.append(symbol)
+            rest = 1
+            if i < len(shape):
+                grouped.append(d)
+                before.append(ins[position[i]])
+                after.append(outs[position[i]])
+        else:
+            rest *= d
+    t = backend.reshape(state, grouped)
+    expr = "".join(outs + ins) + "," + "".join(before) + "->" + "".join(after)
+    t = backend.einsum(expr, gate, t, optimize=False)
+    return backend.reshape(t, shape)
+
+
+def _dense_gate(gate: Any) -> Tensor:
+    if isinstance(gate, QuOperator):
+        return gate.eval_matrix()
+    if isinstance(gate, tn.Node):
+        return gate.tensor
+    return gate
+
+
+class StateVectorCircuit(Circuit):
+    """
+    ``StateVectorCircuit`` class with the same API of ``Circuit``,
+    gates are applied to the dense wavefunction eagerly instead of building a tensor network,
+    which is much faster to stage for small and medium size circuits.
+    The circuit is kept as a network of one node with the wavefunction tensor,
+    so that all methods for ``Circuit`` can be used.
+
+    .. code-block:: python
+
+        c = tc.StateVectorCircuit(3)
+        c.H(1)
+        c.CNOT(0, 1)
+        c.RX(2, theta=tc.num_to_tensor(1.))
+        c.expectation([tc.gates.z(), (2, )]) # 0.54
+
+    """
+
+    # the expectation on the dense state is cheaper than replaying the light cone
+    lightcone_ratio = 0.0
+
+    def __init__(
+        self,
+        nqubits: int,
+        inputs: Optional[Tensor] = None,
+        mps_inputs: Optional[QuOperator] = None,
+        split: Optional[Dict[str, Any]] = None,
+        deferred: Union[bool, Dict[str, Any]] = False,
+        dim: Optional[Union[int, Sequence[int]]] = None,
+    ) -> None:
+        """
+        State vector simulator.
+
+        :param nqubits: The number of qubits in the circuit.
+        :type nqubits: int
+        :param inputs: If not None, the initial state of the circuit is taken as ``inputs``
+            instead of :math:`\\vert 0\\rangle^n` qubits, defaults to None.
+        :type inputs: Optional[Tensor], optional
+        :param mps_inputs: QuVector for a MPS like initial wavefunction.
+        :type mps_inputs: Optional[QuOperator]
+        :param split: Ignored, only for API compatibility with ``Circuit``.
+        :type split: Optional[Dict[str, Any]]
+        :param deferred: Ignored, only for API compatibility with ``Circuit``.
+        :type deferred: Union[bool, Dict[str, Any]]
+        :param dim: The local dimension of the qudits, or the list of local dimensions
+            for a mixed dimension register, defaults to None (qubits).
+            The local dimensions are otherwise inferred from ``mps_inputs``.
+        :type dim: Optional[Union[int, Sequence[int]]], optional
+        """
+        self.inputs = inputs
+        self.mps_inputs = mps_inputs
+        self.split = split
+        self._nqubits = nqubits
+
+        self.circuit_param = {
+            "nqubits": nqubits,
+            "inputs": inputs,
+            "mps_inputs": mps_inputs,
+            "split": split,
+            "deferred": deferred,
+            "dim": dim,
+        }
+        if dim is not None:
+            dims = [dim for _ in range(nqubits)] if isinstance(dim, int) else list(dim)
+        elif mps_inputs is not None:
+            dims = [e.dimension for e in mps_inputs.out_edges]
+        else:
+            dims = [2 for _ in range(nqubits)]
+        assert len(dims) == nqubits
+        if any(d != 2 for d in dims):
+            self._dims = dims
+        self._start_index = 1
+        self._qir: List[Dict[str, Any]] = []
+        self._set_state(self._initial_state(inputs, mps_inputs))
+
+    def _initial_state(
+        self, inputs: Optional[Tensor] = None, mps_inputs: Optional[QuOperator] = None
+    ) -> Tensor:
+        dims = self._local_dims()
+        if inputs is not None:
+            inputs = backend.convert_to_tensor(inputs)
+            inputs = backend.cast(inputs, dtype=dtypestr)
+            inputs = backend.reshape(inputs, [-1])
+            assert inputs.shape[0] == int(np.prod(dims))
+            return backend.reshape(inputs, dims)
+        if mps_inputs is not None:
+            t = mps_inputs.eval()
+            return backend.reshape(backend.cast(t, dtypestr), dims)
+        s = np.zeros([int(np.prod(dims))], dtype=npdtype)
+        s[0] = 1.0
+        return backend.convert_to_tensor(s.reshape(dims))
+
+    def _set_state(self, state: Tensor) -> None:
+        node = Gate(state)
+        self.coloring_nodes([node])
+        self._state = state
+        self._nodes = [node]
+        self._front = list(node.edges)
+        self.state_tensor = None
+
+    def apply_general_gate(
+        self,
+        gate: Gate,
+        *index: int,
+        name: Optional[str] = None,
+        split: Optional[Dict[str, Any]] = None,
+        mpo: bool = False,
+        ir_dict: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if name is None:
+            name = ""
+        gate_dict = {
+            "gate": gate,
+            "index": index,
+            "name": name,
+            "split": split,
+            "mpo": mpo,
+        }
+        if ir_dict is not None:
+            ir_dict.update(gate_dict)
+        else:
+            ir_dict = gate_dict
+        self._qir.append(ir_dict)
+        assert len(index) == len(set(index))
+        if not mpo:
+            gate.name = name
+        self._set_state(_apply_dense(self._state, _dense_gate(gate), index))
+
+    apply = apply_general_gate
+
+    def mid_measurement(self, index: int, keep: int = 0) -> Tensor:
+        """
+        Middle measurement in z-basis on the circuit, note the wavefunction output is not normalized
+        with ``mid_measurement`` involved, one should normalize the state manually if needed.
+        This is a post-selection method as keep is provided as a prior.
+
+        :param index: The index of qubit that the Z direction postselection applied on.
+        :type index: int
+        :param keep: 0 for spin up, 1 for spin down, defaults to be 0
+            (the kept digit for qudits).
+        :type keep: int, optional
+        """
+        d = self._local_dims()[index]
+        if d > 2:
+            projector = np.zeros([d, d], dtype=npdtype)
+            projector[keep, keep] = 1.0
+        elif keep < 0.5:
+            projector = np.array([[1.0, 0.0], [0.0, 0.0]], dtype=npdtype)
+        else:
+            projector = np.array([[0.0, 0.0], [0.0, 1.0]], dtype=npdtype)
+        projector = backend.convert_to_tensor(projector)
+        self._set_state(_apply_dense(self._state, projector, [index]))
+        self._qir_complete = False
+        r = backend.convert_to_tensor(keep)
+        r = backend.cast(r, "int32")
+        return r
+
+    mid_measure = mid_measurement
+    post_select = mid_measurement
+    post_selection = mid_measurement
+
+    def general_kraus(
+        self,
+        kraus: Sequence[Gate],
+        *index: int,
+        status: Optional[float] = None,
+        name: Optional[str] = None,
+    ) -> Tensor:
+        """
+        Monte Carlo trajectory simulation of general Kraus channel.
+        The branch probabilities are evaluated from the reduced density matrix of the running
+        wavefunction on ``index``, instead of contracting the whole circuit with a hole
+        as :py:meth:`tensorcircuit.circuit.Circuit.general_kraus`,
+        so that the cost of each channel doesn't grow with the circuit depth.
+
+        :param kraus: A list of ``tn.Node`` (or Tensors) for Kraus operators.
+        :type kraus: Sequence[Gate]
+        :param index: The qubits index that Kraus channel is applied on.
+        :type index: int
+        :param status: Random tensor uniformly between 0 or 1, defaults to be None,
+            when the random number will be generated automatically
+        :type status: Optional[float], optional
+        :return: shape [] int dtype tensor indicates which Kraus operator is actually applied
+        :rtype: Tensor
+        """
+        dims = self._local_dims()
+        size = int(np.prod([dims[i] for i in index]))
+        kraus = [gates.array_to_tensor(_dense_gate(k)) for k in kraus]
+        kraus = [backend.reshape(k, [size, size]) for k in kraus]
+        rest = [i for i in range(self._nqubits) if i not in index]
+        psi = backend.transpose(self._state, list(index) + rest)
+        psi = backend.reshape(psi, [size, -1])
+        rho = psi @ backend.adjoint(psi)
+        prob = backend.stack(
+            [backend.real(backend.sum((k @ rho) * backend.conj(k))) for k in kraus]
+        )
+        if status is None:
+            status = backend.implicit_randu()[0]
+        status = backend.real(status)
+        prob = backend.cast(prob, dtype=status.dtype)  # type: ignore
+        prob_cumsum = backend.cumsum(prob)
+        l = len(kraus)
+        # rescaled by the total probability against the rounding error
+        x = status * prob_cumsum[-1]
+        r = backend.sum(
+            backend.stack([backend.sign(x - prob_cumsum[i]) for i in range(l - 1)])
+        )
+        r = backend.cast(r / 2.0 + (l - 1) / 2.0, dtype="int32")
+        weight = backend.sum(backend.cast(backend.onehot(r, l), prob.dtype) * prob)
+        g = backend.switch(r, [lambda _=k: _ for k in kraus])
+        g = g / backend.cast(backend.sqrt(weight), dtypestr)
+        self.any(*index, unitary=g, name=name)  # type: ignore
+        return r
+
+    apply_general_kraus = general_kraus
+
+    def _replay(self, state: Tensor) -> Tensor:
+        for d in self._qir:
+            index = d["index"]
+            if isinstance(index, int):
+                index = [index]
+            state = _apply_dense(state, _dense_gate(d["gate"]), index)
+        return state
+
+    def replace_inputs(self, inputs: Tensor) -> None:
+        """
+        Replace the input state with the circuit structure unchanged,
+        the gates recorded in the circuit qir are applied again on the new inputs.
+
+        :param inputs: Input wavefunction.
+        :type inputs: Tensor
+        """
+        self.inputs = inputs
+        self._qir_complete = False
+        self._set_state(self._replay(self._initial_state(inputs=inputs)))
+
+    def replace_mps_inputs(self, mps_inputs: QuOperator) -> None:
+        """
+        Replace the input state in MPS representation while keep the circuit structure unchanged,
+        the gates recorded in the circuit qir are applied again on the new inputs.
+
+        :param mps_inputs: QuVector for a MPS like initial wavefunction.
+        :type mps_inputs: QuOperator
+        """
+        self.mps_inputs = mps_inputs
+        self._qir_complete = False
+        self._set_state(self._replay(self._initial_state(mps_inputs=mps_inputs)))
+
+    def wavefunction(self, form: str = "default") -> tn.Node.tensor:
+        """
+        Compute the output wavefunction from the circuit.
+
+        :param form: The str indicating the form of the output wavefunction.
+            "default": [-1], "ket": [-1, 1], "bra": [1, -1]
+        :type form: str, optional
+        :return: Tensor with the corresponding shape.
+        :rtype: Tensor
+        """
+        if form == "default":
+            shape = [-1]
+        elif form == "ket":
+            shape = [-1, 1]
+        elif form == "bra":  # no conj here
+            shape = [1, -1]
+        return backend.reshape(self._state, shape=shape)
+
+    state = wavefunction
+
+    def matrix(self) -> Tensor:
+        """
+        Get the unitary matrix for the circuit irrespective with the circuit input state.
+
+        :return: The circuit unitary matrix
+        :rtype: Tensor
+        """
+        dims = self._local_dims()
+        eye = backend.eye(int(np.prod(dims)), dtype=dtypestr)
+        t = self._replay(backend.reshape(eye, dims * 2))
+        return backend.reshapem(t)
+
+    def get_quoperator(self) -> QuOperator:
+        """
+        Get the ``QuOperator`` representation of the circuit unitary (as a dense tensor).
+
+        :return: ``QuOperator`` object for the circuit unitary (open indices for the input state)
+        :rtype: QuOperator
+        """
+        n = self._nqubits
+        t = backend.reshape(self.matrix(), self._local_dims() * 2)
+        return QuOperator.from_tensor(t, list(range(n)), list(range(n, 2 * n)))
+
+    quoperator = get_quoperator
+    get_circuit_as_quoperator = get_quoperator
+
+    def amplitude(self, l: Any) -> Tensor:
+        r"""
+        Returns the amplitude of the circuit given the bitstring l.
+
+        :param l: The bitstring of 0 and 1s (the base 36 digits for qudits).
+        :type l: Union[str, Tensor]
+        :return: The amplitude of the circuit.
+        :rtype: tn.Node.tensor
+        """
+        if isinstance(l, str):
+            i = int(np.ravel_multi_index([int(s, 36) for s in l], self._local_dims()))
+            return backend.reshape(self._state, [-1])[i]
+        return super().amplitude(l)
+
+
+StateVectorCircuit._meta_apply()
@@ -7,7 +7,7 @@ from typing import Any
 
 from ..circuit import Circuit
 from ..cons import backend, dtypestr
-from ..quantum import QuOperator
+from ..quantum import QuOperator, PauliSumOperator
 from .. import gates as G
 
 Tensor = Any
@@ -85,7 +85,8 @@ parameterized_measurements = any_measurements
 
 def operator_expectation(c: Circuit, hamiltonian: Any) -> Tensor:
     """
-    Evaluate Hamiltonian expectation where ``hamiltonian`` can be dense matrix, sparse matrix or MPO.
+    Evaluate Hamiltonian expectation where ``hamiltonian`` can be dense matrix, sparse matrix, MPO
+    or matrix free ``PauliSumOperator``.
 
     :param c: The circuit whose output state is used to evaluate the expectation
     :type c: Circuit
@@ -96,6 +97,8 @@ def operator_expectation(c: Circuit, hamiltonian: Any) -> Tensor:
     """
     if isinstance(hamiltonian, QuOperator):
         return mpo_expectation(c, hamiltonian)
+    elif isinstance(hamiltonian, PauliSumOperator):
+        return hamiltonian.expectation(c.state())
     elif backend.is_sparse(hamiltonian):
         return sparse_expectation(c, hamiltonian)
     else:
@@ -0,0 +1,157 @@
+"""
+Batched Monte Carlo trajectory engine for noisy circuits
+"""
+# pylint: disable=invalid-name
+
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from .cons import backend, rdtypestr
+
+Tensor = Any
+
+
+class TrajectoryEngine:
+    """
+    ``TrajectoryEngine`` runs Monte Carlo trajectories of a noisy circuit in vmapped batches,
+    and aggregates the observables across all the trajectories run so far with running means and variances.
+    The trajectory function ``f(status, *args)`` takes the uniform random numbers ``status``
+    of shape ``[nchannels]`` (one for each channel) and returns the real observables (of any shape)
+    of this trajectory. :py:class:`tensorcircuit.statevector.StateVectorCircuit` is recommended to build
+    the trajectories since its ``general_kraus`` evaluates the branch probabilities from the running state
+    instead of contracting the whole circuit for each channel.
+
+    :Example:
+
+    >>> def f(status, theta):
+    ...     c = tc.StateVectorCircuit(2)
+    ...     c.h(0)
+    ...     c.rx(1, theta=theta)
+    ...     c.general_kraus(tc.channels.amplitudedampingchannel(0.2, 1.0), 0, status=status[0])
+    ...     c.cnot(0, 1)
+    ...     c.general_kraus(tc.channels.phasedampingchannel(0.1), 1, status=status[1])
+    ...     return tc.backend.real(
+    ...         tc.backend.stack([c.expectation_ps(z=[0]), c.expectation_ps(x=[1])])
+    ...     )
+    >>> engine = tc.TrajectoryEngine(f, nchannels=2, batch=256, seed=42)
+    >>> engine.run(1024, tc.num_to_tensor(0.3))
+    >>> engine.mean, engine.stderr
+    """
+
+    def __init__(
+        self,
+        f: Callable[..., Tensor],
+        nchannels: int,
+        batch: int = 128,
+        seed: Optional[int] = None,
+        jit: bool = True,
+    ) -> None:
+        """
+        :param f: The trajectory function with the random numbers as the first argument.
+        :type f: Callable[..., Tensor]
+        :param nchannels: The number of random numbers consumed by one trajectory.
+        :type nchannels: int
+        :param batch: The number of trajectories vmapped in one batch, defaults to 128
+        :type batch: int, optional
+        :param seed: The random seed, defaults to None
+        :type seed: Optional[int], optional
+        :param jit: Whether jit the vmapped trajectory function, defaults to True
+        :type jit: bool, optional
+        """
+        self.f = f
+        self.nchannels = nchannels
+        self.batch = batch
+        self.key = backend.get_random_state(seed)
+        vf = backend.vmap(f, vectorized_argnums=0)
+        if jit:
+            vf = backend.jit(vf)
+        self._vf = vf
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clear the aggregated statistics, the random state is kept.
+        """
+        self.count = 0
+        self._mean: Optional[np.ndarray] = None
+        self._m2: Optional[np.ndarray] = None
+
+    def status(self) -> Tensor:
+        """
+        Draw the random numbers for the next batch.
+
+        :return: The uniform random numbers of shape ``[batch, nchannels]``.
+        :rtype: Tensor
+        """
+        self.key, subkey = backend.random_split(self.key)
+        return backend.stateful_randu(
+            subkey, shape=[self.batch, self.nchannels], dtype=rdtypestr
+        )
+
+    def update(self, values: Tensor) -> None:
+        """
+        Merge the observables of a batch of trajectories into the running statistics.
+
+        :param values: The observables with the trajectories on the first axis.
+        :type values: Tensor
+        """
+        values = np.asarray(backend.numpy(values), dtype=np.float64)
+        nb = values.shape[0]
+        if nb == 0:
+            return
+        mean_b = np.mean(values, axis=0)
+        m2_b = np.sum((values - mean_b) ** 2, axis=0)
+        if self._mean is None or self._m2 is None:
+            self.count, self._mean, self._m2 = nb, mean_b, m2_b
+            return
+        # the parallel variant of Welford's algorithm
+        n = self.count + nb
+        delta = mean_b - self._mean
+        self._mean = self._mean + delta * nb / n
+        self._m2 = self._m2 + m2_b + delta**2 * self.count * nb / n
+        self.count = n
+
+    def run(self, ntrajectories: int, *args: Any) -> np.ndarray:
+        """
+        Run more trajectories and update the running statistics,
+        the last batch is truncated if ``ntrajectories`` is not a multiple of ``batch``.
+
+        :param ntrajectories: The number of trajectories to run.
+        :type ntrajectories: int
+        :param args: The other arguments for the trajectory function.
+        :type args: Any
+        :return: The running mean of the observables over all the trajectories run so far.
+        :rtype: np.ndarray
+        """
+        left = ntrajectories
+        while left > 0:
+            values = self._vf(self.status(), *args)
+            self.update(values[: min(left, self.batch)])
+            left -= self.batch
+        return self.mean
+
+    @property
+    def mean(self) -> np.ndarray:
+        """
+        The running mean of the observables.
+        """
+        if self._mean is None:
+            raise ValueError("no trajectory has been run")
+        return self._mean
+
+    @property
+    def variance(self) -> np.ndarray:
+        """
+        The running (unbiased) variance of the observables over trajectories.
+        """
+        if self._m2 is None:
+            raise ValueError("no trajectory has been run")
+        return self._m2 / max(self.count - 1, 1)
+
+    @property
+    def stderr(self) -> np.ndarray:
+        """
+        The standard error of the running mean.
+        """
+        return np.sqrt(self.variance / self.count)
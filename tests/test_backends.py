@@ -263,6 +263,20 @@ def test_backend_methods_2(backend):
         ),
         np.array([2, 1]),
     )
+    np.testing.assert_allclose(
+        tc.backend.bitwise_xor(
+            tc.backend.convert_to_tensor(np.array([[2**24 + 1], [6]])),
+            tc.backend.convert_to_tensor(np.array([[3, 2**24]])),
+        ),
+        np.array([[2**24 + 2, 1], [5, 2**24 + 6]]),
+    )
+    np.testing.assert_allclose(
+        tc.backend.bitwise_and(
+            tc.backend.convert_to_tensor(np.array([[2**24 + 1], [6]])),
+            tc.backend.convert_to_tensor(np.array([[3, 2**24]])),
+        ),
+        np.array([[1, 2**24], [2, 0]]),
+    )
     np.testing.assert_allclose(
         tc.backend.mod(
             tc.backend.convert_to_tensor(np.array([4, 3])),
@@ -240,6 +240,54 @@ def test_expectation():
     np.testing.assert_allclose(c.expectation((tc.gates.z(), [0])), 0, atol=1e-7)
 
 
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_expectation_ps_sum(backend):
+    n = 5
+    structures = np.random.randint(0, 4, size=[23, n])
+    weights = np.random.normal(size=[23]).astype(np.float32)
+    ops = ["i", "x", "y", "z"]
+
+    def circuit(theta):
+        c = tc.Circuit(n)
+        for i in range(n):
+            c.h(i)
+            c.rx(i, theta=theta * (i + 1))
+            c.rz(i, theta=0.3 * i)
+        for i in range(n - 1):
+            c.rzz(i, i + 1, theta=theta)
+        return c
+
+    def loop(theta, weights):
+        c = circuit(theta)
+        r = 0.0
+        for s, w in zip(structures, weights):
+            obs = [(getattr(tc.gates, ops[p])(), [j]) for j, p in enumerate(s) if p]
+            r += w * (tc.backend.real(c.expectation(*obs)) if obs else 1.0)
+        return r
+
+    def batched(theta, weights):
+        c = circuit(theta)
+        return tc.backend.real(c.expectation_ps_sum(structures, weights, chunk_size=4))
+
+    theta = tc.backend.convert_to_tensor(0.4)
+    weights = tc.backend.convert_to_tensor(weights)
+    np.testing.assert_allclose(loop(theta, weights), batched(theta, weights), atol=1e-5)
+    c = circuit(theta)
+    np.testing.assert_allclose(
+        c.expectation_ps_sum([[1, 0, 3, 0, 2]]),
+        c.expectation_ps(x=[0], z=[2], y=[4]),
+        atol=1e-5,
+    )
+    if tc.backend.name != "numpy":
+        vg = tc.backend.value_and_grad(loop, argnums=(0, 1))
+        vg_batched = tc.backend.jit(tc.backend.value_and_grad(batched, argnums=(0, 1)))
+        v0, (g0, gw0) = vg(theta, weights)
+        v1, (g1, gw1) = vg_batched(theta, weights)
+        np.testing.assert_allclose(v0, v1, atol=1e-5)
+        np.testing.assert_allclose(g0, g1, atol=1e-4)
+        np.testing.assert_allclose(gw0, gw1, atol=1e-5)
+
+
 @pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
 def test_exp1(backend):
     @partial(tc.backend.jit, jit_compile=True)
@@ -1008,6 +1056,203 @@ def test_batch_sample(backend):
     print(c.sample(batch=8, allow_state=True, status=tc.backend.get_random_state(42)))
 
 
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_batched_perfect_sampling(backend):
+    c = tc.Circuit(3)
+    c.H(0)
+    c.cnot(0, 1)
+    c.rx(2, theta=0.6)
+    status = tc.backend.convert_to_tensor(
+        np.random.uniform(size=[16, 3]).astype(np.float32)
+    )
+    confg, p = c.batched_perfect_sampling(status)
+    assert tc.backend.shape_tuple(confg) == (16, 3)
+    assert tc.backend.shape_tuple(p) == (16,)
+    for i in range(3):
+        confg0, p0 = c.perfect_sampling(status[i])
+        np.testing.assert_allclose(confg[i], confg0, atol=1e-5)
+        np.testing.assert_allclose(p[i], p0, atol=1e-5)
+    # chunked
+    confg1, p1 = c.batched_perfect_sampling(status, memory_limit=100)
+    np.testing.assert_allclose(confg, confg1, atol=1e-5)
+    np.testing.assert_allclose(p, p1, atol=1e-5)
+    if tc.backend.name != "numpy":
+        f = tc.backend.jit(c.batched_perfect_sampling)
+        confg2, p2 = f(status)
+        np.testing.assert_allclose(confg, confg2, atol=1e-5)
+        np.testing.assert_allclose(p, p2, atol=1e-5)
+    confg, p = c.sample(
+        batch=8, vectorized=True, status=tc.backend.get_random_state(42)
+    )
+    assert tc.backend.shape_tuple(confg) == (8, 3)
+    np.testing.assert_allclose(confg[:, 0], confg[:, 1], atol=1e-5)
+    confg, p = c.sample(batch=8, allow_state=True, vectorized=True)
+    assert tc.backend.shape_tuple(confg) == (8, 3)
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_incremental_perfect_sampling(backend):
+    n = 5
+    c = tc.Circuit(n)
+    for i in range(n):
+        c.rx(i, theta=0.3 * i + 0.2)
+    for i in range(n - 1):
+        c.cnot(i, i + 1)
+    c.ry(2, theta=0.7)
+    probs = np.abs(np.reshape(tc.backend.numpy(c.state()), [-1])) ** 2
+    for _ in range(4):
+        status = tc.backend.convert_to_tensor(
+            np.random.uniform(size=[n]).astype(np.float32)
+        )
+        s0, p0 = c.perfect_sampling(status, incremental=False)
+        s1, p1 = c.perfect_sampling(status, incremental=True)
+        np.testing.assert_allclose(s0, s1, atol=1e-5)
+        np.testing.assert_allclose(p0, p1, atol=1e-5)
+        i = int("".join([str(int(b)) for b in tc.backend.numpy(s1)]), 2)
+        np.testing.assert_allclose(p1, probs[i], atol=1e-5)
+        s2, _ = c.measure(3, 0, status=status[:2], incremental=True)
+        s3, _ = c.measure(3, 0, status=status[:2])
+        np.testing.assert_allclose(s2, s3, atol=1e-5)
+    f = tc.backend.jit(lambda s: c.perfect_sampling(s, incremental=True))
+    s4, p4 = f(status)
+    np.testing.assert_allclose(s4, s1, atol=1e-5)
+    np.testing.assert_allclose(p4, p1, atol=1e-5)
+    s5, p5 = c.batched_perfect_sampling(
+        tc.backend.stack([status, status]), incremental=True
+    )
+    np.testing.assert_allclose(s5[1], s1, atol=1e-5)
+    np.testing.assert_allclose(p5[1], p1, atol=1e-5)
+
+    # the default engine never builds the dense probability tensor
+    def dense(*args, **kws):
+        raise AssertionError("the dense probability tensor is built")
+
+    c._marginal_probabilities = dense
+    c.perfect_sampling(status)
+    c.sample(batch=2)
+    del c._marginal_probabilities
+
+    dc = tc.DMCircuit(3)
+    dc.h(0)
+    dc.cnot(0, 1)
+    dc.depolarizing(1, px=0.1, py=0.1, pz=0.1)
+    dc.rx(2, theta=0.4)
+    status = tc.backend.convert_to_tensor(np.array([0.3, 0.8, 0.5], dtype=np.float32))
+    s0, p0 = dc.perfect_sampling(status, incremental=False)
+    s1, p1 = dc.perfect_sampling(status, incremental=True)
+    np.testing.assert_allclose(s0, s1, atol=1e-5)
+    np.testing.assert_allclose(p0, p1, atol=1e-5)
+
+
+def test_sample_counts():
+    c = tc.Circuit(3)
+    c.H(0)
+    c.cnot(0, 1)
+    c.rx(2, theta=0.4)
+    r = c.sample_counts(1000, random_state=42)
+    assert sum(r.values()) == 1000
+    assert all(k[0] == k[1] for k in r)
+    r = c.sample_counts(1000, index=[1, 0], sparse=False)
+    assert r[1] == r[2] == 0
+    dc = tc.DMCircuit(3)
+    dc.H(0)
+    dc.cnot(0, 1)
+    dc.rx(2, theta=0.4)
+    np.testing.assert_allclose(
+        dc.sample_counts(1000, sparse=False, random_state=42),
+        c.sample_counts(1000, sparse=False, random_state=42),
+    )
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_amplitudes(backend):
+    n = 5
+    c = tc.Circuit(n)
+    for i in range(n):
+        c.rx(i, theta=0.3 * i + 0.1)
+    for i in range(n - 1):
+        c.cnot(i, i + 1)
+    c.ry(3, theta=0.5)
+    bs = np.random.randint(0, 2, size=[20, n])
+    ref = np.array([c.amplitude("".join([str(b) for b in r])) for r in bs])
+    for memory_limit in [None, 256, 64, 1]:
+        np.testing.assert_allclose(
+            c.amplitudes(bs, memory_limit=memory_limit), ref, atol=1e-5
+        )
+
+    def amps(theta, bs):
+        c = tc.Circuit(n)
+        for i in range(n):
+            c.rx(i, theta=theta * i + 0.1)
+        for i in range(n - 1):
+            c.cnot(i, i + 1)
+        c.ry(3, theta=0.5)
+        return c.amplitudes(bs, memory_limit=64)
+
+    # jittable with respect to the circuit parameters for concrete bitstrings
+    f = tc.backend.jit(lambda theta: amps(theta, bs))
+    np.testing.assert_allclose(f(tc.backend.convert_to_tensor(0.3)), ref, atol=1e-5)
+    if tc.backend.name != "numpy":
+        with pytest.raises(ValueError):
+            tc.backend.jit(amps)(
+                tc.backend.convert_to_tensor(0.3), tc.backend.convert_to_tensor(bs)
+            )
+    dc = tc.DMCircuit(3)
+    dc.h(0)
+    dc.cnot(0, 1)
+    dc.depolarizing(1, px=0.1, py=0.1, pz=0.1)
+    dc.rx(2, theta=0.4)
+    bs = np.random.randint(0, 2, size=[10, 3])
+    ref = np.array([dc.amplitude("".join([str(b) for b in r])) for r in bs])
+    for memory_limit in [None, 64]:
+        np.testing.assert_allclose(
+            dc.amplitudes(bs, memory_limit=memory_limit), ref, atol=1e-5
+        )
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_local_rdms(backend):
+    n = 5
+    c = tc.Circuit(n)
+    for j in range(2):
+        for i in range(n):
+            c.ry(i, theta=0.3 * i + j)
+            c.rz(i, theta=0.2 * i)
+        for i in range(n - 1):
+            c.cnot(i, i + 1)
+    edges = list(tc.templates.graphs.Line1D(n).edges)
+    ms = [tc.gates._x_matrix, tc.gates._y_matrix, tc.gates._z_matrix]
+    for reuse in [True, False]:
+        rhos = c.local_rdms(edges, reuse=reuse)
+        for (i, j), rho in zip(edges, rhos):
+            for p, m in zip("xyz", ms):
+                np.testing.assert_allclose(
+                    tc.backend.trace(rho @ np.kron(m, m)),
+                    c.expectation_ps(**{p: [i, j]}),
+                    atol=1e-5,
+                )
+    rho = c.local_rdms([[3, 1]])[0]
+    np.testing.assert_allclose(
+        tc.backend.trace(rho @ np.kron(ms[0], ms[2])),
+        c.expectation_ps(x=[3], z=[1]),
+        atol=1e-5,
+    )
+    dc = tc.DMCircuit(3)
+    dc.h(0)
+    dc.cnot(0, 1)
+    dc.depolarizing(1, px=0.1, py=0.1, pz=0.1)
+    dc.rx(2, theta=0.4)
+    rhos = dc.local_rdms([[1, 0], [2]])
+    np.testing.assert_allclose(
+        tc.backend.trace(rhos[0] @ np.kron(ms[0], ms[2])),
+        dc.expectation((tc.gates.x(), [1]), (tc.gates.z(), [0])),
+        atol=1e-5,
+    )
+    np.testing.assert_allclose(
+        tc.backend.trace(rhos[1] @ ms[1]), dc.expectation_ps(y=[2]), atol=1e-5
+    )
+
+
 def test_expectation_y_bug():
     c = tc.Circuit(1, inputs=1 / np.sqrt(2) * np.array([-1, 1.0j]))
     m = c.expectation_ps(y=[0])
@@ -1042,6 +1287,52 @@ def test_lightcone_expectation():
         else:
             assert l1 == 41 and l2 == 41
 
+    c = tc.Circuit(12)
+    for j in range(3):
+        for i in range(12):
+            c.ry(i, theta=0.1 * i + j)
+        for i in range(j % 2, 11, 2):
+            c.cnot(i, i + 1)
+    m0 = c.expectation_ps(z=[5], x=[6], enable_lightcone=False)
+    np.testing.assert_allclose(c.expectation_ps(z=[5], x=[6]), m0, atol=1e-5)
+    np.testing.assert_allclose(
+        c.expectation_ps(z=[5], x=[6], enable_lightcone=True), m0, atol=1e-5
+    )
+    # the cone circuit is cached per site set until a new gate is applied
+    cone = c._lightcone_circuit([(tc.gates.z(), [5]), (tc.gates.x(), [6])], True)
+    assert cone is not None and len(cone.to_qir()) < len(c.to_qir())
+    assert cone is c._lightcone_circuit(
+        [(tc.gates.x(), [6]), (tc.gates.z(), [5])], True
+    )
+    c.ry(5, theta=0.3)
+    assert cone is not c._lightcone_circuit(
+        [(tc.gates.z(), [5]), (tc.gates.x(), [6])], True
+    )
+    m0 = c.expectation_ps(z=[5], x=[6], enable_lightcone=False)
+    np.testing.assert_allclose(c.expectation_ps(z=[5], x=[6]), m0, atol=1e-5)
+    c.mid_measurement(5, keep=0)
+    m0 = c.expectation_ps(z=[6], reuse=False, enable_lightcone=False)
+    np.testing.assert_allclose(
+        c.expectation_ps(z=[6], enable_lightcone=True), m0, atol=1e-5
+    )
+
+
+def test_lightcone_reuse_contractions():
+    n = 10
+    c = tc.Circuit(n)
+    for i in range(n):
+        c.rx(i, theta=0.1 * i)
+    for i in range(n - 1):
+        c.cnot(i, i + 1)
+    with tc.cons.record_contraction() as recorder:
+        rs = [c.expectation_ps(z=[i, i + 1]) for i in range(n - 1)]
+    # one state contraction shared by all the expectations
+    assert len(recorder.records) == 1 + n - 1
+    with tc.cons.record_contraction() as recorder:
+        rs0 = [c.expectation_ps(z=[i, i + 1], reuse=False) for i in range(n - 1)]
+    assert len(recorder.records) == n - 1
+    np.testing.assert_allclose(rs, rs0, atol=1e-5)
+
 
 @pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
 def test_circuit_inverse(backend):
@@ -1082,3 +1373,167 @@ def test_draw_cond_measure():
     c.cnot(0, 1)
     print("")
     print(c.draw())
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_deferred_construction(backend):
+    def build(n, theta, **kws):
+        c = tc.Circuit(n, **kws)
+        for i in range(n):
+            c.h(i)
+        for i in range(n - 1):
+            c.rzz(i, i + 1, theta=theta * i)
+        c.multicontrol(0, 3, ctrl=[1], unitary=tc.gates._x_matrix)
+        c.rx(2, theta=theta)
+        return c
+
+    ops = [(tc.gates.z(), [1]), (tc.gates.x(), [3])]
+    c0 = build(5, 0.3)
+    for deferred in [True, {"fuse": True}]:
+        c = build(5, 0.3, deferred=deferred)
+        # state and expectation are contracted from the qir directly
+        np.testing.assert_allclose(c.state(), c0.state(), atol=1e-5)
+        np.testing.assert_allclose(
+            c.expectation(*ops, reuse=False), c0.expectation(*ops), atol=1e-5
+        )
+        assert "_nodes" not in c.__dict__
+        np.testing.assert_allclose(c.expectation(*ops), c0.expectation(*ops), atol=1e-5)
+        np.testing.assert_allclose(
+            c.amplitude("01100"), c0.amplitude("01100"), atol=1e-5
+        )
+        assert "_nodes" in c.__dict__
+        # gates after the materialization are deferred again
+        c1 = build(5, 0.3)
+        for c2 in [c, c1]:
+            c2.x(0)
+            c2.mid_measurement(2, keep=0)
+        assert "_nodes" in c.__dict__
+        c.rx(3, theta=0.2)
+        c1.rx(3, theta=0.2)
+        assert "_nodes" not in c.__dict__
+        np.testing.assert_allclose(
+            c.expectation_ps(x=[3], reuse=False),
+            c1.expectation_ps(x=[3], reuse=False),
+            atol=1e-5,
+        )
+        np.testing.assert_allclose(c.state(), c1.state(), atol=1e-5)
+
+    @tc.backend.jit
+    def f(theta):
+        c = build(5, theta, deferred=True)
+        return c.expectation(*ops, reuse=False)
+
+    np.testing.assert_allclose(
+        f(tc.backend.convert_to_tensor(0.3)), c0.expectation(*ops), atol=1e-5
+    )
+
+    dc0 = tc.DMCircuit2(3)
+    dc = tc.DMCircuit2(3, deferred=True)
+    for c in [dc0, dc]:
+        c.h(0)
+        c.cnot(0, 1)
+        c.amplitudedamping(1, gamma=0.2, p=1.0)
+        c.rx(2, theta=0.4)
+        c.cz(1, 2)
+    assert "_nodes" not in dc.__dict__
+    np.testing.assert_allclose(dc.state(), dc0.state(), atol=1e-5)
+    np.testing.assert_allclose(
+        dc.expectation_ps(x=[2], z=[1]), dc0.expectation_ps(x=[2], z=[1]), atol=1e-5
+    )
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_qudit_circuit(backend):
+    dims = [3, 2, 4]
+    np.random.seed(42)
+    us = []
+    for d in [6, 4, 8]:
+        u, _ = np.linalg.qr(
+            np.random.normal(size=[d, d]) + 1j * np.random.normal(size=[d, d])
+        )
+        us.append(u.astype(np.complex64))
+    ref = np.eye(24)[0]
+    ref = np.kron(us[0], np.eye(4)) @ ref
+    ref = np.kron(np.eye(6), us[1]) @ ref
+    ref = np.kron(np.eye(3), us[2]) @ ref
+
+    def build(cls, **kws):
+        c = cls(3, **kws)
+        c.any(0, 1, unitary=us[0])
+        c.any(2, unitary=us[1])
+        c.any(1, 2, unitary=us[2])
+        return c
+
+    c = build(tc.Circuit, dim=dims)
+    for c1 in [
+        c,
+        build(tc.StateVectorCircuit, dim=dims),
+        build(tc.Circuit, dim=dims, deferred=True),
+    ]:
+        np.testing.assert_allclose(c1.state(), ref, atol=1e-5)
+        np.testing.assert_allclose(c1.amplitude("213"), ref[23], atol=1e-5)
+    # the local dimensions are inferred from the mps inputs
+    c1 = tc.Circuit(3, mps_inputs=c.quvector())
+    assert c1._dims == dims
+    np.testing.assert_allclose(c1.state(), ref, atol=1e-5)
+    np.testing.assert_allclose(c.matrix()[:, 0], ref, atol=1e-5)
+
+    bitstrings = np.array([[2, 1, 3], [0, 0, 0], [1, 1, 2]])
+    amps = ref[np.ravel_multi_index(bitstrings.T, dims)]
+    np.testing.assert_allclose(
+        c.amplitude(tc.backend.convert_to_tensor(bitstrings[0])), amps[0], atol=1e-5
+    )
+    np.testing.assert_allclose(c.amplitudes(bitstrings), amps, atol=1e-5)
+    np.testing.assert_allclose(
+        c.amplitudes(bitstrings, memory_limit=40), amps, atol=1e-5
+    )
+
+    probs = np.abs(ref) ** 2
+    z, p = c.measure(0, 1, 2, with_prob=True, status=np.array([0.3, 0.6, 0.9]))
+    np.testing.assert_allclose(
+        p, probs[np.ravel_multi_index(np.array(z, dtype=np.int64), dims)], atol=1e-5
+    )
+    z, p = c.sample(batch=4, allow_state=True, vectorized=True)
+    np.testing.assert_allclose(
+        p, probs[np.ravel_multi_index(np.array(z, dtype=np.int64).T, dims)], atol=1e-5
+    )
+    counts = c.sample_counts(20000, index=[2], sparse=False, random_state=42)
+    np.testing.assert_allclose(
+        counts / 20000, np.sum(probs.reshape(dims), axis=(0, 1)), atol=0.02
+    )
+    counts = c.sample_counts(100, random_state=42)
+    assert sum(counts.values()) == 100 and all(len(k) == 3 for k in counts)
+
+    rho = np.outer(ref, ref.conj()).reshape(dims * 2)
+    np.testing.assert_allclose(
+        c.local_rdms([[2, 0]])[0],
+        np.einsum("abcdbf->cafd", rho).reshape([12, 12]),
+        atol=1e-5,
+    )
+    op = np.kron(np.kron(tc.gates.clock_matrix(3), tc.gates._x_matrix), np.eye(4))
+    np.testing.assert_allclose(
+        c.expectation_ps(z=[0], x=[1]), ref.conj() @ op @ ref, atol=1e-5
+    )
+    # matrix operators are reshaped with the local dimensions of their sites
+    m0, m2 = np.diag([1.0, 2.0, 3.0]), np.diag([1.0, -1.0, 2.0, 0.5])
+    op = np.kron(np.kron(m0, np.eye(2)), m2)
+    for c1, reuse in [
+        (c, True),
+        (c, False),
+        (build(tc.Circuit, dim=dims, deferred=True), False),
+    ]:
+        np.testing.assert_allclose(
+            c1.expectation((m0, [0]), (m2, [2]), reuse=reuse),
+            ref.conj() @ op @ ref,
+            atol=1e-5,
+        )
+        np.testing.assert_allclose(
+            c1.expectation((np.kron(m0, np.eye(2)), [0, 1]), reuse=reuse),
+            ref.conj() @ np.kron(m0, np.eye(8)) @ ref,
+            atol=1e-5,
+        )
+    c1 = tc.Circuit(2, dim=3)
+    c1.any(0, unitary=tc.gates.shift_matrix(3))
+    np.testing.assert_allclose(
+        c1.expectation((np.diag([1.0, 2.0, 3.0]), [0])), 2.0, atol=1e-5
+    )
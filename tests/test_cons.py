@@ -0,0 +1,386 @@
+import json
+import os
+import sys
+from functools import partial
+
+thisfile = os.path.abspath(__file__)
+modulepath = os.path.dirname(os.path.dirname(thisfile))
+
+sys.path.insert(0, modulepath)
+import numpy as np
+import opt_einsum as oem
+import pytest
+import tensornetwork as tn
+from pytest_lazyfixture import lazy_fixture as lf
+import tensorcircuit as tc
+
+
+def _example_circuit(n=6, nlayers=2):
+    c = tc.Circuit(n)
+    for i in range(n):
+        c.h(i)
+    for j in range(nlayers):
+        for i in range(n - 1):
+            c.cnot(i, i + 1)
+        for i in range(n):
+            c.rx(i, theta=0.1 * (i + j))
+    return c
+
+
+def test_path_cache(tmp_path):
+    calls = []
+
+    def counting_greedy(input_sets, output_set, size_dict, **kws):
+        calls.append(1)
+        return oem.paths.greedy(input_sets, output_set, size_dict, **kws)
+
+    cache_dir = str(tmp_path / "paths")
+    try:
+        tc.cons.set_path_cache(cache_dir=cache_dir)
+        with tc.runtime_contractor("custom", optimizer=counting_greedy):
+            s1 = _example_circuit().state()
+            ncalls = len(calls)
+            s2 = _example_circuit().state()
+            assert len(calls) == ncalls
+            tc.cons.clear_path_cache()
+            # in memory cache is cleared, but the disk cache is still valid
+            s3 = _example_circuit().state()
+            assert len(calls) == ncalls
+            tc.cons.clear_path_cache(disk=True)
+            s4 = _example_circuit().state()
+            assert len(calls) == 2 * ncalls
+        assert len(os.listdir(cache_dir)) > 0
+    finally:
+        tc.cons.set_path_cache(enabled=False)
+        tc.cons.clear_path_cache()
+    np.testing.assert_allclose(s1, s2, atol=1e-6)
+    np.testing.assert_allclose(s1, s3, atol=1e-6)
+    np.testing.assert_allclose(s1, s4, atol=1e-6)
+
+
+def test_path_cache_optimizer_signature():
+    sig = tc.cons._algorithm_signature
+    o1 = oem.RandomGreedy(max_repeats=8, minimize="size")
+    o2 = oem.RandomGreedy(max_repeats=8, minimize="flops")
+    o3 = oem.RandomGreedy(max_repeats=8, minimize="size")
+    assert sig(o1) != sig(o2)
+    assert sig(o1) == sig(o3)
+    assert sig(partial(o1, memory_limit=None)) != sig(partial(o2, memory_limit=None))
+    # runtime states of the optimizer don't change the signature
+    s1 = sig(o1)
+    o1([{0, 1}, {1, 2}, {2, 3}], {0, 3}, {0: 2, 1: 2, 2: 2, 3: 2})
+    assert sig(o1) == s1
+    o2.cache_key = "mine"
+    assert sig(o2) == "cache_key.mine"
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_sliced_contraction(backend):
+    c = _example_circuit(n=8, nlayers=3)
+    s0 = c.state()
+    for executor in [None, "thread"]:
+        with tc.runtime_contractor(
+            "greedy",
+            preprocessing=True,
+            slicing_memory_limit=2**6 * 8,
+            slicing_executor=executor,
+        ):
+            s1 = _example_circuit(n=8, nlayers=3).state()
+            e1 = _example_circuit(n=8, nlayers=3).expectation_ps(z=[1], x=[3])
+        np.testing.assert_allclose(s0, s1, atol=1e-5)
+        np.testing.assert_allclose(c.expectation_ps(z=[1], x=[3]), e1, atol=1e-5)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    class CountingExecutor(ThreadPoolExecutor):
+        # record the max number of slices submitted but not collected yet
+        peak = 0
+
+        def submit(self, *args, **kws):
+            future = super().submit(*args, **kws)
+            self.pending = getattr(self, "pending", set()) | {future}
+            self.peak = max(self.peak, len(self.pending))
+            result = future.result
+
+            def collect(*a, **k):
+                self.pending.discard(future)
+                return result(*a, **k)
+
+            future.result = collect
+            return future
+
+    executor = CountingExecutor(max_workers=2)
+    with tc.runtime_contractor(
+        "greedy", slicing_memory_limit=2**3 * 8, slicing_executor=executor
+    ):
+        e1 = _example_circuit(n=5, nlayers=2).expectation_ps(z=[1])
+    executor.shutdown()
+    e0 = _example_circuit(n=5, nlayers=2).expectation_ps(z=[1])
+    np.testing.assert_allclose(e0, e1, atol=1e-5)
+    assert 0 < executor.peak <= 2
+
+    @tc.backend.jit
+    def f(theta):
+        with tc.runtime_contractor("greedy", slicing_memory_limit=2**5 * 8):
+            c = tc.Circuit(6)
+            for i in range(6):
+                c.rx(i, theta=theta)
+            for i in range(5):
+                c.cnot(i, i + 1)
+            return c.expectation_ps(z=[5])
+
+    c = tc.Circuit(6)
+    for i in range(6):
+        c.rx(i, theta=0.3)
+    for i in range(5):
+        c.cnot(i, i + 1)
+    np.testing.assert_allclose(
+        f(tc.backend.convert_to_tensor(0.3)), c.expectation_ps(z=[5]), atol=1e-5
+    )
+
+
+def test_sliced_contraction_process_pool():
+    c = _example_circuit(n=6, nlayers=2)
+    s0 = c.state()
+    with tc.runtime_contractor(
+        "greedy", slicing_memory_limit=2**4 * 8, slicing_executor="process"
+    ):
+        s1 = _example_circuit(n=6, nlayers=2).state()
+    np.testing.assert_allclose(s0, s1, atol=1e-5)
+
+
+def test_estimate_cost():
+    c = _example_circuit(n=8, nlayers=2)
+    r = c.estimate_cost()
+    assert r["max_intermediate_bytes"] == 2**8 * np.dtype(tc.dtypestr).itemsize
+    assert r["width"] == 8
+    assert r["flops"] > 0 and r["write"] >= 2**8
+    r0 = tc.cons.estimate(c._nodes, c._front)
+    assert r0["flops"] == r["flops"]
+    re = c.estimate_cost((tc.gates.z(), [1]), (tc.gates.x(), [3]), kind="expectation")
+    assert re["width"] < 8
+    ra = c.estimate_cost(kind="amplitude")
+    assert ra["flops"] < r["flops"]
+    rs = c.estimate_cost(kind="sample", incremental=True)
+    assert rs["flops"] == r["flops"]
+    # the dense probability buffer of the incremental engine is counted
+    assert rs["max_intermediate_bytes"] == r["max_intermediate_bytes"] + 2 * 2**8 * (
+        np.dtype(tc.rdtypestr).itemsize
+    )
+    rs = c.estimate_cost(kind="sample")
+    assert rs["flops"] > re["flops"]
+    rr = c.estimate_cost((tc.gates.z(), [1]), kind="expectation", reuse=True)
+    assert rr["flops"] > r["flops"]
+    dc = tc.DMCircuit(4)
+    dc.h(0)
+    dc.cnot(0, 1)
+    dc.depolarizing(1, px=0.1, py=0.1, pz=0.1)
+    assert dc.estimate_cost()["width"] == 8
+    assert dc.estimate_cost((tc.gates.z(), [1]), kind="expectation")["flops"] > 0
+    rs = dc.estimate_cost(kind="sample", incremental=True)
+    # only the diagonal of the density matrix is contracted for incremental sampling
+    assert rs["flops"] > 0 and rs["width"] < 8
+    with pytest.raises(ValueError):
+        c.estimate_cost(kind="unknown")
+
+
+def test_estimate_cost_preprocessing():
+    sizes = []
+
+    def counting_greedy(input_sets, output_set, size_dict, **kws):
+        sizes.append(len(input_sets))
+        return oem.paths.greedy(input_sets, output_set, size_dict, **kws)
+
+    c = _example_circuit(n=6, nlayers=3)
+    reports = {}
+    for level in [False, True, 2]:
+        with tc.runtime_contractor(
+            "custom", optimizer=counting_greedy, preprocessing=level
+        ):
+            nodes, front = c._copy()
+            del sizes[:]
+            tc.cons.contractor(nodes, output_edge_order=front)
+            report = c.estimate_cost()
+            # the estimation sees the same network as the real contraction
+            assert sizes[0] == sizes[1]
+        # the path includes the preprocessing merges on the original network
+        assert len(report["path"]) == len(c._nodes) - 1
+        reports[level] = report
+    assert reports[True]["flops"] != reports[False]["flops"]
+
+
+def test_base_executor_trace_and_debug():
+    a = tn.Node(np.arange(8.0).reshape([2, 2, 2]))
+    b = tn.Node(np.ones([2, 3]))
+    c = tn.Node(np.ones([3]))
+    a[0] ^ a[1]
+    a[2] ^ b[0]
+    b[1] ^ c[0]
+    r = tc.cons._base([a, b, c], oem.paths.greedy)
+    np.testing.assert_allclose(r.tensor, 3 * (0 + 6 + 1 + 7), atol=1e-5)
+    a = tn.Node(np.ones([2, 4]))
+    b = tn.Node(np.ones([4, 3]))
+    a[1] ^ b[0]
+    r = tc.cons._base([a, b], oem.paths.greedy, [a[0], b[1]], debug_level=2)
+    assert tuple(r.tensor.shape) == (2, 3)
+    np.testing.assert_allclose(r.tensor, 0.0)
+
+
+def test_linear_to_ssa():
+    rng = np.random.default_rng(42)
+    for n in [1, 2, 5, 40]:
+        path, m = [], n
+        while m > 1:
+            path.append(tuple(rng.choice(m, size=2, replace=False).tolist()))
+            m -= 1
+        ssa_path, remaining = tc.cons._linear_to_ssa(path, n)
+        assert ssa_path == oem.paths.linear_to_ssa(path)
+        assert remaining == ([2 * n - 2] if n > 1 else [0])
+    # partial path with the tensors left in the linear order
+    ssa_path, remaining = tc.cons._linear_to_ssa([(0, 3), (1,), (0, 1)], 5)
+    assert ssa_path == [(0, 3), (1, 2)]
+    assert remaining == [4, 5, 6]
+
+
+def test_preprocessing_levels():
+    c = _example_circuit(n=6, nlayers=3)
+    c.rzz(0, 1, theta=0.2)
+    c.rzz(0, 1, theta=0.3)
+    s0 = c.state()
+    nodes, _ = c._copy()
+    nodes1, _ = tc.cons._merge_single_gates(nodes)
+    assert all([len(n.tensor.shape) > 2 for n in nodes1])
+    nodes, _ = c._copy()
+    nodes2, _ = tc.cons._preprocess(nodes, 2)
+    assert len(nodes2) < len(nodes1)
+    for level in [True, 2]:
+        with tc.runtime_contractor("greedy", preprocessing=level):
+            s1 = c.state()
+            e1 = c.expectation_ps(z=[1], x=[3])
+        np.testing.assert_allclose(s0, s1, atol=1e-5)
+        np.testing.assert_allclose(c.expectation_ps(z=[1], x=[3]), e1, atol=1e-5)
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_preprocessing_planned(backend):
+    sizes = []
+
+    def counting_greedy(input_sets, output_set, size_dict, **kws):
+        sizes.append(len(input_sets))
+        return oem.paths.greedy(input_sets, output_set, size_dict, **kws)
+
+    c0 = _example_circuit(n=6, nlayers=3)
+    s0 = c0.state()
+    e0 = c0.expectation_ps(z=[1], x=[3])
+    seen = {}
+    for level in [False, True, 2]:
+        with tc.runtime_contractor(
+            "custom", optimizer=counting_greedy, preprocessing=level
+        ):
+            c = _example_circuit(n=6, nlayers=3)
+            del sizes[:]
+            s1 = c.state()
+            e1 = c.expectation_ps(z=[1], x=[3], reuse=False)
+            seen[level] = list(sizes)
+        np.testing.assert_allclose(s0, s1, atol=1e-5)
+        np.testing.assert_allclose(e0, e1, atol=1e-5)
+    # the path finder only sees the network after the preprocessing
+    assert seen[True][0] < seen[False][0]
+    assert seen[True][1] < seen[False][1]
+    assert seen[2][1] <= seen[True][1]
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_expectation_plan_cache(backend):
+    calls = []
+
+    def counting_greedy(input_sets, output_set, size_dict, **kws):
+        calls.append(1)
+        return oem.paths.greedy(input_sets, output_set, size_dict, **kws)
+
+    with tc.runtime_contractor("custom", optimizer=counting_greedy):
+        for reuse in [True, False]:
+            c = _example_circuit(n=6, nlayers=2)
+            c.expectation((tc.gates.z(), [1]), (tc.gates.z(), [2]), reuse=reuse)
+            s = c.state()
+            ncalls = len(calls)
+            for op in [tc.gates.x, tc.gates.y, tc.gates.z]:
+                e = c.expectation((op(), [1]), (op(), [2]), reuse=reuse)
+                e0 = tc.expectation((op(), [1]), (op(), [2]), ket=s)
+                np.testing.assert_allclose(e, e0, atol=1e-5)
+            assert len(calls) == ncalls
+            # new sites or new gates trigger a new plan
+            c.expectation((tc.gates.z(), [3]), reuse=reuse)
+            assert len(calls) > ncalls
+            ncalls = len(calls)
+            c.cnot(0, 5)
+            e = c.expectation((tc.gates.z(), [1]), (tc.gates.z(), [2]), reuse=reuse)
+            assert len(calls) > ncalls
+            e0 = tc.expectation((tc.gates.z(), [1]), (tc.gates.z(), [2]), ket=c.state())
+            np.testing.assert_allclose(e, e0, atol=1e-5)
+
+    @tc.backend.jit
+    def f(theta):
+        c = _example_circuit(n=6, nlayers=2)
+        c.rx(3, theta=theta)
+        e1 = c.expectation_ps(x=[1, 2])
+        e2 = c.expectation_ps(z=[1, 2])
+        return tc.backend.real(e1 + e2)
+
+    c = _example_circuit(n=6, nlayers=2)
+    c.rx(3, theta=0.5)
+    np.testing.assert_allclose(
+        f(tc.backend.convert_to_tensor(0.5)),
+        tc.backend.real(c.expectation_ps(x=[1, 2]) + c.expectation_ps(z=[1, 2])),
+        atol=1e-5,
+    )
+
+
+def test_expectation_plan_key():
+    def expectation(c, site):
+        return c.expectation((tc.gates.z(), [site]), enable_lightcone=False)
+
+    c = _example_circuit(n=6, nlayers=2)
+    expectation(c, 1)
+    assert len(c._expectation_plans) == 1
+    # the plan is keyed by the network structure and kept as the circuit grows
+    c.cnot(0, 5)
+    e = expectation(c, 1)
+    assert len(c._expectation_plans) == 1
+    np.testing.assert_allclose(
+        e, tc.expectation((tc.gates.z(), [1]), ket=c.state()), atol=1e-5
+    )
+    expectation(c, 2)
+    assert len(c._expectation_plans) == 2
+    with tc.runtime_contractor("greedy", preprocessing=2):
+        expectation(c, 2)
+    assert len(c._expectation_plans) == 3
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_record_contraction(backend, tmp_path):
+    c = _example_circuit(n=6, nlayers=2)
+    with tc.cons.record_contraction() as recorder:
+        s = c.state()
+        c.expectation_ps(z=[1], reuse=False)
+    assert len(recorder.records) == 2
+    r = recorder.records[0]
+    assert r["path_time"] >= 0 and r["contract_time"] >= 0
+    assert r["steps"][-1]["shape"] == [2] * 6
+    assert r["peak_live_bytes"] >= 2**6 * np.dtype(tc.dtypestr).itemsize
+    assert r["flops"] == sum([step["flops"] for step in r["steps"]])
+    rows = recorder.to_list()
+    assert len(rows) == sum([len(r["steps"]) for r in recorder.records])
+    assert rows[0]["contraction"] == 0 and "contraction_flops" in rows[0]
+    path = str(tmp_path / "records.json")
+    recorder.to_json(path)
+    with open(path) as f:
+        assert len(json.load(f)) == 2
+    with tc.runtime_contractor("greedy", slicing_memory_limit=2**4 * 8):
+        with tc.cons.record_contraction() as recorder:
+            c.expectation_ps(z=[1], reuse=False)
+    assert recorder.records[0]["sliced"] is True
+    # the hook is removed after the context
+    c.expectation_ps(z=[2], reuse=False)
+    assert len(recorder.records) == 1
+    assert not tc.cons._contraction_hooks
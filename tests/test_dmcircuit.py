@@ -468,3 +468,54 @@ def test_prepend_dmcircuit(backend):
         assert n["name"] == n0
     s = c3.wavefunction()
     np.testing.assert_allclose(s[0], s[1], atol=1e-5)
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_dense_dmcircuit(backend):
+    def build(cls, theta, **kws):
+        c = cls(3, **kws)
+        c.h(0)
+        c.rx(1, theta=theta)
+        c.cnot(0, 2)
+        c.depolarizing(2, px=0.1, py=0.05, pz=0.02)
+        c.rzz(1, 2, theta=theta)
+        c.amplitudedamping(0, gamma=0.3, p=1.0)
+        c.exp1(0, 1, theta=0.2, unitary=tc.gates._xx_matrix)
+        c.general_kraus(
+            [
+                np.kron(np.eye(2), np.eye(2)) * np.sqrt(0.8),
+                np.sqrt(0.2) * tc.gates._zz_matrix,
+            ],
+            1,
+            2,
+        )
+        return c
+
+    inputs = np.ones([8]) / np.sqrt(8)
+    for kws in [{}, {"inputs": inputs}]:
+        c = build(tc.DMCircuit2, 0.4, **kws)
+        d = build(tc.DenseDMCircuit, 0.4, **kws)
+        np.testing.assert_allclose(c.state(), d.state(), atol=1e-5)
+        np.testing.assert_allclose(
+            c.expectation_ps(x=[0], z=[2]), d.expectation_ps(x=[0], z=[2]), atol=1e-5
+        )
+    np.testing.assert_allclose(d.amplitude("010"), c.amplitude("010"), atol=1e-5)
+    d0 = build(tc.DenseDMCircuit, 0.4)
+    d0.replace_inputs(inputs)
+    np.testing.assert_allclose(d0.state(), d.state(), atol=1e-5)
+
+    def f(theta):
+        d = build(tc.DenseDMCircuit, theta)
+        return tc.backend.real(d.expectation_ps(z=[1]))
+
+    def g(theta):
+        c = build(tc.DMCircuit2, theta)
+        return tc.backend.real(c.expectation_ps(z=[1]))
+
+    theta = tc.backend.convert_to_tensor(0.4)
+    if tc.backend.name != "numpy":
+        vf = tc.backend.jit(tc.backend.value_and_grad(f))
+        v, gr = vf(theta)
+        v0, gr0 = tc.backend.value_and_grad(g)(theta)
+        np.testing.assert_allclose(v, v0, atol=1e-5)
+        np.testing.assert_allclose(gr, gr0, atol=1e-5)
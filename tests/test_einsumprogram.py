@@ -0,0 +1,117 @@
+import os
+import sys
+
+thisfile = os.path.abspath(__file__)
+modulepath = os.path.dirname(os.path.dirname(thisfile))
+
+sys.path.insert(0, modulepath)
+import numpy as np
+import pytest
+from pytest_lazyfixture import lazy_fixture as lf
+import tensorcircuit as tc
+from tensorcircuit import einsumprogram as ep
+
+
+def _circuit(n, theta):
+    c = tc.Circuit(n)
+    for i in range(n):
+        c.h(i)
+    for i in range(n - 1):
+        c.rzz(i, i + 1, theta=0.3 * i)
+    c.rx(2, theta=theta)
+    c.multicontrol(0, 3, ctrl=[1], unitary=tc.gates._x_matrix)
+    c.exp1(1, 4, theta=0.2, unitary=tc.gates._zz_matrix)
+    return c
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_compile_circuit(backend):
+    c = _circuit(5, 0.7)
+    ops = [(tc.gates.z(), [1]), (tc.gates.x(), [3])]
+    p = ep.compile_circuit(c, *ops, kind="expectation")
+    np.testing.assert_allclose(p.run(p.bind(c, *ops)), c.expectation(*ops), atol=1e-5)
+    np.testing.assert_allclose(
+        tc.backend.reshape(ep.run_circuit(c), [-1]), c.state(), atol=1e-5
+    )
+    # the program is cached by the circuit structure
+    c2 = _circuit(5, 1.1)
+    assert ep.compile_circuit(c2, *ops, kind="expectation") is p
+    # rx is the 10th qir entry, its ket and bra copies
+    assert len(p.param_slots[9]) == 2
+
+    @tc.backend.jit
+    def f(theta):
+        return p.run(p.bind(c, *ops, params={9: {"theta": theta}}))
+
+    np.testing.assert_allclose(
+        f(tc.backend.convert_to_tensor(1.1)), c2.expectation(*ops), atol=1e-5
+    )
+
+    ci = tc.Circuit(3, inputs=np.ones([8]) / np.sqrt(8))
+    ci.cnot(0, 2)
+    ci.ry(1, theta=0.2)
+    np.testing.assert_allclose(
+        tc.backend.reshape(ep.run_circuit(ci), [-1]), ci.state(), atol=1e-5
+    )
+
+
+def test_program_from_nodes():
+    c = _circuit(5, 0.7)
+    nodes = c.expectation_before((tc.gates.z(), [1]), reuse=False)
+    p = ep.EinsumProgram.from_nodes(nodes)
+    np.testing.assert_allclose(p.run(), c.expectation((tc.gates.z(), [1])), atol=1e-5)
+    dc = tc.DMCircuit(3)
+    dc.h(0)
+    dc.cnot(0, 1)
+    dc.amplitudedamping(1, gamma=0.2, p=1.0)
+    nodes, front = dc._copy()
+    p = ep.EinsumProgram.from_nodes(nodes, front)
+    np.testing.assert_allclose(
+        tc.backend.reshape(p.run(), [8, 8]), dc.state(), atol=1e-5
+    )
+    with pytest.raises(NotImplementedError):
+        ep.compile_circuit(dc)
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_network_template(backend):
+    c = _circuit(5, 0.7)
+    ops = [(tc.gates.z(), [1]), (tc.gates.x(), [3])]
+    t = c.network_template()
+    assert c.network_template() is t
+    r = c.expectation(*ops)
+    np.testing.assert_allclose(t.expectation(*ops), r, atol=1e-5)
+    np.testing.assert_allclose(
+        c.expectation(*ops, reuse=False, enable_lightcone=False), r, atol=1e-5
+    )
+    np.testing.assert_allclose(
+        tc.backend.reshape(t.state(), [-1]), c.state(), atol=1e-5
+    )
+    # the circuit nodes and the operators are untouched
+    z = tc.gates.z()
+    t.expectation((z, [0]))
+    assert all([e.is_dangling() for e in z.edges])
+    assert all([e.is_dangling() for e in c._front])
+    # the template is a snapshot of the circuit
+    c.x(1)
+    assert not t.matches(c)
+    np.testing.assert_allclose(t.expectation(*ops), r, atol=1e-5)
+    np.testing.assert_allclose(c.network_template().expectation(*ops), -r, atol=1e-5)
+    with pytest.raises(ValueError):
+        t.expectation((tc.gates.z(), [1]), (tc.gates.x(), [1]))
+    with tc.runtime_contractor("plain"):
+        np.testing.assert_allclose(t.expectation(*ops), r, atol=1e-5)
+
+    dc = tc.DMCircuit(3)
+    dc.h(0)
+    dc.cnot(0, 1)
+    dc.amplitudedamping(1, gamma=0.2, p=1.0)
+    t = dc.network_template()
+    np.testing.assert_allclose(
+        tc.backend.reshape(t.state(), [8, 8]), dc.state(), atol=1e-5
+    )
+    np.testing.assert_allclose(
+        t.expectation((tc.gates.z(), [1])),
+        dc.expectation((tc.gates.z(), [1])),
+        atol=1e-5,
+    )
@@ -0,0 +1,103 @@
+import os
+import sys
+
+thisfile = os.path.abspath(__file__)
+modulepath = os.path.dirname(os.path.dirname(thisfile))
+
+sys.path.insert(0, modulepath)
+import numpy as np
+import pytest
+from pytest_lazyfixture import lazy_fixture as lf
+import tensorcircuit as tc
+
+
+def _noisy(c, theta):
+    # the reference circuit with all the channels of the noise model applied explicitly
+    c.h(0)
+    c.depolarizing(0, px=0.02, py=0.01, pz=0.03)
+    c.amplitudedamping(0, gamma=0.1, p=1.0)
+    c.h(1)
+    c.depolarizing(1, px=0.02, py=0.01, pz=0.03)
+    c.rx(2, theta=theta)
+    c.cnot(0, 2)
+    c.depolarizing(0, px=0.02, py=0.01, pz=0.03)
+    c.amplitudedamping(0, gamma=0.1, p=1.0)
+    c.depolarizing(2, px=0.02, py=0.01, pz=0.03)
+    c.rx(0, theta=theta)
+    c.amplitudedamping(0, gamma=0.1, p=1.0)
+    c.phasedamping(0, gamma=0.2)
+    return c
+
+
+def _model(c, theta):
+    c.h(0)
+    c.h(1)
+    c.rx(2, theta=theta)
+    c.cnot(0, 2)
+    c.rx(0, theta=theta)
+    c.phasedamping(0, gamma=0.2)
+    return c
+
+
+def _noise_model():
+    nm = tc.NoiseModel()
+    nm.add_channel("depolarizing", gates=["h", "cnot"], px=0.02, py=0.01, pz=0.03)
+    nm.add_channel("amplitudedamping", qubits=[0], gamma=0.1, p=1.0)
+    return nm
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_noise_model(backend):
+    nm = _noise_model()
+    c0 = _noisy(tc.DMCircuit2(3), 0.3)
+    c = _model(tc.DMCircuit2(3, noise_model=nm), 0.3)
+    # each noisy gate and the following channels on the same qubits are one superoperator node,
+    # the noiseless rx(2) is a gate and its conjugate as usual
+    assert len(c._nodes) == 6 + 4 + 2
+    assert len(c0._nodes) == 21
+    for c1 in [
+        c,
+        _model(tc.DMCircuit2(3, noise_model=nm, deferred=True), 0.3),
+        _model(tc.DenseDMCircuit(3, noise_model=nm), 0.3),
+    ]:
+        np.testing.assert_allclose(c1.state(), c0.state(), atol=1e-5)
+    # the gates are not fused so that the channels are still matched gate by gate
+    c1 = _model(tc.DMCircuit2(3, noise_model=nm, deferred={"fuse": True}), 0.3)
+    np.testing.assert_allclose(c1.state(), c0.state(), atol=1e-5)
+    c2 = _model(tc.DMCircuit2(3, noise_model=nm, deferred=True), 0.3)
+    assert len(c1._nodes) == len(c2._nodes)
+    # the compositions are cached for the gates and parameter sets
+    assert len(nm._cache) == 4
+    _model(tc.DMCircuit2(3, noise_model=nm), 0.3)
+    assert len(nm._cache) == 4
+
+    if tc.backend.name != "numpy":
+
+        def f(theta):
+            c = _model(tc.DMCircuit2(3, noise_model=nm), theta)
+            return tc.backend.real(c.expectation_ps(z=[0]))
+
+        def g(theta):
+            c = _noisy(tc.DMCircuit2(3), theta)
+            return tc.backend.real(c.expectation_ps(z=[0]))
+
+        theta = tc.backend.convert_to_tensor(0.4)
+        v, gr = tc.backend.jit(tc.backend.value_and_grad(f))(theta)
+        v0, gr0 = tc.backend.value_and_grad(g)(theta)
+        np.testing.assert_allclose(v, v0, atol=1e-5)
+        np.testing.assert_allclose(gr, gr0, atol=1e-5)
+
+
+def test_compose_super_operator():
+    kraus = tc.channels.krausgate_to_krausmatrix(
+        tc.channels.amplitudedampingchannel(gamma=0.2, p=1.0)
+    )
+    u = tc.gates._cnot_matrix
+    s = tc.noisemodel.compose_super_operator(u, [kraus, []])
+    rho = np.random.normal(size=[4, 4]) + 1j * np.random.normal(size=[4, 4])
+    expected = sum(
+        np.kron(k, np.eye(2)) @ u @ rho @ u.conj().T @ np.kron(k, np.eye(2)).conj().T
+        for k in kraus
+    )
+    r = s @ np.reshape(rho, [-1])
+    np.testing.assert_allclose(np.reshape(r, [4, 4]), expected, atol=1e-5)
@@ -295,6 +295,38 @@ def test_measurement_counts(backend):
     np.testing.assert_allclose(tc.backend.sum(cs), 8192, atol=atol)
     state = np.array([1.0, 1.0, 0, 0])
     print(qu.measurement_counts(state, sparse=False))
+    # the shots follow the backend random state by default
+    state = np.ones([8]) / np.sqrt(8)
+    tc.backend.set_random_state(42)
+    r0 = qu.measurement_counts(state, counts=64, sparse=False)
+    tc.backend.set_random_state(42)
+    r1 = qu.measurement_counts(state, counts=64, sparse=False)
+    np.testing.assert_allclose(r0, r1)
+    r0 = qu.measurement_counts(state, counts=64, random_state=7)
+    r1 = qu.measurement_counts(state, counts=64, random_state=7)
+    np.testing.assert_allclose(r0[1], r1[1])
+    assert np.sum(r0[1]) == 64
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_sample_counts(backend):
+    p = np.random.uniform(size=[8])
+    p /= np.sum(p)
+    shots = 200000
+    r = qu.sample_counts(tc.backend.convert_to_tensor(p), shots, sparse=False)
+    assert r.shape == (8,)
+    assert np.sum(r) == shots
+    np.testing.assert_allclose(r / shots, p, atol=1e-2)
+    # chunked and m >= d branches follow the same random stream
+    r0 = qu.sample_counts(p, 1000, sparse=False, random_state=7)
+    r1 = qu.sample_counts(p, 1000, sparse=False, chunk_size=3, random_state=7)
+    np.testing.assert_allclose(r0, r1)
+    r = qu.sample_counts(p, shots, index=[2, 0], sparse=False)
+    ref = np.transpose(np.sum(np.reshape(p, [2, 2, 2]), axis=1))
+    np.testing.assert_allclose(r / shots, np.reshape(ref, [-1]), atol=1e-2)
+    r = qu.sample_counts(np.array([0.5, 0, 0, 0.5]), 100)
+    assert set(r.keys()) <= {"00", "11"}
+    assert sum(r.values()) == 100
 
 
 @pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
@@ -316,6 +348,93 @@ def test_heisenberg_ham(tfb):
     np.testing.assert_allclose(e[0], -11.2111, atol=1e-4)
 
 
+@pytest.mark.parametrize("backend", [lf("npb"), lf("jaxb")])
+def test_heisenberg_ham_no_tf(backend):
+    g = tc.templates.graphs.Line1D(6)
+    h = tc.quantum.heisenberg_hamiltonian(g, sparse=False, hz=0.0)
+    e, _ = tc.backend.eigh(h)
+    np.testing.assert_allclose(e[0], -11.2111, atol=1e-4)
+    hs = tc.quantum.heisenberg_hamiltonian(g, numpy=True)
+    np.testing.assert_allclose(hs.todense(), h, atol=1e-5)
+
+
+def test_pauli_string_sum_numpy():
+    paulis = [np.eye(2), tc.gates._x_matrix, tc.gates._y_matrix, tc.gates._z_matrix]
+    ls = np.random.randint(0, 4, size=[30, 4])
+    ls[1] = ls[0]
+    weight = np.random.normal(size=[30])
+    dense = 0
+    for l, w in zip(ls, weight):
+        m = np.eye(1)
+        for i in l:
+            m = np.kron(m, paulis[i])
+        dense = dense + w * m
+    for chunk_size in [None, 7]:
+        r = qu.PauliStringSum2COO_numpy(ls, weight, chunk_size=chunk_size)
+        np.testing.assert_allclose(r.todense(), dense, atol=1e-5)
+    r = qu.PauliStringSum2COO_numpy(ls, weight, csr=True)
+    assert r.format == "csr"
+    np.testing.assert_allclose(r.todense(), dense, atol=1e-5)
+    np.testing.assert_allclose(
+        qu.PauliStringSum2Dense(ls, weight, numpy=True), dense, atol=1e-5
+    )
+    # duplicates and cancellation are coalesced
+    r = qu.PauliStringSum2COO_numpy([[1, 3], [1, 3], [2, 0]], [0.5, -0.5, 1.0])
+    assert r.nnz == 4
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_pauli_sum_operator(backend):
+    from scipy.sparse.linalg import eigsh
+
+    n = 5
+    ls = np.random.randint(0, 4, size=[20, n])
+    weight = np.random.normal(size=[20])
+    h = qu.PauliStringSum2COO_numpy(ls, weight).todense()
+    op = qu.PauliSumOperator(ls, weight, chunk_size=6)
+    np.testing.assert_allclose(op.to_coo().todense(), h, atol=1e-5)
+    psi = np.random.normal(size=[2**n, 3]) + 1.0j * np.random.normal(size=[2**n, 3])
+    psi = psi.astype(np.complex64)
+    np.testing.assert_allclose(op.apply(psi), h @ psi, atol=1e-4)
+    np.testing.assert_allclose(
+        op @ psi[:, 0], np.asarray(h @ psi[:, 0]).reshape([-1]), atol=1e-4
+    )
+    e = eigsh(op.to_linear_operator(), k=1, which="SA")[0]
+    np.testing.assert_allclose(e, np.linalg.eigvalsh(h)[:1], atol=1e-4)
+    # the shared mask helper agrees with the numpy bit operations
+    flips, signs, _ = qu._ps2masks(ls)
+    idx = np.arange(2**n)[:, None]
+    flipped, sign = qu._ps_index_masks(
+        tc.backend.reshape(
+            tc.backend.cast(tc.backend.arange(2**n), "int32"), [-1, 1]
+        ),
+        flips,
+        signs,
+        n,
+    )
+    np.testing.assert_allclose(flipped, idx ^ flips[None, :])
+    np.testing.assert_allclose(sign, 1 - 2 * qu._parity(idx & signs[None, :]))
+
+    if tc.backend.name != "numpy":
+
+        def f(weight):
+            op = qu.PauliSumOperator(ls, weight)
+            return op.expectation(tc.backend.convert_to_tensor(psi[:, 0]))
+
+        g = tc.backend.jit(tc.backend.grad(f))(
+            tc.backend.convert_to_tensor(weight.astype(np.float32))
+        )
+        g0 = [
+            np.real(
+                np.conj(psi[:, 0])
+                @ qu.PauliStringSum2Dense([l], numpy=True)
+                @ psi[:, 0]
+            )
+            for l in ls
+        ]
+        np.testing.assert_allclose(g, np.array(g0).reshape([-1]), atol=1e-3)
+
+
 @pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
 def test_reduced_density_from_density(backend):
     n = 6
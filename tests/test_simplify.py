@@ -6,7 +6,10 @@ modulepath = os.path.dirname(os.path.dirname(thisfile))
 
 sys.path.insert(0, modulepath)
 import numpy as np
+import pytest
+from pytest_lazyfixture import lazy_fixture as lf
 import tensornetwork as tn
+import tensorcircuit as tc
 from tensorcircuit import simplify
 
 
@@ -44,3 +47,106 @@ def test_rank_simplify():
 
     nodes = simplify._full_rank_simplify([f, g, h])
     assert len(nodes) == 2
+
+
+def _layered(theta, n=5):
+    c = tc.Circuit(n)
+    for i in range(n):
+        c.h(i)
+    for _ in range(2):
+        for i in range(n - 1):
+            c.rzz(i, i + 1, theta=theta * (i + 1))
+        for i in range(n):
+            c.rx(i, theta=theta)
+            c.rz(i, theta=0.3)
+    c.multicontrol(0, 3, ctrl=[1], unitary=tc.gates._x_matrix)
+    c.cnot(4, 0)
+    c.ry(2, theta=theta)
+    return c
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_fuse_qir(backend):
+    c = tc.Circuit(3)
+    c.h(0)
+    c.rx(0, theta=0.2)
+    c.cnot(0, 1)
+    c.rz(1, theta=0.3)
+    c.h(2)
+    qir = simplify.fuse_qir(c.to_qir())
+    assert [(d["name"], d["index"]) for d in qir] == [("any", (0, 1)), ("h", (2,))]
+
+    c = _layered(0.4)
+    for k in [1, 2, 3]:
+        qir = simplify.fuse_qir(c.to_qir(), k=k)
+        assert len(qir) < len(c.to_qir())
+        assert max([len(d["index"]) for d in qir if d["name"] == "any"]) <= k
+        c2 = tc.Circuit.from_qir(qir, {"nqubits": 5})
+        np.testing.assert_allclose(c.state(), c2.state(), atol=1e-5)
+    c2 = tc.Circuit(5)
+    c2.append_from_qir(c.to_qir(), fuse=True)
+    np.testing.assert_allclose(c.state(), c2.state(), atol=1e-5)
+
+    if tc.backend.name != "numpy":
+
+        def f(theta, fuse):
+            c = tc.Circuit.from_qir(_layered(theta).to_qir(), {"nqubits": 5}, fuse=fuse)
+            return tc.backend.real(c.expectation_ps(z=[2]))
+
+        theta = tc.backend.convert_to_tensor(0.4)
+        g0 = tc.backend.jit(tc.backend.grad(lambda t: f(t, False)))(theta)
+        g1 = tc.backend.jit(tc.backend.grad(lambda t: f(t, True)))(theta)
+        np.testing.assert_allclose(g0, g1, atol=1e-4)
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("jaxb")])
+def test_fuse_qir_qudit(backend):
+    np.random.seed(7)
+
+    def unitary(d):
+        u, _ = np.linalg.qr(
+            np.random.normal(size=[d, d]) + 1j * np.random.normal(size=[d, d])
+        )
+        return u.astype(np.complex64)
+
+    for dims in [[3, 3, 3], [3, 2, 4]]:
+        c = tc.Circuit(3, dim=dims)
+        c.any(0, unitary=unitary(dims[0]))
+        c.any(0, 1, unitary=unitary(dims[0] * dims[1]))
+        c.any(1, unitary=unitary(dims[1]))
+        c.any(2, unitary=unitary(dims[2]))
+        c.any(1, 2, unitary=unitary(dims[1] * dims[2]))
+        qir = simplify.fuse_qir(c.to_qir())
+        assert len(qir) < len(c.to_qir())
+        fused = [d for d in qir if d["name"] == "any" and len(d["index"]) == 2]
+        assert fused
+        for d in fused:
+            shape = [dims[q] for q in d["index"]]
+            assert list(d["gate"].tensor.shape) == shape * 2
+        c2 = tc.Circuit.from_qir(c.to_qir(), c.circuit_param, fuse=True)
+        np.testing.assert_allclose(c.state(), c2.state(), atol=1e-5)
+        c3 = tc.Circuit(3, dim=dims, deferred={"fuse": True})
+        c3.append_from_qir(c.to_qir())
+        np.testing.assert_allclose(c.state(), c3.state(), atol=1e-5)
+
+
+def test_qir_light_cone():
+    c = tc.Circuit(3)
+    c.h(0)
+    c.cnot(0, 1)
+    c.h(2)
+    c.cnot(1, 2)
+    qir = simplify.qir_light_cone(c.to_qir(), [0])
+    assert [(d["name"], d["index"]) for d in qir] == [("h", (0,)), ("cnot", (0, 1))]
+    assert len(simplify.qir_light_cone(c.to_qir(), [2])) == 4
+    # non-unitary gates are always kept
+    c.any(2, unitary=np.array([[1.0, 0], [0, 0]]))
+    c.any(1, unitary=tc.gates.x().tensor)
+    qir = simplify.qir_light_cone(c.to_qir(), [0])
+    assert [d["index"] for d in qir] == [(0,), (0, 1), (2,), (1, 2), (2,)]
+    # the names of user supplied gates are not trusted
+    c = tc.Circuit(2)
+    c.h(0)
+    c.unitary(1, unitary=np.array([[1.0, 0], [0, 0]]), name="h")
+    qir = simplify.qir_light_cone(c.to_qir(), [0])
+    assert [d["index"] for d in qir] == [(0,), (1,)]
@@ -0,0 +1,105 @@
+import os
+import sys
+
+thisfile = os.path.abspath(__file__)
+modulepath = os.path.dirname(os.path.dirname(thisfile))
+
+sys.path.insert(0, modulepath)
+import numpy as np
+import pytest
+from pytest_lazyfixture import lazy_fixture as lf
+import tensorcircuit as tc
+
+
+def _circuit(cls, theta, inputs=None):
+    c = cls(4, inputs=inputs)
+    for i in range(4):
+        c.h(i)
+    c.rzz(0, 2, theta=theta)
+    c.cnot(3, 1)
+    c.rx(1, theta=2 * theta)
+    c.multicontrol(0, 3, ctrl=[1], unitary=tc.gates._x_matrix)
+    c.exp1(1, 2, theta=0.3, unitary=tc.gates._zz_matrix)
+    c.ry(0, theta=theta)
+    return c
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_statevector_circuit(backend):
+    c = _circuit(tc.Circuit, 0.4)
+    s = _circuit(tc.StateVectorCircuit, 0.4)
+    np.testing.assert_allclose(c.state(), s.state(), atol=1e-5)
+    np.testing.assert_allclose(c.matrix(), s.matrix(), atol=1e-5)
+    ops = [(tc.gates.z(), [1]), (tc.gates.x(), [3])]
+    np.testing.assert_allclose(c.expectation(*ops), s.expectation(*ops), atol=1e-5)
+    np.testing.assert_allclose(
+        c.expectation_ps(x=[0], z=[2]), s.expectation_ps(x=[0], z=[2]), atol=1e-5
+    )
+    np.testing.assert_allclose(c.amplitude("0110"), s.amplitude("0110"), atol=1e-5)
+    sample, p = s.sample(allow_state=True)
+    assert tc.backend.shape_tuple(sample) == (4,)
+    assert len(s.to_qir()) == len(c.to_qir())
+
+    s2 = tc.StateVectorCircuit.from_qir(c.to_qir(), c.circuit_param)
+    np.testing.assert_allclose(c.state(), s2.state(), atol=1e-5)
+
+    inputs = np.ones([16]) / 4.0
+    s.replace_inputs(inputs)
+    np.testing.assert_allclose(
+        _circuit(tc.Circuit, 0.4, inputs=inputs).state(), s.state(), atol=1e-5
+    )
+
+    s = tc.StateVectorCircuit(2)
+    s.h(0)
+    s.mid_measurement(0, keep=1)
+    np.testing.assert_allclose(
+        s.state(), np.array([0, 0, 1, 0]) / np.sqrt(2), atol=1e-5
+    )
+
+
+@pytest.mark.parametrize("backend", [lf("tfb"), lf("jaxb")])
+def test_statevector_circuit_jit_grad(backend):
+    def f(cls):
+        def loss(theta):
+            c = _circuit(cls, theta)
+            return tc.backend.real(c.expectation_ps(x=[1]) + c.expectation_ps(z=[0]))
+
+        return tc.backend.jit(tc.backend.value_and_grad(loss))
+
+    theta = tc.backend.convert_to_tensor(0.4)
+    v0, g0 = f(tc.Circuit)(theta)
+    v1, g1 = f(tc.StateVectorCircuit)(theta)
+    np.testing.assert_allclose(v0, v1, atol=1e-5)
+    np.testing.assert_allclose(g0, g1, atol=1e-5)
+    assert np.abs(g1) > 1e-3
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_statevector_general_kraus(backend):
+    kraus = tc.channels.amplitudedampingchannel(0.3, 0.8)
+    for status in [0.1, 0.5, 0.95]:
+        cs = []
+        rs = []
+        for cls in [tc.Circuit, tc.StateVectorCircuit]:
+            c = _circuit(cls, tc.num_to_tensor(0.4))
+            rs.append(
+                c.general_kraus(kraus, 1, status=tc.backend.convert_to_tensor(status))
+            )
+            c.cnot(1, 0)
+            cs.append(c)
+        np.testing.assert_allclose(cs[0].state(), cs[1].state(), atol=1e-5)
+        assert int(rs[1]) in [0, 1, 2, 3]
+
+    @tc.backend.jit
+    def f(theta, status):
+        c = tc.StateVectorCircuit(2)
+        c.h(0)
+        c.rx(1, theta=theta)
+        c.general_kraus(tc.channels.phasedampingchannel(0.2), 0, status=status)
+        c.cond_measure(1)
+        return tc.backend.real(c.expectation_ps(x=[0]))
+
+    theta = tc.num_to_tensor(0.5)
+    np.testing.assert_allclose(
+        f(theta, tc.backend.convert_to_tensor(0.1)), 0.9938, atol=1e-3
+    )
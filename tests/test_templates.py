@@ -143,7 +143,9 @@ def test_operator_measurement(backend):
             sparse.indices, sparse.values, sparse.shape
         )
 
-    for h in [dense, sparse, mpo]:
+    pso = tc.quantum.PauliSumOperator([[1, 0]])
+
+    for h in [dense, sparse, mpo, pso]:
 
         def f(theta):
             c = tc.Circuit(2)
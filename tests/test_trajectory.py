@@ -0,0 +1,59 @@
+import os
+import sys
+
+thisfile = os.path.abspath(__file__)
+modulepath = os.path.dirname(os.path.dirname(thisfile))
+
+sys.path.insert(0, modulepath)
+import numpy as np
+import pytest
+from pytest_lazyfixture import lazy_fixture as lf
+import tensorcircuit as tc
+
+
+def _noisy(c, theta, status=None):
+    if status is None:
+        status = [None, None, None]
+    c.h(0)
+    c.rx(1, theta=theta)
+    c.general_kraus(tc.channels.amplitudedampingchannel(0.3, 1.0), 0, status=status[0])
+    c.cnot(0, 1)
+    c.general_kraus(tc.channels.phasedampingchannel(0.2), 1, status=status[1])
+    c.ry(2, theta=theta)
+    c.cnot(1, 2)
+    c.general_kraus(tc.channels.amplitudedampingchannel(0.1, 0.7), 2, status=status[2])
+    return tc.backend.real(
+        tc.backend.stack(
+            [c.expectation_ps(z=[0]), c.expectation_ps(x=[0]), c.expectation_ps(z=[2])]
+        )
+    )
+
+
+@pytest.mark.parametrize("backend", [lf("npb"), lf("tfb"), lf("jaxb")])
+def test_trajectory_engine(backend):
+    theta = tc.num_to_tensor(0.6)
+
+    def f(status, theta):
+        return _noisy(tc.StateVectorCircuit(3), theta, status)
+
+    exact = _noisy(tc.DMCircuit2(3), theta)
+    engine = tc.TrajectoryEngine(f, nchannels=3, batch=100, seed=42)
+    engine.run(250, theta)
+    assert engine.count == 250
+    engine.run(250, theta)
+    assert engine.count == 500
+    assert engine.mean.shape == (3,)
+    np.testing.assert_array_less(np.abs(engine.mean - exact), 5 * engine.stderr + 1e-3)
+    engine.reset()
+    assert engine.count == 0
+
+
+def test_trajectory_statistics():
+    engine = tc.TrajectoryEngine(lambda s: s, nchannels=2, batch=7, jit=False)
+    values = np.random.uniform(size=[30, 2])
+    for i in range(0, 30, 7):
+        engine.update(values[i : i + 7])
+    np.testing.assert_allclose(engine.mean, np.mean(values, axis=0), atol=1e-8)
+    np.testing.assert_allclose(
+        engine.variance, np.var(values, axis=0, ddof=1), atol=1e-8
+    )